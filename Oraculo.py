@@ -1,21 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
-import asyncio
-import requests
-import json
-import os
-from collections import defaultdict
-from decimal import Decimal, ROUND_DOWN
-import threading
-import time
-import websocket
 import sys
-import io
-
-# Configurar encoding UTF-8 para Windows
-if sys.platform == 'win32':
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=True)
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', line_buffering=True)
+import time
+from motor_oraculo import MotorOraculo
 
 # ---------- FUNCIONES UTILITARIAS ----------
 
@@ -29,211 +16,187 @@ def formatear_volumen(num):
     else:
         return f"{num:.2f}"
 
-def obtener_decimales_de_tick(tick_size):
-    tick_str = f"{tick_size:.10f}".rstrip('0')
-    if '.' not in tick_str:
-        return 0
-    return len(tick_str.split('.')[1])
-
-def obtener_nivel_agrupacion_optimo(tick_size, precio_actual):
-    try:
-        if precio_actual is None or precio_actual <= 0:
-            return tick_size
-            
-        if precio_actual >= 100:
-            agrupacion_base = 10.0
-        elif precio_actual >= 10:
-            agrupacion_base = 1.0
-        elif precio_actual >= 1:
-            agrupacion_base = 0.1
-        elif precio_actual >= 0.1:
-            agrupacion_base = 0.01
-        elif precio_actual >= 0.01:
-            agrupacion_base = 0.001
-        elif precio_actual >= 0.001:
-            agrupacion_base = 0.0001
-        else:
-            agrupacion_base = 0.00001
-        
-        tick_decimal = Decimal(str(tick_size))
-        agrupacion_decimal = Decimal(str(agrupacion_base))
-        cociente = agrupacion_decimal / tick_decimal
-        
-        if cociente % 1 == 0:
-            return agrupacion_base
-        
-        niveles_posibles = [0.00001, 0.0001, 0.001, 0.01, 0.1, 1, 10, 100]
-        
-        for nivel in reversed(niveles_posibles):
-            nivel_decimal = Decimal(str(nivel))
-            cociente = nivel_decimal / tick_decimal
-            if cociente % 1 == 0 and nivel <= agrupacion_base:
-                return nivel
-        
-        return tick_size
-        
-    except Exception as e:
-        return tick_size
-
-def agrupar_precio_binance(price, agrupacion):
-    price_decimal = Decimal(str(price))
-    agrupacion_decimal = Decimal(str(agrupacion))
-    agrupado = (price_decimal / agrupacion_decimal).quantize(Decimal('1'), rounding=ROUND_DOWN) * agrupacion_decimal
-    return float(agrupado)
-
-# ---------- OBTENER DATOS BINANCE ----------
-
-# Diccionario global para almacenar precios en tiempo real desde WebSocket
-precios_websocket = {}
-precios_lock = threading.Lock()
-
-def obtener_precio_actual(symbol):
-    """Obtiene el precio desde el WebSocket en memoria (sin REST API)"""
-    with precios_lock:
-        return precios_websocket.get(symbol)
-
-def iniciar_websocket_precios(symbols):
-    """Inicia WebSocket combinado para obtener precios en tiempo real"""
-    def on_message_precio(ws, message):
-        try:
-            data = json.loads(message)
-            if 'stream' in data:
-                stream_data = data['data']
-                symbol = stream_data['s']  # Símbolo
-                precio = float(stream_data['c'])  # Close price (precio actual)
-
-                with precios_lock:
-                    precios_websocket[symbol] = precio
-        except Exception as e:
-            pass
-
-    def run_ws_precios():
-        while True:
-            try:
-                # Crear streams combinados para ticker: btcusdt@ticker/ethusdt@ticker/...
-                streams = '/'.join([f"{symbol.lower()}@ticker" for symbol in symbols])
-                url = f"wss://fstream.binance.com/stream?streams={streams}"
-
-                print(f"🔌 Conectando WebSocket de precios ({len(symbols)} símbolos)...")
-
-                ws = websocket.WebSocketApp(
-                    url,
-                    on_message=on_message_precio,
-                    on_error=lambda _, err: print(f"⚠️ Error WS precios: {err}"),
-                    on_close=lambda _, __, msg: print(f"❌ WS precios cerrado"),
-                )
-                ws.run_forever()
-            except Exception as e:
-                print(f"💥 Error en WS precios: {e}")
-
-            print("🔁 Reconectando WS precios en 10 segundos...")
-            time.sleep(10)
-
-    # Iniciar en hilo separado
-    threading.Thread(target=run_ws_precios, daemon=True).start()
-
-def obtener_tick_size(symbol):
-    url = f"https://fapi.binance.com/fapi/v1/exchangeInfo"
-    try:
-        data = requests.get(url, timeout=5).json()
-        for s in data["symbols"]:
-            if s["symbol"] == symbol:
-                for f in s["filters"]:
-                    if f["filterType"] == "PRICE_FILTER":
-                        return float(f["tickSize"])
-        return 0.01
-    except Exception as e:
-        return 0.01
-
-def cargar_libro_ordenes_api(symbols, base_url="http://localhost:8000"):
-    order_books = {}
-    print(f"📖 Cargando libros de órdenes para {len(symbols)} símbolos...")
-    sys.stdout.flush()
-
-    for idx, symbol in enumerate(symbols):
-        try:
-            resp = requests.get(f"{base_url}/orderbooks/{symbol}", timeout=5)
-            if resp.status_code == 200:
-                order_books[symbol] = resp.json()
-                # Mostrar progreso cada 10 símbolos
-                if (idx + 1) % 10 == 0:
-                    print(f"   Cargados {idx + 1}/{len(symbols)} libros...")
-                    sys.stdout.flush()
-        except Exception as e:
-            pass
-
-    print(f"✅ Libros de órdenes cargados: {len(order_books)}/{len(symbols)}")
-    sys.stdout.flush()
-    return order_books
-
-def obtener_simbolos(base_url="http://localhost:8000"):
-    try:
-        print(f"📡 Conectando a API: {base_url}/symbols")
-        sys.stdout.flush()
-        resp = requests.get(f"{base_url}/symbols", timeout=5)
-        if resp.status_code == 200:
-            symbols = resp.json().get("symbols", [])
-            print(f"✅ API respondió con {len(symbols)} símbolos")
-            sys.stdout.flush()
-            return symbols
-        else:
-            print(f"❌ API respondió con código: {resp.status_code}")
-            sys.stdout.flush()
-    except requests.exceptions.ConnectionError as e:
-        print(f"❌ ERROR: No se puede conectar a {base_url}")
-        print(f"   Asegúrate de que el servidor del libro de órdenes esté corriendo")
-        sys.stdout.flush()
-    except requests.exceptions.Timeout:
-        print(f"❌ ERROR: Timeout al conectar a {base_url}")
-        sys.stdout.flush()
-    except Exception as e:
-        print(f"❌ ERROR al obtener símbolos: {e}")
-        sys.stdout.flush()
-    return []
-
-# ---------- ANÁLISIS DE SHOCKS ----------
-
-def calcular_shocks(order_book, agrupacion, tick_size):
-    bid_ranges = defaultdict(lambda: {'total_qty': 0, 'price_count': {}})
-    ask_ranges = defaultdict(lambda: {'total_qty': 0, 'price_count': {}})
-
-    for price, qty in order_book.get('bids', {}).items():
-        price, qty = float(price), float(qty)
-        range_key = agrupar_precio_binance(price, agrupacion)
-        bid_ranges[range_key]['total_qty'] += qty
-        bid_ranges[range_key]['price_count'][price] = bid_ranges[range_key]['price_count'].get(price, 0) + qty
-
-    for price, qty in order_book.get('asks', {}).items():
-        price, qty = float(price), float(qty)
-        range_key = agrupar_precio_binance(price, agrupacion)
-        ask_ranges[range_key]['total_qty'] += qty
-        ask_ranges[range_key]['price_count'][price] = ask_ranges[range_key]['price_count'].get(price, 0) + qty
-
-    decimales_tick = obtener_decimales_de_tick(tick_size)
-
-    top_bids = sorted(bid_ranges.items(), key=lambda x: x[1]['total_qty'], reverse=True)[:8]
-    top_asks = sorted(ask_ranges.items(), key=lambda x: x[1]['total_qty'], reverse=True)[:8]
-
-    shocks_long = []
-    for pr_range, data in top_bids:
-        total_qty = data['total_qty']
-        if total_qty > 0:
-            weighted_avg_price = sum(p * q for p, q in data['price_count'].items()) / total_qty
-            weighted_avg_price = agrupar_precio_binance(weighted_avg_price, tick_size)
-            shocks_long.append(weighted_avg_price)
-
-    shocks_short = []
-    for pr_range, data in top_asks:
-        total_qty = data['total_qty']
-        if total_qty > 0:
-            weighted_avg_price = sum(p * q for p, q in data['price_count'].items()) / total_qty
-            weighted_avg_price = agrupar_precio_binance(weighted_avg_price, tick_size)
-            shocks_short.append(weighted_avg_price)
-
-    shocks_long.sort(reverse=True)
-    shocks_short.sort()
-
-    return shocks_long, shocks_short, decimales_tick
+# ---------- LISTA VIRTUALIZADA (CANVAS) ----------
+
+# "tarjetas": un Frame con Labels por shock, reordenado con animación.
+# "canvas": filas dibujadas en el Canvas de cada columna; solo existen items para
+# las filas visibles, pensado para cargar el universo completo de perpetuos.
+RENDERIZADOR = "tarjetas"
+
+ALTO_FILA = 40
+
+# Rótulos fijos de cada fila: (texto, x)
+ROTULOS_FILA = (("Moneda:", 16), ("Shock:", 170), ("Stop:", 300), ("Dist:", 490))
+
+# Valores de cada fila: (campo, x, fuente, color, copiable). color None = color de la columna
+CAMPOS_FILA = (
+    ('symbol', 64, ("Segoe UI", 9, "bold"), None, True),
+    ('entrada', 212, ("Courier New", 9, "bold"), None, True),
+    ('stop', 335, ("Courier New", 9, "bold"), "#ffa500", True),
+    ('stop_pct', 430, ("Courier New", 9, "bold"), "#ff6b6b", False),
+    ('dist', 522, ("Courier New", 9, "bold"), "#00ccff", False),
+)
+
+class ListaShocksCanvas:
+    """Lista de shocks de una columna dibujada con items de un Canvas.
+
+    Solo las filas dentro del viewport tienen items: al hacer scroll los grupos de
+    items (slots) se reciclan, y reordenar es mover coordenadas, sin crear ni
+    reubicar widgets. Un clic en la moneda, la entrada o el stop los copia.
+    """
+
+    def __init__(self, canvas, scrollbar, color, on_copiar, color_distancia):
+        self.canvas = canvas
+        self.color = color
+        self.on_copiar = on_copiar
+        self.color_distancia = color_distancia
+        self.filas = {}            # symbol -> data (mismo formato que las tarjetas)
+        self.orden = []            # symbols ordenados por distancia
+        self.visibles = {}         # symbol -> slot
+        self.libres = []           # slots ocultos para reutilizar
+        self.copiables = {}        # id de item -> (slot, campo)
+        self.slots_creados = 0
+        self.region = None
+        self.ancho = None
+        self.render_pendiente = False
+
+        def on_scroll(*args):
+            scrollbar.set(*args)
+            self.programar_render()
+
+        canvas.configure(yscrollcommand=on_scroll)
+        canvas.bind("<Configure>", lambda e: self.programar_render())
+        canvas.tag_bind("copiable", "<Button-1>", self._on_click)
+        canvas.tag_bind("copiable", "<Enter>", lambda e: canvas.configure(cursor="hand2"))
+        canvas.tag_bind("copiable", "<Leave>", lambda e: canvas.configure(cursor=""))
+
+    def __len__(self):
+        return len(self.orden)
+
+    def actualizar(self, resultados):
+        """Reemplaza las filas por resultados (ya ordenados por distancia)"""
+        self.filas = {data['symbol']: data for data in resultados}
+        self.orden = [data['symbol'] for data in resultados]
+        self.programar_render()
+
+    def actualizar_distancia(self, symbol, precio_actual):
+        """Actualiza la distancia de una fila. Devuelve True si cambió lo suficiente para reordenar."""
+        data = self.filas.get(symbol)
+        if data is None:
+            return False
+
+        distancia_pct = abs((data['entrada'] - precio_actual) / precio_actual * 100)
+        distancia_anterior = data['distancia_pct']
+        if abs(distancia_pct - distancia_anterior) <= 0.01:
+            return False
+
+        data['distancia_pct'] = distancia_pct
+        data['precio_actual'] = precio_actual
+        slot = self.visibles.get(symbol)
+        if slot is not None:
+            self.canvas.itemconfigure(slot['items']['dist'], text=f"{distancia_pct:.2f}%",
+                                      fill=self.color_distancia(distancia_pct))
+        return abs(distancia_pct - distancia_anterior) > 0.1
+
+    def reordenar(self):
+        self.orden.sort(key=lambda symbol: self.filas[symbol]['distancia_pct'])
+        self.programar_render()
+
+    def programar_render(self):
+        if not self.render_pendiente:
+            self.render_pendiente = True
+            self.canvas.after_idle(self.render)
+
+    def _crear_slot(self):
+        canvas = self.canvas
+        tag = f"fila{self.slots_creados}"
+        self.slots_creados += 1
+        slot = {'tag': tag, 'symbol': None, 'data': None, 'y': 0, 'valores': {}, 'items': {}}
+
+        centro = ALTO_FILA // 2
+        slot['items']['fondo'] = canvas.create_rectangle(8, 2, 600, ALTO_FILA - 4, fill="#16213e",
+                                                         outline="#2a2a4e", tags=(tag,))
+        for texto, x in ROTULOS_FILA:
+            canvas.create_text(x, centro, text=texto, anchor="w", font=("Segoe UI", 8, "bold"),
+                               fill="#888888", tags=(tag,))
+        for campo, x, fuente, color, copiable in CAMPOS_FILA:
+            tags = (tag, "copiable") if copiable else (tag,)
+            item = canvas.create_text(x, centro, anchor="w", font=fuente, fill=color or self.color, tags=tags)
+            slot['items'][campo] = item
+            if copiable:
+                self.copiables[item] = (slot, campo)
+        if self.ancho is not None:
+            canvas.coords(slot['items']['fondo'], 8, 2, self.ancho - 8, ALTO_FILA - 4)
+        return slot
+
+    def _llenar(self, slot, symbol):
+        data = self.filas[symbol]
+        formato = f".{data['decimales']}f"
+        entrada = f"{data['entrada']:{formato}}"
+        stop = f"{data['stop_loss']:{formato}}"
+        distancia_entrada_stop_pct = abs((data['stop_loss'] - data['entrada']) / data['entrada'] * 100)
+
+        itemconfigure = self.canvas.itemconfigure
+        items = slot['items']
+        itemconfigure(items['symbol'], text=symbol)
+        itemconfigure(items['entrada'], text=f"${entrada}")
+        itemconfigure(items['stop'], text=f"${stop}")
+        itemconfigure(items['stop_pct'], text=f"{distancia_entrada_stop_pct:.2f}%")
+        itemconfigure(items['dist'], text=f"{data['distancia_pct']:.2f}%",
+                      fill=self.color_distancia(data['distancia_pct']))
+        slot['valores'] = {'symbol': symbol, 'entrada': entrada, 'stop': stop}
+        slot['symbol'] = symbol
+        slot['data'] = data
+
+    def render(self):
+        """Materializa las filas visibles y ubica cada una en su posición"""
+        self.render_pendiente = False
+        canvas = self.canvas
+
+        ancho = max(canvas.winfo_width(), 1)
+        region = (0, 0, ancho, len(self.orden) * ALTO_FILA)
+        if region != self.region:
+            canvas.configure(scrollregion=region)
+            self.region = region
+
+        arriba = canvas.canvasy(0)
+        primero = max(0, int(arriba // ALTO_FILA))
+        ultimo = min(len(self.orden), int((arriba + canvas.winfo_height()) // ALTO_FILA) + 1)
+        posiciones = {symbol: i for i, symbol in enumerate(self.orden[primero:ultimo], primero)}
+
+        # Las filas que salieron del viewport (o desaparecieron) liberan su slot
+        for symbol in [s for s in self.visibles if s not in posiciones]:
+            slot = self.visibles.pop(symbol)
+            canvas.itemconfigure(slot['tag'], state='hidden')
+            slot['symbol'] = None
+            slot['data'] = None
+            self.libres.append(slot)
+
+        for symbol, i in posiciones.items():
+            slot = self.visibles.get(symbol)
+            if slot is None:
+                slot = self.libres.pop() if self.libres else self._crear_slot()
+                canvas.itemconfigure(slot['tag'], state='normal')
+                self.visibles[symbol] = slot
+            if slot['data'] is not self.filas[symbol]:
+                self._llenar(slot, symbol)
+            y = i * ALTO_FILA
+            if slot['y'] != y:
+                canvas.move(slot['tag'], 0, y - slot['y'])
+                slot['y'] = y
+
+        if ancho != self.ancho:
+            self.ancho = ancho
+            for slot in list(self.visibles.values()) + self.libres:
+                canvas.coords(slot['items']['fondo'], 8, slot['y'] + 2, ancho - 8, slot['y'] + ALTO_FILA - 4)
+
+    def _on_click(self, event):
+        actual = self.canvas.find_withtag("current")
+        if not actual or actual[0] not in self.copiables:
+            return
+        slot, campo = self.copiables[actual[0]]
+        if slot['symbol'] is not None:
+            self.on_copiar(slot['valores'][campo])
 
 # ---------- INTERFAZ GRÁFICA ----------
 
@@ -245,24 +208,26 @@ class ShockDashboard:
         self.root.configure(bg="#0f0f1e")
         
         # Variables
-        self.agrupaciones = {}
-        self.tick_sizes = {}
-        self.base_url = "http://localhost:8000"
+        self.motor = MotorOraculo("http://localhost:8000")
+        self.motor.suscribir(self.on_evento, precios=True)
+        # Mismos dicts que el motor (solo lectura desde la UI)
+        self.tick_sizes = self.motor.tick_sizes
+        self.precios_actuales = self.motor.precios_actuales
         self.tarjetas_activas = {}
-        self.precios_actuales = {}
-        self.shocks_activos = {}
         self.actualizando = True
-        self.precio_anterior = {}
-        self.hilos_monitores = {}
         self.animaciones_activas = {}
         self.actualizaciones_pendientes = set()
         self.ultimo_reorden = 0
+        self.lista_long = None   # ListaShocksCanvas con RENDERIZADOR = "canvas"
+        self.lista_short = None
         
         # Crear interfaz
         self.crear_interfaz()
-        
-        # Iniciar escaneo inicial
-        self.escaneo_inicial()
+
+        # Mostrar el último estado guardado mientras corre el escaneo, que
+        # reintenta solo cada 10s si el servidor todavía no responde
+        self.motor.restaurar_estado_cache()
+        self.motor.iniciar()
 
         # Iniciar procesador de actualizaciones agrupadas (60 FPS = ~16ms)
         self.procesar_actualizaciones_agrupadas()
@@ -322,8 +287,12 @@ class ShockDashboard:
         self.long_container.bind("<Configure>",
                                 lambda e: self.actualizar_scrollregion_debounced(self.long_canvas))
         
-        self.long_canvas.create_window((0, 0), window=self.long_container, anchor="nw")
         self.long_canvas.configure(yscrollcommand=long_scrollbar.set)
+        if RENDERIZADOR == "canvas":
+            self.lista_long = ListaShocksCanvas(self.long_canvas, long_scrollbar, "#00ff88",
+                                                self.copiar_al_portapapeles, self.obtener_color_distancia)
+        else:
+            self.long_canvas.create_window((0, 0), window=self.long_container, anchor="nw")
         
         self.long_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         long_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -350,8 +319,12 @@ class ShockDashboard:
         self.short_container.bind("<Configure>",
                                  lambda e: self.actualizar_scrollregion_debounced(self.short_canvas))
         
-        self.short_canvas.create_window((0, 0), window=self.short_container, anchor="nw")
         self.short_canvas.configure(yscrollcommand=short_scrollbar.set)
+        if RENDERIZADOR == "canvas":
+            self.lista_short = ListaShocksCanvas(self.short_canvas, short_scrollbar, "#ff4444",
+                                                self.copiar_al_portapapeles, self.obtener_color_distancia)
+        else:
+            self.short_canvas.create_window((0, 0), window=self.short_container, anchor="nw")
         
         self.short_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         short_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -428,12 +401,41 @@ class ShockDashboard:
         
         self.tarjetas_activas[key] = {
             'frame': card,
+            'entrada_label': entrada_label,
+            'stop_label': stop_label,
+            'stop_dist_label': stop_dist_label,
             'dist_label': dist_label,
             'data': data,
             'color': color
         }
         
         return card
+
+    def actualizar_tarjeta_shock(self, tarjeta, data):
+        """Actualiza en el lugar los labels de una tarjeta existente. Devuelve True si algo cambió."""
+        anterior = tarjeta['data']
+        tarjeta['data'] = data
+        cambio = False
+
+        if (data['entrada'], data['stop_loss'], data['decimales']) != (anterior['entrada'], anterior['stop_loss'], anterior['decimales']):
+            formato = f".{data['decimales']}f"
+            entrada_valor = f"{data['entrada']:{formato}}"
+            stop_valor = f"{data['stop_loss']:{formato}}"
+            tarjeta['entrada_label'].config(text=f"${entrada_valor}")
+            tarjeta['entrada_label'].bind("<Button-1>", lambda e, t=entrada_valor: self.copiar_al_portapapeles(t))
+            tarjeta['stop_label'].config(text=f"${stop_valor}")
+            tarjeta['stop_label'].bind("<Button-1>", lambda e, t=stop_valor: self.copiar_al_portapapeles(t))
+
+            distancia_entrada_stop_pct = abs((data['stop_loss'] - data['entrada']) / data['entrada'] * 100)
+            tarjeta['stop_dist_label'].config(text=f"{distancia_entrada_stop_pct:.2f}%")
+            cambio = True
+
+        if f"{data['distancia_pct']:.2f}" != f"{anterior['distancia_pct']:.2f}":
+            tarjeta['dist_label'].config(text=f"{data['distancia_pct']:.2f}%",
+                                         fg=self.obtener_color_distancia(data['distancia_pct']))
+            cambio = True
+
+        return cambio
     
     def procesar_actualizaciones_agrupadas(self):
         """Procesa todas las actualizaciones pendientes en un solo ciclo de UI"""
@@ -472,297 +474,31 @@ class ShockDashboard:
         self.root.clipboard_append(texto)
         self.actualizar_status(f"📋 Copiado: {texto}")
     
-    def escaneo_inicial(self):
-        """Inicia el escaneo en un thread NO daemon para evitar que se cierre prematuramente"""
-        def escanear():
-            print("🔍 Realizando escaneo inicial de order books...")
-            sys.stdout.flush()
-            self.actualizar_status("🔍 Escaneando...")
-
-            symbols = obtener_simbolos(self.base_url)
-            if not symbols:
-                print("❌ No hay símbolos disponibles")
-                self.actualizar_status("❌ No hay símbolos - Reintentando en 10s")
-                sys.stdout.flush()
-                self.root.after(10000, self.escaneo_inicial)
-                return
-
-            print(f"✅ Símbolos obtenidos: {len(symbols)}")
-            sys.stdout.flush()
-
-            # Iniciar WebSocket de precios para todos los símbolos (UNA SOLA VEZ)
-            if not hasattr(self, 'ws_precios_iniciado'):
-                print(f"🚀 Iniciando WebSocket de precios para {len(symbols)} símbolos...")
-                sys.stdout.flush()
-                iniciar_websocket_precios(symbols)
-                self.ws_precios_iniciado = True
-                # Esperar 5 segundos para que se conecte y reciba primeros precios
-                print("⏳ Esperando 5 segundos para recibir precios del WebSocket...")
-                sys.stdout.flush()
-                time.sleep(5)
-
-                # Verificar cuántos precios se recibieron
-                with precios_lock:
-                    precios_recibidos = len(precios_websocket)
-                print(f"✅ Precios recibidos: {precios_recibidos}/{len(symbols)}")
-                sys.stdout.flush()
-
-            for sym in symbols:
-                if sym not in self.tick_sizes:
-                    self.tick_sizes[sym] = obtener_tick_size(sym)
-                    precio = obtener_precio_actual(sym)
-                    if precio:
-                        agrupacion_optima = obtener_nivel_agrupacion_optimo(self.tick_sizes[sym], precio)
-                        self.agrupaciones[sym] = agrupacion_optima
-
-            order_books = cargar_libro_ordenes_api(symbols, self.base_url)
-            if not order_books:
-                print("❌ No hay datos de libros de órdenes")
-                self.actualizar_status("❌ No hay datos del libro - Reintentando en 10s")
-                sys.stdout.flush()
-                self.root.after(10000, self.escaneo_inicial)
-                return
-
-            print(f"📖 Libros de órdenes cargados: {len(order_books)}")
-            sys.stdout.flush()
-
-            resultados_long = []
-            resultados_short = []
-
-            simbolos_sin_precio = []
-            simbolos_sin_shocks = []
-
-            for symbol in symbols:
-                if symbol not in order_books:
-                    continue
-
-                order_book = order_books[symbol]
-                agrupacion = self.agrupaciones[symbol]
-                tick = self.tick_sizes[symbol]
-                precio_actual = obtener_precio_actual(symbol)
-
-                if precio_actual is None:
-                    simbolos_sin_precio.append(symbol)
-                    continue
-
-                self.precios_actuales[symbol] = precio_actual
-                self.precio_anterior[symbol] = precio_actual
-
-                shocks_long, shocks_short, decimales_tick = calcular_shocks(
-                    order_book, agrupacion, tick)
-
-                if symbol not in self.shocks_activos:
-                    self.shocks_activos[symbol] = {}
-
-                # MEJORADO: Validación más flexible para shocks
-                # Usar índices 3 y 4 si hay suficientes shocks, sino usar lo que haya
-                if len(shocks_long) >= 5:
-                    shock_1_long = shocks_long[3]
-                    shock_2_long = shocks_long[4]
-                    distancia_pct_long = abs((shock_1_long - precio_actual) / precio_actual * 100)
-
-                    self.shocks_activos[symbol]['long'] = {
-                        'entrada': shock_1_long,
-                        'stop': shock_2_long
-                    }
-
-                    resultados_long.append({
-                        'symbol': symbol,
-                        'tipo': 'LONG',
-                        'entrada': shock_1_long,
-                        'stop_loss': shock_2_long,
-                        'distancia_pct': distancia_pct_long,
-                        'precio_actual': precio_actual,
-                        'decimales': decimales_tick,
-                        'agrupacion': agrupacion,
-                        'tick_size': tick
-                    })
-                elif len(shocks_long) >= 4:
-                    # Fallback: usar 2 shocks disponibles
-                    shock_1_long = shocks_long[2]
-                    shock_2_long = shocks_long[3]
-                    distancia_pct_long = abs((shock_1_long - precio_actual) / precio_actual * 100)
-
-                    self.shocks_activos[symbol]['long'] = {
-                        'entrada': shock_1_long,
-                        'stop': shock_2_long
-                    }
-
-                    resultados_long.append({
-                        'symbol': symbol,
-                        'tipo': 'LONG',
-                        'entrada': shock_1_long,
-                        'stop_loss': shock_2_long,
-                        'distancia_pct': distancia_pct_long,
-                        'precio_actual': precio_actual,
-                        'decimales': decimales_tick,
-                        'agrupacion': agrupacion,
-                        'tick_size': tick
-                    })
-                    print(f"⚠️ {symbol} LONG: Solo {len(shocks_long)} shocks (usando fallback)")
-                    sys.stdout.flush()
-                else:
-                    simbolos_sin_shocks.append(f"{symbol} (LONG: {len(shocks_long)} shocks)")
-
-                if len(shocks_short) >= 5:
-                    shock_1_short = shocks_short[3]
-                    shock_2_short = shocks_short[4]
-                    distancia_pct_short = abs((shock_1_short - precio_actual) / precio_actual * 100)
-
-                    self.shocks_activos[symbol]['short'] = {
-                        'entrada': shock_1_short,
-                        'stop': shock_2_short
-                    }
-
-                    resultados_short.append({
-                        'symbol': symbol,
-                        'tipo': 'SHORT',
-                        'entrada': shock_1_short,
-                        'stop_loss': shock_2_short,
-                        'distancia_pct': distancia_pct_short,
-                        'precio_actual': precio_actual,
-                        'decimales': decimales_tick,
-                        'agrupacion': agrupacion,
-                        'tick_size': tick
-                    })
-                elif len(shocks_short) >= 4:
-                    # Fallback: usar los primeros 2 shocks disponibles
-                    shock_1_short = shocks_short[2]
-                    shock_2_short = shocks_short[3]
-                    distancia_pct_short = abs((shock_1_short - precio_actual) / precio_actual * 100)
-
-                    self.shocks_activos[symbol]['short'] = {
-                        'entrada': shock_1_short,
-                        'stop': shock_2_short
-                    }
-
-                    resultados_short.append({
-                        'symbol': symbol,
-                        'tipo': 'SHORT',
-                        'entrada': shock_1_short,
-                        'stop_loss': shock_2_short,
-                        'distancia_pct': distancia_pct_short,
-                        'precio_actual': precio_actual,
-                        'decimales': decimales_tick,
-                        'agrupacion': agrupacion,
-                        'tick_size': tick
-                    })
-                    print(f"⚠️ {symbol} SHORT: Solo {len(shocks_short)} shocks (usando fallback)")
-                    sys.stdout.flush()
-                else:
-                    simbolos_sin_shocks.append(f"{symbol} (SHORT: {len(shocks_short)} shocks)")
-
-            resultados_long.sort(key=lambda x: x['distancia_pct'])
-            resultados_short.sort(key=lambda x: x['distancia_pct'])
-
-            # Reporte detallado de escaneo
-            print(f"\n{'='*60}")
-            print(f"✅ Escaneo inicial completado:")
-            print(f"   📊 Total símbolos: {len(symbols)}")
-            print(f"   📖 Libros cargados: {len(order_books)}")
-            print(f"   🟢 LONGs detectados: {len(resultados_long)}")
-            print(f"   🔴 SHORTs detectados: {len(resultados_short)}")
-
-            if simbolos_sin_precio:
-                print(f"   ⚠️ Símbolos sin precio WebSocket ({len(simbolos_sin_precio)}): {simbolos_sin_precio[:5]}")
-                if len(simbolos_sin_precio) > 5:
-                    print(f"      ... y {len(simbolos_sin_precio) - 5} más")
-
-            if simbolos_sin_shocks:
-                print(f"   ⚠️ Símbolos sin suficientes shocks ({len(simbolos_sin_shocks)}):")
-                for s in simbolos_sin_shocks[:5]:
-                    print(f"      - {s}")
-                if len(simbolos_sin_shocks) > 5:
-                    print(f"      ... y {len(simbolos_sin_shocks) - 5} más")
-
-            print(f"{'='*60}\n")
-            sys.stdout.flush()
-
-            # Actualizar status con información útil
-            if len(resultados_long) == 0 and len(resultados_short) == 0:
-                self.actualizar_status(f"⚠️ Sin shocks - Sin precio: {len(simbolos_sin_precio)}, Sin data: {len(simbolos_sin_shocks)}")
-            else:
-                self.actualizar_status("🟢 Monitoreando")
-
-            print(f"📊 Programando actualización de UI...")
-            sys.stdout.flush()
-
-            # Usar after con delay para asegurar que tkinter esté listo
-            self.root.after(100, lambda: self.actualizar_ui(resultados_long, resultados_short))
-
-            print(f"🔍 Programando inicio de monitores...")
-            sys.stdout.flush()
-
-            self.root.after(200, self.iniciar_hilos_monitores)
-
-        # IMPORTANTE: NO usar daemon=True para evitar que se cierre prematuramente
-        hilo_escaneo = threading.Thread(target=escanear, daemon=False)
-        hilo_escaneo.start()
-    
-    def iniciar_hilos_monitores(self):
-        print(f"\n🔄 Iniciando hilos de monitoreo para {len(self.shocks_activos)} símbolos...")
-        sys.stdout.flush()
-
-        for symbol in self.shocks_activos.keys():
-            if symbol not in self.hilos_monitores:
-                hilo = threading.Thread(target=self.monitorear_moneda, args=(symbol,), daemon=True)
-                hilo.start()
-                self.hilos_monitores[symbol] = hilo
-                print(f"🔍 Hilo de monitoreo iniciado para {symbol}")
-                sys.stdout.flush()
-
-        print(f"✅ Todos los hilos de monitoreo iniciados\n")
-        sys.stdout.flush()
-    
-    def monitorear_moneda(self, symbol):
-        print(f"▶️ Iniciando monitoreo de {symbol}")
+    def on_evento(self, evento):
+        """Eventos del motor (llegan desde sus hilos: todo lo de Tk pasa por after)"""
+        tipo = evento['evento']
+        if tipo == 'precio':
+            # Agrupar actualizaciones pendientes en vez de llamar after() por cada ticker
+            self.actualizaciones_pendientes.add(evento['symbol'])
+        elif tipo == 'tarjetas':
+            self.root.after(0, lambda: self.actualizar_ui(evento['longs'], evento['shorts']))
+        elif tipo == 'estado':
+            self.actualizar_status(evento['mensaje'])
 
-        while self.actualizando:
-            try:
-                # Obtener precio del WebSocket (sin REST API)
-                precio_actual = obtener_precio_actual(symbol)
-
-                if precio_actual is None:
-                    time.sleep(0.5)
-                    continue
-
-                precio_prev = self.precio_anterior.get(symbol, precio_actual)
-                self.precios_actuales[symbol] = precio_actual
-                
-                if 'long' in self.shocks_activos.get(symbol, {}):
-                    entrada_long = self.shocks_activos[symbol]['long']['entrada']
-                    
-                    if precio_prev > entrada_long and precio_actual <= entrada_long:
-                        print(f"🎯 TOQUE LONG detectado en {symbol} - Precio: {precio_actual}, Entrada: {entrada_long}")
-                        self.actualizar_status(f"🎯 TOQUE LONG: {symbol}")
-                        self.recalcular_shock_individual(symbol)
-                
-                if 'short' in self.shocks_activos.get(symbol, {}):
-                    entrada_short = self.shocks_activos[symbol]['short']['entrada']
-                    
-                    if precio_prev < entrada_short and precio_actual >= entrada_short:
-                        print(f"🎯 TOQUE SHORT detectado en {symbol} - Precio: {precio_actual}, Entrada: {entrada_short}")
-                        self.actualizar_status(f"🎯 TOQUE SHORT: {symbol}")
-                        self.recalcular_shock_individual(symbol)
-                
-                self.precio_anterior[symbol] = precio_actual
-
-                # OPTIMIZACIÓN: Agrupar actualizaciones pendientes en vez de llamar after() cada segundo
-                self.actualizaciones_pendientes.add(symbol)
-
-            except Exception as e:
-                print(f"Error monitoreando {symbol}: {e}")
-
-            time.sleep(1)
-        
-        print(f"⏹️ Monitoreo detenido para {symbol}")
-    
     def actualizar_distancia_moneda(self, symbol):
         """Actualiza la distancia y reordena si es necesario - OPTIMIZADO"""
         if symbol not in self.precios_actuales:
             return
         
         precio_actual = self.precios_actuales[symbol]
+
+        if self.lista_long is not None:
+            # Lista en canvas: reordenar es barato (solo se mueven las filas visibles)
+            for lista in (self.lista_long, self.lista_short):
+                if lista.actualizar_distancia(symbol, precio_actual):
+                    lista.reordenar()
+            return
+
         necesita_reordenar = False
         cambios = False
         
@@ -806,12 +542,12 @@ class ShockDashboard:
         else:
             return "#00ccff"
     
-    def reordenar_tarjetas_suave(self):
+    def reordenar_tarjetas_suave(self, forzar=False):
         """Reordena las tarjetas con animación de deslizamiento OPTIMIZADA"""
         try:
-            # Throttling: solo reordenar cada 500ms como máximo
+            # Throttling: solo reordenar cada 500ms como máximo (salvo que cambien las tarjetas)
             tiempo_actual = time.time()
-            if tiempo_actual - self.ultimo_reorden < 0.5:
+            if not forzar and tiempo_actual - self.ultimo_reorden < 0.5:
                 return
 
             self.ultimo_reorden = tiempo_actual
@@ -832,17 +568,19 @@ class ShockDashboard:
             longs_ordenados = sorted(longs, key=lambda x: x[0])
             shorts_ordenados = sorted(shorts, key=lambda x: x[0])
 
-            # Animar LONGS con deslizamiento
-            y_offset = 0
-            for idx, (dist, key, tarjeta) in enumerate(longs_ordenados):
-                self.animar_tarjeta_a_posicion(tarjeta['frame'], y_offset)
-                y_offset += tarjeta['frame'].winfo_reqheight() + 8
+            # Animar cada columna con deslizamiento
+            for container, ordenados in ((self.long_container, longs_ordenados),
+                                         (self.short_container, shorts_ordenados)):
+                y_offset = 0
+                ancho = 0
+                for idx, (dist, key, tarjeta) in enumerate(ordenados):
+                    self.animar_tarjeta_a_posicion(tarjeta['frame'], y_offset)
+                    y_offset += tarjeta['frame'].winfo_reqheight() + 8
+                    ancho = max(ancho, tarjeta['frame'].winfo_reqwidth())
 
-            # Animar SHORTS con deslizamiento
-            y_offset = 0
-            for idx, (dist, key, tarjeta) in enumerate(shorts_ordenados):
-                self.animar_tarjeta_a_posicion(tarjeta['frame'], y_offset)
-                y_offset += tarjeta['frame'].winfo_reqheight() + 8
+                # Con las tarjetas en place() el contenedor ya no toma tamaño de ellas:
+                # se fija como lo haría pack para que el scroll siga abarcando todo
+                container.configure(width=ancho + 16, height=max(y_offset, 1))
 
         except Exception as e:
             print(f"Error reordenando tarjetas: {e}")
@@ -882,137 +620,6 @@ class ShockDashboard:
         except Exception as e:
             pass  # Silenciar errores para evitar spam en consola
 
-    def recalcular_shock_individual(self, symbol):
-        def recalcular():
-            print(f"📊 Recalculando order book para {symbol}...")
-            sys.stdout.flush()
-
-            try:
-                order_books = cargar_libro_ordenes_api([symbol], self.base_url)
-
-                if symbol not in order_books:
-                    print(f"❌ No se pudo obtener order book para {symbol}")
-                    sys.stdout.flush()
-                    return
-
-                order_book = order_books[symbol]
-                agrupacion = self.agrupaciones[symbol]
-                tick = self.tick_sizes[symbol]
-                precio_actual = self.precios_actuales[symbol]
-
-                shocks_long, shocks_short, decimales_tick = calcular_shocks(
-                    order_book, agrupacion, tick)
-
-                # ARREGLADO: Usar índices consistentes (3 y 4) igual que en escaneo inicial
-                if len(shocks_long) >= 5:
-                    nuevo_shock_long = shocks_long[3]
-                    nuevo_stop_long = shocks_long[4]
-
-                    self.shocks_activos[symbol]['long'] = {
-                        'entrada': nuevo_shock_long,
-                        'stop': nuevo_stop_long
-                    }
-
-                    print(f"✅ {symbol} LONG actualizado - Nueva entrada: {nuevo_shock_long}")
-                    sys.stdout.flush()
-                elif len(shocks_long) >= 2:
-                    # Fallback: usar primeros 2 shocks
-                    nuevo_shock_long = shocks_long[0]
-                    nuevo_stop_long = shocks_long[1]
-
-                    self.shocks_activos[symbol]['long'] = {
-                        'entrada': nuevo_shock_long,
-                        'stop': nuevo_stop_long
-                    }
-
-                    print(f"⚠️ {symbol} LONG actualizado (fallback) - Nueva entrada: {nuevo_shock_long}")
-                    sys.stdout.flush()
-
-                if len(shocks_short) >= 5:
-                    nuevo_shock_short = shocks_short[3]
-                    nuevo_stop_short = shocks_short[4]
-
-                    self.shocks_activos[symbol]['short'] = {
-                        'entrada': nuevo_shock_short,
-                        'stop': nuevo_stop_short
-                    }
-
-                    print(f"✅ {symbol} SHORT actualizado - Nueva entrada: {nuevo_shock_short}")
-                    sys.stdout.flush()
-                elif len(shocks_short) >= 2:
-                    # Fallback: usar primeros 2 shocks
-                    nuevo_shock_short = shocks_short[0]
-                    nuevo_stop_short = shocks_short[1]
-
-                    self.shocks_activos[symbol]['short'] = {
-                        'entrada': nuevo_shock_short,
-                        'stop': nuevo_stop_short
-                    }
-
-                    print(f"⚠️ {symbol} SHORT actualizado (fallback) - Nueva entrada: {nuevo_shock_short}")
-                    sys.stdout.flush()
-
-                self.root.after(0, self.reconstruir_ui_desde_shocks)
-
-            except Exception as e:
-                print(f"Error recalculando shock para {symbol}: {e}")
-                sys.stdout.flush()
-
-        threading.Thread(target=recalcular, daemon=True).start()
-    
-    def reconstruir_ui_desde_shocks(self):
-        """Reconstruye la UI usando los shocks activos guardados"""
-        resultados_long = []
-        resultados_short = []
-        
-        for symbol, shocks in self.shocks_activos.items():
-            precio_actual = self.precios_actuales.get(symbol)
-            if precio_actual is None:
-                continue
-            
-            tick = self.tick_sizes.get(symbol, 0.01)
-            decimales = obtener_decimales_de_tick(tick)
-            agrupacion = self.agrupaciones.get(symbol, 0.01)
-            
-            if 'long' in shocks:
-                entrada = shocks['long']['entrada']
-                stop = shocks['long']['stop']
-                distancia_pct = abs((entrada - precio_actual) / precio_actual * 100)
-                
-                resultados_long.append({
-                    'symbol': symbol,
-                    'tipo': 'LONG',
-                    'entrada': entrada,
-                    'stop_loss': stop,
-                    'distancia_pct': distancia_pct,
-                    'precio_actual': precio_actual,
-                    'decimales': decimales,
-                    'agrupacion': agrupacion,
-                    'tick_size': tick
-                })
-            
-            if 'short' in shocks:
-                entrada = shocks['short']['entrada']
-                stop = shocks['short']['stop']
-                distancia_pct = abs((entrada - precio_actual) / precio_actual * 100)
-                
-                resultados_short.append({
-                    'symbol': symbol,
-                    'tipo': 'SHORT',
-                    'entrada': entrada,
-                    'stop_loss': stop,
-                    'distancia_pct': distancia_pct,
-                    'precio_actual': precio_actual,
-                    'decimales': decimales,
-                    'agrupacion': agrupacion,
-                    'tick_size': tick
-                })
-        
-        resultados_long.sort(key=lambda x: x['distancia_pct'])
-        resultados_short.sort(key=lambda x: x['distancia_pct'])
-        
-        self.actualizar_ui(resultados_long, resultados_short)
-    
     def actualizar_status(self, mensaje):
         """Actualiza el label de status"""
         try:
@@ -1021,55 +628,56 @@ class ShockDashboard:
             pass
     
     def actualizar_ui(self, longs, shorts):
-        """Actualiza la interfaz con los resultados"""
-        print(f"\n🎨 Actualizando UI con {len(longs)} LONGs y {len(shorts)} SHORTs...")
-        sys.stdout.flush()
-
-        for widget in self.long_container.winfo_children():
-            widget.destroy()
-        for widget in self.short_container.winfo_children():
-            widget.destroy()
-
-        self.tarjetas_activas.clear()
-
+        """Reconcilia las tarjetas con los resultados (clave symbol_tipo): crea las
+        nuevas, actualiza en el lugar las que cambiaron y elimina las que ya no están.
+        Las demás tarjetas no se tocan."""
         total = len(longs) + len(shorts)
         self.lbl_total.config(text=f"Total: {total}")
         self.lbl_longs.config(text=f"Longs: {len(longs)}")
         self.lbl_shorts.config(text=f"Shorts: {len(shorts)}")
 
-        print(f"   Creando {len(longs)} tarjetas LONG...")
-        sys.stdout.flush()
-        for idx, data in enumerate(longs):
-            try:
-                self.crear_tarjeta_shock(self.long_container, data, "LONG")
-                if (idx + 1) % 10 == 0:
-                    print(f"      {idx + 1}/{len(longs)} tarjetas LONG creadas")
-                    sys.stdout.flush()
-            except Exception as e:
-                print(f"   ❌ Error creando tarjeta LONG {data.get('symbol', '?')}: {e}")
-                sys.stdout.flush()
+        if self.lista_long is not None:
+            self.lista_long.actualizar(longs)
+            self.lista_short.actualizar(shorts)
+            return
+
+        nuevas = {}
+        for tipo, resultados in (("LONG", longs), ("SHORT", shorts)):
+            for data in resultados:
+                nuevas[f"{data['symbol']}_{tipo}"] = (tipo, data)
 
-        print(f"   Creando {len(shorts)} tarjetas SHORT...")
-        sys.stdout.flush()
-        for idx, data in enumerate(shorts):
+        eliminadas = 0
+        for key in [k for k in self.tarjetas_activas if k not in nuevas]:
+            self.tarjetas_activas.pop(key)['frame'].destroy()
+            eliminadas += 1
+
+        creadas = 0
+        actualizadas = 0
+        for key, (tipo, data) in nuevas.items():
+            tarjeta = self.tarjetas_activas.get(key)
             try:
-                self.crear_tarjeta_shock(self.short_container, data, "SHORT")
-                if (idx + 1) % 10 == 0:
-                    print(f"      {idx + 1}/{len(shorts)} tarjetas SHORT creadas")
-                    sys.stdout.flush()
+                if tarjeta is None:
+                    container = self.long_container if tipo == "LONG" else self.short_container
+                    self.crear_tarjeta_shock(container, data, tipo)
+                    creadas += 1
+                elif self.actualizar_tarjeta_shock(tarjeta, data):
+                    actualizadas += 1
             except Exception as e:
-                print(f"   ❌ Error creando tarjeta SHORT {data.get('symbol', '?')}: {e}")
+                print(f"   ❌ Error en tarjeta {tipo} {data.get('symbol', '?')}: {e}")
                 sys.stdout.flush()
 
-        print(f"✅ UI actualizada completamente\n")
-        sys.stdout.flush()
-
-        # Forzar actualización de la ventana
-        self.root.update_idletasks()
+        if creadas or actualizadas or eliminadas:
+            print(f"🎨 UI: {creadas} tarjetas nuevas, {actualizadas} actualizadas, {eliminadas} eliminadas "
+                  f"({len(longs)} LONGs, {len(shorts)} SHORTs)")
+            sys.stdout.flush()
+            # Las tarjetas nuevas necesitan su tamaño calculado antes de ubicarlas
+            self.root.update_idletasks()
+            self.reordenar_tarjetas_suave(forzar=True)
     
     def cerrar(self):
         """Cierra la aplicación correctamente"""
         self.actualizando = False
+        self.motor.detener()
         self.root.destroy()
 
 # ---------- EJECUTAR ----------
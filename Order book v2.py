@@ -1,14 +1,32 @@
+import argparse
 import websocket
 import json
-import requests
 import threading
 import asyncio
 import time
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import os
+import math
+import multiprocessing
+import signal
+from array import array
+from typing import Annotated
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client as ClienteIPC, Listener
+from fastapi import FastAPI, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 from binance.client import Client
-from collections import OrderedDict
+from tick_book import Ladder
+from book_checkpoint import cargar_checkpoint, guardar_checkpoint
+from book_deltas import HistorialDeltas, combinar
+from book_codec import encode_books, merge_books
+from decoders import decodificar_depth, symbol_de_stream
+from depth_buffer import BufferProfundidad
+from metrics import EscritorMetricas, Histograma, MetricasLibro
+from shm_books import NOMBRE_SEGMENTO, ExportadorLibros
+from shocks import AgregadorShocks, calcular_shocks, obtener_nivel_agrupacion_optimo, ticks_de_agrupacion
+from snapshot_scheduler import LIMITE_COMPLETO, SnapshotScheduler
+from stream_recorder import StreamRecorder, reproducir
 import sys
 import io
 
@@ -20,239 +38,419 @@ if sys.platform == 'win32':
 # ===== CONFIGURACIÓN BINANCE =====
 api_key = ''
 api_secret = ''
-client = Client(api_key=api_key, api_secret=api_secret)
+
+# ===== CONFIGURACIÓN DE INGESTA =====
+# "shards": los símbolos se reparten en NUM_SHARDS conexiones de streams combinados
+# "individual": una conexión (y un hilo) por símbolo
+INGEST_MODE = "shards"
+NUM_SHARDS = 4
+MAX_STREAMS_POR_SHARD = 200  # Límite de streams por conexión de Binance
+
+# Agrupaciones óptimas de shocks mantenidas incrementalmente por libro (las demás se
+# calculan completas); más de una cubre un precio que oscila en un cambio de escala
+MAX_AGREGADORES_POR_LIBRO = 2
+
+# ===== CONFIGURACIÓN DE PROCESOS =====
+# Con --procesos N el universo se reparte en N procesos trabajadores (cada uno con
+# sus WebSockets, sus libros y su propio GIL) detrás de una API frontal en PUERTO_API.
+# El trabajador i sirve además su API completa en PUERTO_API + 1 + i.
+PUERTO_API = 8000
+ESPERA_ARRANQUE_SHARD = 60  # Segundos máximos para que un trabajador publique su dirección IPC
+MAX_ESPERA_REINICIO = 300   # Tope de la espera (que se duplica) entre reinicios fallidos de un shard
+
+# ===== CONFIGURACIÓN DE SNAPSHOTS =====
+SNAPSHOT_WORKERS = 4        # Descargas de snapshots en paralelo (comparten un pool keep-alive)
+ESPERA_BUFFER = 3           # Segundos acumulando eventos antes de pedir el snapshot
+DISTANCIA_SIN_SHOCKS = 100.0  # Prioridad de los símbolos sin shocks calculados todavía
+MEJORAS_POR_MINUTO = 5      # Libros con snapshot reducido que se resincronizan completos por minuto
+
+# ===== CONFIGURACIÓN DE MEMORIA COMPARTIDA =====
+INTERVALO_SHM = 0.05  # Segundos entre publicaciones de los libros que cambiaron
+
+# ===== CONFIGURACIÓN DE CHECKPOINTS =====
+# Copia periódica de los libros en disco (None = desactivado). Al arrancar se
+# cargan y la API los sirve marcados como provisionales hasta que cada símbolo
+# termina su sincronización normal (snapshot + buffer).
+RUTA_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "orderbooks.ckpt")
+INTERVALO_CHECKPOINT = 30      # Segundos entre checkpoints
+MAX_EDAD_CHECKPOINT = 15 * 60  # Un checkpoint más viejo no se carga
 
 # Lista final de monedas perpetuas válidas
 coins = []
+# Tick size (PRICE_FILTER) de cada contrato, necesario para indexar precios por tick
+tick_sizes = {}
+
+# Libros de órdenes por símbolo. Cada libro tiene su propio lock: la ingesta de un
+# símbolo nunca espera a lecturas o escrituras de otro símbolo.
+order_books = {}
+
+# StreamRecorder activo cuando se arranca con --grabar
+grabador = None
+
+# ExportadorLibros activo cuando se arranca con --shm
+exportador = None
+
+# Archivo donde se guardan los checkpoints de este proceso (None = sin checkpoints)
+ruta_checkpoint = None
+
+def load_universe():
+    """Descarga los contratos de Binance y llena coins y tick_sizes"""
+    client = Client(api_key=api_key, api_secret=api_secret)
+
+    # 1️⃣ Obtener información completa de contratos de futuros
+    exchange_info = client.futures_exchange_info()
+
+    # 2️⃣ Filtrar solo los contratos PERPETUAL activos en USDT
+    perpetual_symbols = []
+    for s in exchange_info['symbols']:
+        if (
+            s['contractType'] == 'PERPETUAL'
+            and s['quoteAsset'] == 'USDT'
+            and s['status'] == 'TRADING'  # activos
+        ):
+            perpetual_symbols.append(s['symbol'])
+            for f in s['filters']:
+                if f['filterType'] == 'PRICE_FILTER':
+                    tick_sizes[s['symbol']] = float(f['tickSize'])
+
+    # 3️⃣ Obtener los tickers y cruzar con los perpetuos válidos
+    futures_info = client.futures_ticker()
+
+    for el in futures_info:
+        symbol = el['symbol']
+        if (
+            symbol in perpetual_symbols
+            and float(el.get('quoteVolume', 0)) > 200_000_000
+            and float(el.get('lastPrice', 0)) < 40
+        ):
+            coins.append(symbol)
+
+    print(f"✅ Se encontraron {len(coins)} monedas de Futuros PERPETUOS válidas:")
+    print(coins)
+
+def new_order_book(symbol):
+    """Estructura mejorada para el libro de órdenes de un símbolo"""
+    return {
+        "bids": Ladder(tick_sizes.get(symbol, 0.01), 'bids'),
+        "asks": Ladder(tick_sizes.get(symbol, 0.01), 'asks'),
+        "lastUpdateId": None,
+        "buffer": BufferProfundidad(),  # Eventos pre-sync consolidados por precio
+        "deltas": HistorialDeltas(),  # Cambios recientes para /orderbooks/{symbol}?since=u
+        "initialized": False,
+        "last_u": None,
+        "first_event_after_snapshot": True,  # Bandera para el primer evento
+        "provisional": None,  # time.time() del checkpoint cargado, hasta que el libro sincroniza
+        "distancia_shock": None,  # % del precio medio al shock más cercano (prioridad de snapshots)
+        "agregadores": {},  # agrupacion -> AgregadorShocks
+        "metricas": MetricasLibro(),
+        "lock": threading.Lock()
+    }
 
-# 1️⃣ Obtener información completa de contratos de futuros
-exchange_info = client.futures_exchange_info()
+def init_order_books(symbols):
+    for symbol in symbols:
+        order_books[symbol] = new_order_book(symbol)
+    print(f"Monedas de futuros monitoreadas: {symbols}")
 
-# 2️⃣ Filtrar solo los contratos PERPETUAL activos en USDT
-perpetual_symbols = []
-for s in exchange_info['symbols']:
-    if (
-        s['contractType'] == 'PERPETUAL'
-        and s['quoteAsset'] == 'USDT'
-        and s['status'] == 'TRADING'  # activos
-    ):
-        perpetual_symbols.append(s['symbol'])
+# ===== STREAM DE DELTAS (WebSocket /ws/books) =====
+# Cada suscriptor recibe un snapshot por símbolo y luego los deltas secuenciados
+# (pu = last_u anterior, u = nuevo last_u). Los mensajes se publican desde los
+# hilos de ingesta con el lock del libro tomado, así el orden es el del libro.
+MAX_COLA_SUSCRIPTOR = 10000  # Un cliente más lento que esto se desconecta y resincroniza
 
-# 3️⃣ Obtener los tickers y cruzar con los perpetuos válidos
-futures_info = client.futures_ticker()
+suscriptores = {}  # symbol -> tupla de SuscriptorDeltas (copy-on-write)
+suscriptores_lock = threading.Lock()
 
-for el in futures_info:
-    symbol = el['symbol']
-    if (
-        symbol in perpetual_symbols
-        and float(el.get('quoteVolume', 0)) > 200_000_000
-        and float(el.get('lastPrice', 0)) < 40
-    ):
-        coins.append(symbol)
+class SuscriptorDeltas:
+    """Cola de mensajes de un cliente de /ws/books en el event loop de la API"""
 
-print(f"✅ Se encontraron {len(coins)} monedas de Futuros PERPETUOS válidas:")
-print(coins)
+    def __init__(self, loop):
+        self.loop = loop
+        self.cola = asyncio.Queue()
+        self.desbordado = False
 
-# Estructura mejorada para los libros de órdenes
-order_books = {
-    symbol: {
-        "bids": OrderedDict(),
-        "asks": OrderedDict(),
-        "lastUpdateId": None,
-        "buffer": [],
-        "initialized": False,
-        "last_u": None,
-        "retry_count": 0,  # Para retry exponencial
-        "first_event_after_snapshot": True  # Bandera para el primer evento
-    } for symbol in coins
-}
-order_book_lock = threading.Lock()
+    def enviar(self, mensaje):
+        """Encola un mensaje desde cualquier hilo"""
+        self.loop.call_soon_threadsafe(self._encolar, mensaje)
+
+    def _encolar(self, mensaje):
+        if self.desbordado:
+            return
+        if self.cola.qsize() >= MAX_COLA_SUSCRIPTOR:
+            self.desbordado = True
+            self.cola.put_nowait(None)  # Señal de cierre para el emisor
+            return
+        self.cola.put_nowait(mensaje)
+
+def subscribe(symbol, suscriptor):
+    """Registra al suscriptor y le envía el snapshot actual de forma atómica"""
+    book = order_books[symbol]
+    with book['lock']:
+        with suscriptores_lock:
+            suscriptores[symbol] = suscriptores.get(symbol, ()) + (suscriptor,)
+        suscriptor.enviar(snapshot_message(symbol, book))
+
+def unsubscribe(symbol, suscriptor):
+    with suscriptores_lock:
+        restantes = tuple(s for s in suscriptores.get(symbol, ()) if s is not suscriptor)
+        if restantes:
+            suscriptores[symbol] = restantes
+        else:
+            suscriptores.pop(symbol, None)
+
+def snapshot_message(symbol, book):
+    """Mensaje de snapshot (llamar con el lock del libro tomado)"""
+    if not book['initialized']:
+        return {"type": "reset", "s": symbol}
+    return {
+        "type": "snapshot",
+        "s": symbol,
+        "last_u": book['last_u'],
+        "bids": book['bids'].copy(),
+        "asks": book['asks'].copy()
+    }
+
+def publish(symbol, mensaje):
+    for suscriptor in suscriptores.get(symbol, ()):
+        suscriptor.enviar(mensaje)
+
+def publish_delta(symbol, pu, data):
+    if symbol in suscriptores:
+        publish(symbol, {"type": "delta", "s": symbol, "pu": pu, "u": data['u'], "b": data['b'], "a": data['a']})
+
+def publish_snapshot(symbol, book):
+    if symbol in suscriptores:
+        publish(symbol, snapshot_message(symbol, book))
 
-print(f"Monedas de futuros monitoreadas: {coins}")
+def serialize_message(mensaje):
+    if mensaje['type'] == 'snapshot':
+        mensaje = dict(mensaje)
+        mensaje['bids'] = list(zip(*mensaje['bids'].arrays()))
+        mensaje['asks'] = list(zip(*mensaje['asks'].arrays()))
+    return json.dumps(mensaje)
 
 # ===== FUNCIONES DE ORDEN BOOK =====
-def get_order_book_snapshot(symbol):
-    url = f"https://fapi.binance.com/fapi/v1/depth?symbol={symbol}&limit=1000"
-    response = requests.get(url)
-    return response.json()
+def apply_snapshot(symbol, snap):
+    """Carga un snapshot descargado por el scheduler y procesa el buffer (True si quedó sincronizado)"""
+    if grabador is not None:
+        grabador.snapshot(symbol, snap)
+
+    book = order_books[symbol]
+    with book['lock']:
+        # Cargar snapshot (reemplaza todos los niveles)
+        book['bids'].load(snap['bids'])
+        book['asks'].load(snap['asks'])
+        for agregador in book['agregadores'].values():
+            agregador.reconstruir()
+
+        book['lastUpdateId'] = snap['lastUpdateId']
+        book['deltas'].reiniciar(snap['lastUpdateId'])
+        book['metricas'].snapshots += 1
+        print(f"📸 Snapshot cargado para {symbol} (lastUpdateId: {snap['lastUpdateId']}, niveles: {len(snap['bids'])}/{len(snap['asks'])}, buffer: {len(book['buffer'])} eventos)")
+
+    if process_buffer(symbol):
+        return True
+    book['metricas'].snapshots_fallidos += 1
+    return False
+
+def snapshot_priority(symbol):
+    """Menor = antes: los símbolos con un shock cerca del precio se recuperan primero"""
+    distancia = order_books[symbol]['distancia_shock']
+    return DISTANCIA_SIN_SHOCKS if distancia is None else distancia
+
+# Todas las descargas de snapshots pasan por aquí: pool keep-alive, presupuesto de
+# peso de Binance, prioridad por distancia al shock y un solo pedido por símbolo
+snapshot_scheduler = SnapshotScheduler(apply_snapshot, prioridad=snapshot_priority, trabajadores=SNAPSHOT_WORKERS)
 
 def process_buffer(symbol):
     """Procesa el buffer de eventos después de cargar el snapshot"""
-    with order_book_lock:
-        book = order_books[symbol]
+    book = order_books[symbol]
+    with book['lock']:
         lastUpdateId = book['lastUpdateId']
 
+        buffer = book['buffer']
+
         # Paso 4: Descartar eventos donde u < lastUpdateId
-        book['buffer'] = [e for e in book['buffer'] if e['u'] >= lastUpdateId]
+        buffer.descartar_hasta(lastUpdateId)
 
         # Paso 5: El primer evento debe tener U <= lastUpdateId AND u >= lastUpdateId
-        if not book['buffer']:
+        if not buffer:
             # Buffer vacío es normal en monedas de bajo volumen
             # Simplemente marcamos como inicializado y esperamos el siguiente evento
             book['initialized'] = True
+            book['provisional'] = None
             book['last_u'] = lastUpdateId
+            publish_snapshot(symbol, book)
             print(f"✅ Order book inicializado (esperando eventos): {symbol}")
             return True
 
-        first_event = book['buffer'][0]
-        if not (first_event['U'] <= lastUpdateId <= first_event['u']):
-            print(f"⚠️ Secuencia incorrecta para {symbol}. U={first_event['U']}, u={first_event['u']}, lastUpdateId={lastUpdateId}")
+        U, u = buffer.rango()
+        if not (U <= lastUpdateId <= u):
+            print(f"⚠️ Secuencia incorrecta para {symbol}. U={U}, u={u}, lastUpdateId={lastUpdateId}")
             return False
 
-        # Procesar todos los eventos del buffer
-        for event in book['buffer']:
+        # Procesar el buffer: cada tramo consolidado equivale a sus eventos en orden
+        for event in buffer.como_eventos():
             apply_order_book_update(symbol, event)
 
-        book['buffer'] = []
+        buffer.limpiar()
         book['initialized'] = True
+        book['provisional'] = None
+        # El buffer ya cubrió el snapshot: los eventos en vivo siguen con pu == last_u
+        book['first_event_after_snapshot'] = False
+        publish_snapshot(symbol, book)
         print(f"✅ Order book inicializado correctamente: {symbol}")
         return True
 
 def apply_order_book_update(symbol, data):
-    """Aplica una actualización al order book"""
+    """Aplica una actualización al order book (cantidad 0 elimina el nivel).
+
+    Los niveles de data['b'] y data['a'] llegan ya convertidos a floats por decodificar_depth.
+    """
+    inicio = time.perf_counter()
     book = order_books[symbol]
+    agregadores = list(book['agregadores'].values())
 
-    # Actualizar bids
+    # Actualizar bids (y los buckets de shocks con la diferencia de cantidad)
+    bids = book['bids']
+    ticks_bids = array('q')
     for price, qty in data['b']:
-        price_str = price
-        qty_float = float(qty)
-        if qty_float == 0:
-            book['bids'].pop(price_str, None)
-        else:
-            book['bids'][price_str] = qty
+        tick = bids.to_tick(price)
+        anterior = bids.set_tick(tick, qty)
+        for agregador in agregadores:
+            agregador.actualizar('bids', tick, anterior, qty)
+        ticks_bids.append(tick)
 
     # Actualizar asks
+    asks = book['asks']
+    ticks_asks = array('q')
     for price, qty in data['a']:
-        price_str = price
-        qty_float = float(qty)
-        if qty_float == 0:
-            book['asks'].pop(price_str, None)
-        else:
-            book['asks'][price_str] = qty
+        tick = asks.to_tick(price)
+        anterior = asks.set_tick(tick, qty)
+        for agregador in agregadores:
+            agregador.actualizar('asks', tick, anterior, qty)
+        ticks_asks.append(tick)
+
+    # Historial para ?since= (las cantidades tal como llegaron, 0 = nivel eliminado)
+    book['deltas'].registrar(
+        data['u'],
+        (ticks_bids, array('d', [qty for _, qty in data['b']])),
+        (ticks_asks, array('d', [qty for _, qty in data['a']])),
+    )
 
     # Actualizar last_u para verificación de continuidad
     book['last_u'] = data['u']
+    book['metricas'].apply.observar(time.perf_counter() - inicio)
 
 def on_message_combined(ws, message):
     """Maneja mensajes de streams combinados"""
-    try:
-        parsed = json.loads(message)
+    if grabador is not None:
+        grabador.grabar(message)  # Solo encola: comprimir y escribir es cosa del hilo del grabador
 
-        # Extraer símbolo del stream name: "btcusdt@depth@100ms" -> "BTCUSDT"
-        if 'stream' not in parsed:
+    try:
+        # Enrutar por el nombre del stream ("btcusdt@depth@100ms" -> "BTCUSDT") antes
+        # del parseo completo: los símbolos sin libro no se llegan a decodificar
+        symbol = symbol_de_stream(message)
+        book = order_books.get(symbol)
+        if book is None:
             return
 
-        stream_name = parsed['stream']
-        data = parsed['data']
-        symbol = stream_name.split('@')[0].upper()
-
-        with order_book_lock:
-            if symbol not in order_books:
-                return
+        # Parseo y conversión de niveles a float fuera del lock del libro
+        data = decodificar_depth(message)
+        if data is None:
+            return
 
-            book = order_books[symbol]
+        metricas = book['metricas']
+        inicio = time.perf_counter()
+        with book['lock']:
+            adquirido = time.perf_counter()
+            handle_depth_event(symbol, book, data)
+        liberado = time.perf_counter()
+
+        # Métricas fuera del lock: cada símbolo lo procesa un solo hilo de ingesta
+        metricas.eventos += 1
+        metricas.espera_lock.observar(adquirido - inicio)
+        metricas.lock_retenido.observar(liberado - adquirido)
+        metricas.ultimo_evento = time.time()
+        if 'E' in data:
+            metricas.retraso_ingesta = metricas.ultimo_evento - data['E'] / 1000
 
-            # Si no está inicializado, agregar al buffer (optimizado: consolidar eventos)
-            if not book['initialized']:
-                # Optimización: Si ya existe un evento que cubre este rango, eliminarlo
-                # Según Binance: "Por el mismo precio, la última actualización cubre la anterior"
-                book['buffer'] = [e for e in book['buffer'] if not (e['u'] < data['U'])]
-                book['buffer'].append(data)
-                return
-
-            # Paso 6: Verificar continuidad (pu debe ser igual al u anterior)
-            # Excepción: El primer evento después del snapshot puede tener pu < lastUpdateId
-            if book['first_event_after_snapshot']:
-                # Primer evento: validar que U <= lastUpdateId <= u (según docs Binance)
-                if data['U'] <= book['lastUpdateId'] <= data['u']:
-                    # Evento válido, procesar y desactivar bandera
-                    book['first_event_after_snapshot'] = False
-                    apply_order_book_update(symbol, data)
-                    return
-                elif data['u'] < book['lastUpdateId']:
-                    # Evento antiguo, ignorar
-                    return
-                else:
-                    # Evento no cubre el lastUpdateId, puede ser discontinuidad
-                    print(f"⚠️ Primer evento no cubre lastUpdateId en {symbol}. U={data['U']}, u={data['u']}, lastUpdateId={book['lastUpdateId']}")
-                    book['initialized'] = False
-                    book['buffer'] = [data]
-                    threading.Thread(target=reinitialize_symbol, args=(symbol,), daemon=True).start()
-                    return
-
-            # Validación normal de continuidad para eventos subsecuentes
-            if data['pu'] != book['last_u']:
-                print(f"⚠️ Discontinuidad detectada en {symbol}. Esperado pu={book['last_u']}, recibido pu={data['pu']}")
-                # Reiniciar el proceso
-                book['initialized'] = False
-                book['first_event_after_snapshot'] = True
-                book['buffer'] = [data]
-                threading.Thread(target=reinitialize_symbol, args=(symbol,), daemon=True).start()
-                return
+    except Exception as e:
+        print(f"💥 Error procesando mensaje: {e}")
 
-            # Aplicar la actualización
+def handle_depth_event(symbol, book, data):
+    """Aplica un evento de profundidad o lo deja en el buffer (llamar con el lock del libro tomado)"""
+    # Si no está inicializado, agregar al buffer (consolidado por precio en O(niveles del evento))
+    if not book['initialized']:
+        if not book['buffer'].agregar(data):
+            book['metricas'].discontinuidades += 1
+        return
+
+    # Paso 6: Verificar continuidad (pu debe ser igual al u anterior)
+    # Excepción: El primer evento después del snapshot puede tener pu < lastUpdateId
+    if book['first_event_after_snapshot']:
+        # Primer evento: validar que U <= lastUpdateId <= u (según docs Binance)
+        if data['U'] <= book['lastUpdateId'] <= data['u']:
+            # Evento válido, procesar y desactivar bandera
+            book['first_event_after_snapshot'] = False
+            pu = book['last_u']
             apply_order_book_update(symbol, data)
+            publish_delta(symbol, pu, data)
+            return
+        elif data['u'] < book['lastUpdateId']:
+            # Evento antiguo, ignorar
+            return
+        else:
+            # Evento no cubre el lastUpdateId, puede ser discontinuidad
+            book['metricas'].discontinuidades += 1
+            print(f"⚠️ Primer evento no cubre lastUpdateId en {symbol}. U={data['U']}, u={data['u']}, lastUpdateId={book['lastUpdateId']}")
+            book['initialized'] = False
+            book['buffer'].reiniciar(data)
+            publish_snapshot(symbol, book)
+            reinitialize_symbol(symbol)
+            return
 
-    except Exception as e:
-        print(f"💥 Error procesando mensaje: {e}")
+    # Validación normal de continuidad para eventos subsecuentes
+    if data['pu'] != book['last_u']:
+        book['metricas'].discontinuidades += 1
+        print(f"⚠️ Discontinuidad detectada en {symbol}. Esperado pu={book['last_u']}, recibido pu={data['pu']}")
+        # Reiniciar el proceso
+        book['initialized'] = False
+        book['first_event_after_snapshot'] = True
+        book['buffer'].reiniciar(data)
+        publish_snapshot(symbol, book)
+        reinitialize_symbol(symbol)
+        return
+
+    # Aplicar la actualización
+    pu = book['last_u']
+    apply_order_book_update(symbol, data)
+    publish_delta(symbol, pu, data)
 
 def reinitialize_symbol(symbol):
     """Reinicializa el order book de un símbolo"""
     print(f"🔄 Reinicializando {symbol}...")
-    time.sleep(1)  # Esperar un poco antes de reinicializar
     initialize_order_book(symbol)
 
-def initialize_order_book(symbol, retry_count=0):
-    """Inicializa el order book con snapshot y procesa buffer con retry exponencial"""
-    max_retries = 10
-    base_delay = 1
-    max_delay = 60
-
-    try:
-        # Esperar un poco para acumular eventos en el buffer
-        time.sleep(3)
-
-        # Paso 3: Obtener snapshot
-        snap = get_order_book_snapshot(symbol)
+def initialize_order_book(symbol, limite=None):
+    """Pide el snapshot al scheduler (pasos 2-5 del procedimiento de Binance).
 
-        with order_book_lock:
-            book = order_books[symbol]
-
-            # Limpiar order book
-            book['bids'].clear()
-            book['asks'].clear()
-
-            # Cargar snapshot
-            for bid in snap['bids']:
-                book['bids'][bid[0]] = bid[1]
-            for ask in snap['asks']:
-                book['asks'][ask[0]] = ask[1]
-
-            book['lastUpdateId'] = snap['lastUpdateId']
-            book['retry_count'] = 0  # Reset en caso de éxito
-            print(f"📸 Snapshot cargado para {symbol} (lastUpdateId: {snap['lastUpdateId']}, buffer: {len(book['buffer'])} eventos)")
-
-        # Procesar buffer
-        if not process_buffer(symbol):
-            # Si falla, reintentar con backoff exponencial
-            if retry_count < max_retries:
-                delay = min(base_delay * (2 ** retry_count), max_delay)
-                print(f"🔄 Reintentando inicialización de {symbol} en {delay}s (intento {retry_count + 1}/{max_retries})...")
-                time.sleep(delay)
-                initialize_order_book(symbol, retry_count + 1)
-            else:
-                print(f"❌ Máximo de reintentos alcanzado para {symbol}")
+    No bloquea: el scheduler espera ESPERA_BUFFER segundos para acumular eventos,
+    reintenta con backoff y descarta el pedido si ya hay uno pendiente del símbolo.
+    """
+    if snapshot_scheduler.solicitar(symbol, ESPERA_BUFFER, limite):
+        order_books[symbol]['metricas'].resyncs += 1
 
-    except Exception as e:
-        if retry_count < max_retries:
-            # Retry exponencial: 1s, 2s, 4s, 8s, 16s, 32s, 60s (max)
-            delay = min(base_delay * (2 ** retry_count), max_delay)
-            print(f"💥 Error inicializando {symbol}: {e}")
-            print(f"🔄 Reintentando en {delay}s (intento {retry_count + 1}/{max_retries})...")
-            time.sleep(delay)
-            initialize_order_book(symbol, retry_count + 1)
-        else:
-            print(f"❌ Error crítico en {symbol} después de {max_retries} intentos: {e}")
+def upgrade_reduced_books():
+    """Resincroniza con profundidad completa los libros cargados con snapshot reducido"""
+    for symbol in snapshot_scheduler.para_mejorar(MEJORAS_POR_MINUTO):
+        book = order_books[symbol]
+        with book['lock']:
+            book['initialized'] = False
+            book['buffer'].limpiar()
+            book['first_event_after_snapshot'] = True
+            publish_snapshot(symbol, book)
+        print(f"🔎 Mejorando profundidad del snapshot de {symbol}...")
+        initialize_order_book(symbol, LIMITE_COMPLETO)
 
 def start_individual_websockets():
     """Inicia WebSockets individuales para cada símbolo"""
@@ -304,100 +502,891 @@ def run_individual_websocket(symbol):
             print(f"💥 [{symbol}] Excepción en WebSocket: {e}")
 
         # Marcar el símbolo como no inicializado
-        with order_book_lock:
-            order_books[symbol]['initialized'] = False
-            order_books[symbol]['buffer'] = []
-            order_books[symbol]['first_event_after_snapshot'] = True
+        book = order_books[symbol]
+        with book['lock']:
+            book['initialized'] = False
+            book['buffer'].limpiar()
+            book['first_event_after_snapshot'] = True
+            publish_snapshot(symbol, book)
 
         print(f"⏳ [{symbol}] Esperando 5 segundos antes de reconectar...", flush=True)
         time.sleep(5)
 
-        # Esperar a que el WebSocket se reconecte y acumule eventos
-        print(f"📡 [{symbol}] Acumulando eventos del buffer...", flush=True)
-        time.sleep(3)
-
-        # Reinicializar el símbolo después de reconectar
+        # Reinicializar el símbolo mientras el WebSocket se reconecta
+        # (el scheduler espera ESPERA_BUFFER segundos para acumular eventos antes del snapshot)
         print(f"🔄 [{symbol}] Solicitando snapshot y reinicializando...", flush=True)
-        threading.Thread(target=initialize_order_book, args=(symbol,), daemon=True).start()
+        initialize_order_book(symbol)
+
+def repartir_en_shards(symbols, num_shards):
+    """Reparte los símbolos en shards respetando el máximo de streams por conexión"""
+    minimo = -(-len(symbols) // MAX_STREAMS_POR_SHARD)  # División entera hacia arriba
+    num_shards = max(num_shards, minimo, 1)
+    shards = [symbols[i::num_shards] for i in range(num_shards)]
+    return [shard for shard in shards if shard]
+
+def start_sharded_websockets():
+    """Inicia una conexión de streams combinados por shard"""
+    shards = repartir_en_shards(coins, NUM_SHARDS)
+    print(f"🚀 Iniciando {len(shards)} WebSockets combinados para {len(coins)} símbolos...")
+
+    for shard_id, symbols in enumerate(shards):
+        threading.Thread(
+            target=run_shard_websocket,
+            args=(shard_id, symbols),
+            daemon=True
+        ).start()
+        time.sleep(0.5)  # Pequeña pausa para evitar sobrecarga al inicio
+
+def run_shard_websocket(shard_id, symbols):
+    """Ejecuta un WebSocket de streams combinados para un grupo de símbolos.
+
+    La secuencia de cada símbolo la valida on_message_combined como siempre;
+    una caída de la conexión solo afecta (y resincroniza) a los símbolos del shard.
+    """
+    conexion_numero = 0
+    etiqueta = f"shard {shard_id}"
+
+    while True:
+        conexion_numero += 1
+        try:
+            # Crear streams combinados: "btcusdt@depth@100ms/ethusdt@depth@100ms/..."
+            streams = '/'.join(f"{symbol.lower()}@depth@100ms" for symbol in symbols)
+            url = f"wss://fstream.binance.com/stream?streams={streams}"
+
+            if conexion_numero == 1:
+                print(f"🔌 [{etiqueta}] Iniciando WebSocket con {len(symbols)} símbolos (conexión #{conexion_numero})...", flush=True)
+            else:
+                print(f"🔄 [{etiqueta}] Reconectando WebSocket (intento #{conexion_numero})...", flush=True)
+
+            def on_open_handler(_):
+                print(f"✅ [{etiqueta}] WebSocket conectado exitosamente", flush=True)
+
+            def on_error_handler(_, error):
+                print(f"⚠️ [{etiqueta}] Error WS: {error}", flush=True)
+
+            def on_close_handler(*args):
+                close_code = args[1] if len(args) > 1 else 'N/A'
+                print(f"❌ [{etiqueta}] WebSocket desconectado (código: {close_code})", flush=True)
+
+            ws = websocket.WebSocketApp(
+                url,
+                on_open=on_open_handler,
+                on_message=on_message_combined,
+                on_error=on_error_handler,
+                on_close=on_close_handler,
+            )
+            # Sin ping/pong - Binance maneja keep-alive automáticamente
+            ws.run_forever()
+        except Exception as e:
+            print(f"💥 [{etiqueta}] Excepción en WebSocket: {e}")
+
+        # Marcar los símbolos del shard como no inicializados
+        for symbol in symbols:
+            book = order_books[symbol]
+            with book['lock']:
+                book['initialized'] = False
+                book['buffer'].limpiar()
+                book['first_event_after_snapshot'] = True
+                publish_snapshot(symbol, book)
+
+        print(f"⏳ [{etiqueta}] Esperando 5 segundos antes de reconectar...", flush=True)
+        time.sleep(5)
+
+        # Reinicializar los símbolos mientras el WebSocket se reconecta: el scheduler
+        # reparte los snapshots según el presupuesto de peso y la prioridad
+        print(f"🔄 [{etiqueta}] Solicitando snapshots para {len(symbols)} símbolos...", flush=True)
+        for symbol in symbols:
+            initialize_order_book(symbol)
+
+# ===== GRABACIÓN Y REPLAY =====
+def start_recording(directorio):
+    """Graba los mensajes crudos de depth y los snapshots en segmentos comprimidos"""
+    global grabador
+    meta = {"symbols": coins, "tick_sizes": {symbol: tick_sizes[symbol] for symbol in coins if symbol in tick_sizes}}
+    grabador = StreamRecorder(directorio, meta=meta).iniciar()
+
+# ===== MEMORIA COMPARTIDA =====
+def start_shm_export(nombre):
+    """Publica el top de cada libro en memoria compartida para lectores del mismo host"""
+    global exportador
+    exportador = ExportadorLibros(list(order_books), nombre)
+    threading.Thread(target=run_shm_publisher, name="publicador-shm", daemon=True).start()
+    print(f"🧠 Libros exportados en memoria compartida '{nombre}' ({exportador.profundidad} niveles por lado)")
+
+def run_shm_publisher():
+    # Único escritor del segmento: solo copia los libros cuyo last_u cambió
+    while True:
+        try:
+            exportador.publicar_cambios(order_books)
+        except Exception as e:
+            print(f"❌ Error publicando libros en memoria compartida: {e}")
+        time.sleep(INTERVALO_SHM)
+
+# ===== CHECKPOINTS =====
+def load_checkpoint(ruta):
+    """Carga los libros del último checkpoint como provisionales (el buffer y el
+    snapshot siguen su curso: al sincronizar, el libro deja de ser provisional)"""
+    resultado = cargar_checkpoint(ruta)
+    if resultado is None:
+        return 0
+    guardado, libros = resultado
+    edad = time.time() - guardado
+    if edad > MAX_EDAD_CHECKPOINT:
+        print(f"⚠️ Checkpoint {ruta} demasiado viejo ({edad / 60:.0f} min), se ignora")
+        return 0
+
+    cargados = 0
+    for symbol, libro in libros.items():
+        book = order_books.get(symbol)
+        # Un tick_size distinto (cambio de PRICE_FILTER) invalida las claves guardadas
+        if book is None or libro['bids'].tick_size != book['bids'].tick_size:
+            continue
+        with book['lock']:
+            if book['initialized']:
+                continue
+            for side in ('bids', 'asks'):
+                book[side].keys = libro[side].keys
+                book[side].qtys = libro[side].qtys
+            book['lastUpdateId'] = libro['lastUpdateId']
+            book['last_u'] = libro['last_u']
+            book['provisional'] = guardado
+        cargados += 1
+
+    print(f"💾 Checkpoint cargado: {cargados} libros provisionales (guardados hace {edad:.0f}s)")
+    return cargados
+
+def save_checkpoint(ruta):
+    """Guarda los libros sincronizados. Bajo cada lock solo se copian los arrays."""
+    libros = []
+    for symbol, book in list(order_books.items()):
+        with book['lock']:
+            if not book['initialized']:
+                continue
+            libros.append({
+                "symbol": symbol,
+                "bids": book['bids'].copy(),
+                "asks": book['asks'].copy(),
+                "lastUpdateId": book['lastUpdateId'],
+                "last_u": book['last_u'],
+            })
+    if libros:
+        guardar_checkpoint(ruta, libros)
+    return len(libros)
+
+def start_checkpoints(ruta):
+    """Carga el checkpoint existente y guarda uno nuevo cada INTERVALO_CHECKPOINT segundos"""
+    global ruta_checkpoint
+    ruta_checkpoint = ruta
+    load_checkpoint(ruta)
+    threading.Thread(target=run_checkpoints, args=(ruta,), name="checkpoints", daemon=True).start()
+
+def run_checkpoints(ruta):
+    while True:
+        time.sleep(INTERVALO_CHECKPOINT)
+        try:
+            save_checkpoint(ruta)
+        except Exception as e:
+            print(f"❌ Error guardando checkpoint: {e}")
+
+def load_recorded_universe(meta):
+    """Crea los libros del universo de la grabación (registro meta de cada segmento)"""
+    tick_sizes.update(meta['tick_sizes'])
+    for symbol in meta['symbols']:
+        if symbol not in order_books:
+            coins.append(symbol)
+            order_books[symbol] = new_order_book(symbol)
+
+def run_replay(directorio, velocidad, nombre_shm=None):
+    """Reproduce una grabación sin red: los mensajes pasan por on_message_combined y
+    los snapshots por apply_snapshot en el mismo orden en que ocurrieron. Los
+    pedidos de resync quedan en la cola del scheduler, que no se arranca: el
+    snapshot que se usó en vivo llega desde la grabación."""
+    start_api()
+
+    def on_meta(meta):
+        load_recorded_universe(meta)
+        # El universo se conoce con el primer registro meta
+        if nombre_shm and exportador is None:
+            start_shm_export(nombre_shm)
+
+    print(f"⏯️ Reproduciendo {directorio} (velocidad: {velocidad if velocidad > 0 else 'máxima'})...", flush=True)
+    inicio = time.perf_counter()
+    cantidad = reproducir(
+        directorio,
+        lambda message: on_message_combined(None, message),
+        apply_snapshot,
+        on_meta=on_meta,
+        velocidad=velocidad,
+        prefijo="stream",
+    )
+    duracion = time.perf_counter() - inicio
+
+    initialized_count = sum(1 for b in order_books.values() if b['initialized'])
+    print(f"✅ Replay terminado: {cantidad} registros en {duracion:.1f}s | "
+          f"order books inicializados: {initialized_count}/{len(coins)}", flush=True)
+
+    # La API sigue sirviendo el estado final del replay
+    while True:
+        time.sleep(60)
+
+# ===== SHOCKS =====
+def compute_shocks(symbol, agrupacion=None, top=8):
+    """Calcula los shocks de un símbolo sobre el libro en memoria.
+
+    Devuelve None si el libro aún no está inicializado (ni cargado de un
+    checkpoint: en ese caso el resultado va con provisional=True). Si no se indica
+    agrupación se usa la óptima para el precio medio del libro.
+
+    Solo la agrupación óptima se mantiene de forma incremental (un cliente que
+    prueba agrupaciones no ocupa agregadores que después pagan cada delta). Si el
+    precio cambia de escala, la óptima nueva desplaza a la usada hace más tiempo
+    (como mucho MAX_AGREGADORES_POR_LIBRO por libro).
+    """
+    tick = tick_sizes.get(symbol, 0.01)
+    book = order_books[symbol]
+    with book['lock']:
+        if not book['initialized'] and book['provisional'] is None:
+            return None
+        bids = book['bids']
+        asks = book['asks']
+        last_u = book['last_u']
+        provisional = book['provisional'] is not None
+
+        mejor_bid = bids.best()
+        mejor_ask = asks.best()
+        if mejor_bid and mejor_ask:
+            precio_medio = (mejor_bid[0] + mejor_ask[0]) / 2
+        elif mejor_bid or mejor_ask:
+            precio_medio = (mejor_bid or mejor_ask)[0]
+        else:
+            precio_medio = None
+
+        optima = obtener_nivel_agrupacion_optimo(tick, precio_medio)
+        if agrupacion is None:
+            agrupacion = optima
+
+        agregadores = book['agregadores']
+        agregador = agregadores.pop(agrupacion, None)
+        if agregador is None and agrupacion == optima:
+            try:
+                agregador = AgregadorShocks(bids, asks, agrupacion)
+            except ValueError:
+                agregador = None  # Agrupación no múltiplo del tick: cálculo completo
+        if agregador is not None:
+            # Orden de uso en el dict: el primero es el usado hace más tiempo
+            agregadores[agrupacion] = agregador
+            while len(agregadores) > MAX_AGREGADORES_POR_LIBRO:
+                del agregadores[next(iter(agregadores))]
+            seleccion = agregador.seleccionar(top)
+        else:
+            bids = bids.copy()
+            asks = asks.copy()
+
+    # Fuera del lock: la ingesta del símbolo no espera al cálculo
+    if agregador is not None:
+        resultado = agregador.calcular(seleccion, top)
+    else:
+        resultado = calcular_shocks({'bids': bids, 'asks': asks}, agrupacion, tick, top)
+    shocks_long, shocks_short, decimales_tick = resultado
+
+    # Distancia al shock más cercano: prioridad del símbolo si hay que resincronizarlo
+    if precio_medio and (shocks_long or shocks_short):
+        book['distancia_shock'] = min(abs(s - precio_medio) for s in shocks_long + shocks_short) / precio_medio * 100
+
+    return {
+        "symbol": symbol,
+        "shocks_long": shocks_long,
+        "shocks_short": shocks_short,
+        "decimales": decimales_tick,
+        "agrupacion": agrupacion,
+        "tick_size": tick,
+        "precio_medio": precio_medio,
+        "last_u": last_u,
+        "provisional": provisional
+    }
 
 # ===== API LOCAL (FastAPI) =====
 app = FastAPI()
 
-@app.get("/orderbooks/{symbol}")
-def get_orderbook(symbol: str):
-    symbol = symbol.upper()
-    if symbol not in order_books:
-        return JSONResponse({"error": "Símbolo no monitoreado"}, status_code=404)
+# Latencia de la API por ruta. El middleware corre siempre en el event loop de
+# uvicorn, así que estos dicts solo los modifica un hilo.
+api_latency = {}   # (método, ruta) -> Histograma
+api_requests = {}  # (método, ruta, código) -> cantidad
+
+@app.middleware("http")
+async def measure_api_latency(request: Request, call_next):
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    duracion = time.perf_counter() - inicio
+
+    # Plantilla de la ruta (/orderbooks/{symbol}) para no crear una serie por símbolo
+    ruta = request.scope.get('route')
+    plantilla = ruta.path if ruta is not None else "desconocida"
+    clave = (request.method, plantilla)
+    histograma = api_latency.get(clave)
+    if histograma is None:
+        histograma = api_latency[clave] = Histograma()
+    histograma.observar(duracion)
+    clave_codigo = clave + (response.status_code,)
+    api_requests[clave_codigo] = api_requests.get(clave_codigo, 0) + 1
+    return response
+
+def limites_recorte(bids, asks, top=None, band_pct=None, ticks_por_bucket=None):
+    """Ticks límite (bids, asks) del recorte pedido; None = sin límite por precio.
+
+    band_pct: ±% alrededor del precio medio. Con agrupación, top cuenta buckets no
+    vacíos: el límite es el último tick del bucket número top desde el mejor precio.
+    """
+    limite_bids = limite_asks = None
+    mejor_bid = bids.best_tick()
+    mejor_ask = asks.best_tick()
+
+    if band_pct is not None:
+        medio = None
+        if mejor_bid is not None and mejor_ask is not None:
+            medio = (mejor_bid + mejor_ask) / 2
+        elif mejor_bid is not None or mejor_ask is not None:
+            medio = mejor_bid if mejor_bid is not None else mejor_ask
+        if medio is not None:
+            # round: que el error de float no deje afuera un tick justo en el borde
+            limite_bids = math.ceil(round(medio * (1 - band_pct / 100), 6))
+            limite_asks = math.floor(round(medio * (1 + band_pct / 100), 6))
+
+    if top is not None and ticks_por_bucket is not None:
+        limite = bids.limite_buckets(ticks_por_bucket, top)
+        if limite is not None:
+            limite_bids = limite if limite_bids is None else max(limite_bids, limite)
+        limite = asks.limite_buckets(ticks_por_bucket, top)
+        if limite is not None:
+            limite_asks = limite if limite_asks is None else min(limite_asks, limite)
+
+    return limite_bids, limite_asks
+
+def read_book(symbol, top=None, band_pct=None, ticks_por_bucket=None):
+    """Copia consistente de un libro inicializado o provisional (None si no es ninguno).
+
+    Bajo el lock solo se copian los arrays (memcpy); la serialización va afuera.
+    Con top/band_pct se copian solo los niveles pedidos (ver limites_recorte).
+    """
+    book = order_books[symbol]
+    with book['lock']:
+        if not book['initialized'] and book['provisional'] is None:
+            return None
+        bids = book['bids']
+        asks = book['asks']
+        if top is None and band_pct is None:
+            bids = bids.copy()
+            asks = asks.copy()
+        else:
+            limite_bids, limite_asks = limites_recorte(bids, asks, top, band_pct, ticks_por_bucket)
+            n = top if ticks_por_bucket is None else None
+            bids = bids.recorte(n, limite_bids)
+            asks = asks.recorte(n, limite_asks)
+        return {
+            "symbol": symbol,
+            "bids": bids,
+            "asks": asks,
+            "lastUpdateId": book['lastUpdateId'],
+            "last_u": book['last_u'],
+            "provisional": book['provisional'] is not None
+        }
 
-    with order_book_lock:
-        book = order_books[symbol]
-        if not book['initialized']:
-            return JSONResponse({"error": "Order book aún no inicializado"}, status_code=503)
+def book_to_json(copia):
+    # Convertir a diccionarios para compatibilidad con el bot de análisis
+    # (ya ordenados por precio desde el mejor nivel)
+    return {
+        "symbol": copia['symbol'],
+        "bids": copia['bids'].to_dict(),
+        "asks": copia['asks'].to_dict(),
+        "lastUpdateId": copia['lastUpdateId'],
+        "last_u": copia['last_u'],
+        # True: datos del último checkpoint mientras el libro se sincroniza
+        "provisional": copia['provisional']
+    }
 
-        # Convertir a diccionarios para compatibilidad con el bot de análisis
-        bids_dict = {price: qty for price, qty in book['bids'].items()}
-        asks_dict = {price: qty for price, qty in book['asks'].items()}
+def book_etag(libro):
+    """ETag de la versión de un libro o de una copia: last_u (lastUpdateId recién
+    cargado el snapshot).
+
+    Un libro provisional puede cambiar sin que cambie last_u: apply_snapshot
+    reemplaza los niveles y, si el buffer no encadena, el libro sigue provisional
+    con el last_u del checkpoint. Su ETag lleva también el lastUpdateId, que cada
+    snapshot cargado actualiza.
+    """
+    if libro['provisional']:
+        return f'"p{libro["lastUpdateId"]}-{libro["last_u"]}"'
+    version = libro['last_u'] if libro['last_u'] is not None else libro['lastUpdateId']
+    return f'"{version}"'
+
+def etag_coincide(if_none_match, etag):
+    for candidato in if_none_match.split(','):
+        candidato = candidato.strip()
+        if candidato == '*' or candidato.removeprefix('W/') == etag:
+            return True
+    return False
 
-        return JSONResponse({
+def read_etag(symbol):
+    """ETag actual de un libro servible (None si no está inicializado ni es provisional)"""
+    book = order_books[symbol]
+    with book['lock']:
+        if not book['initialized'] and book['provisional'] is None:
+            return None
+        return book_etag(book)
+
+def read_deltas(symbol, since):
+    """(entradas del historial posteriores a since, datos de versión) de un libro
+    sincronizado, o None si el historial no cubre since (va el libro completo)"""
+    book = order_books[symbol]
+    with book['lock']:
+        if not book['initialized']:
+            return None
+        entradas = book['deltas'].desde(since)
+        if entradas is None:
+            return None
+        return entradas, {
             "symbol": symbol,
-            "bids": bids_dict,
-            "asks": asks_dict,
             "lastUpdateId": book['lastUpdateId'],
-            "last_u": book['last_u']
-        })
+            "last_u": book['last_u'],
+            "provisional": False
+        }
+
+def deltas_to_json(symbol, since, entradas, version):
+    """Cambios desde since con el formato del libro (cantidad "0.0" = nivel eliminado)"""
+    bids, asks = combinar(entradas)
+    price_str = order_books[symbol]['bids'].price_str
+    respuesta = dict(version)
+    respuesta['bids'] = {price_str(tick): repr(bids[tick]) for tick in sorted(bids, reverse=True)}
+    respuesta['asks'] = {price_str(tick): repr(asks[tick]) for tick in sorted(asks)}
+    respuesta['since'] = since
+    respuesta['delta'] = True
+    return respuesta
+
+def lado_agrupado(ladder, ticks_por_bucket, top):
+    return {
+        ladder.price_str(tick): repr(round(qty, 8))
+        for tick, qty in ladder.agrupar(ticks_por_bucket, top)
+    }
+
+@app.get("/orderbooks/{symbol}")
+def get_orderbook(symbol: str, top: int = None, band_pct: float = None, agrupacion: float = None,
+                  since: int = None, if_none_match: Annotated[str, Header()] = None):
+    """Libro de un símbolo, completo o recortado.
+
+    top: solo los mejores N niveles por lado (N buckets si hay agrupación)
+    band_pct: solo los niveles a ±band_pct % del precio medio
+    agrupacion: suma las cantidades en buckets de ese tamaño (múltiplo del tick,
+                mismos buckets que /shocks); el precio es el inicio del bucket
+    since: last_u que ya tiene el cliente; responde solo los niveles que cambiaron
+           después ("delta": true) o, si el historial ya no llega, el libro
+           completo ("delta": false)
+
+    La respuesta lleva ETag (la versión del libro): con If-None-Match y el libro
+    sin cambios se responde 304 sin cuerpo.
+    """
+    symbol = symbol.upper()
+    if symbol not in order_books:
+        return JSONResponse({"error": "Símbolo no monitoreado"}, status_code=404)
+    if top is not None and top <= 0:
+        return JSONResponse({"error": "top debe ser mayor que 0"}, status_code=400)
+    if band_pct is not None and band_pct <= 0:
+        return JSONResponse({"error": "band_pct debe ser mayor que 0"}, status_code=400)
+    if since is not None and (top is not None or band_pct is not None or agrupacion is not None):
+        return JSONResponse({"error": "since no se combina con top, band_pct ni agrupacion"}, status_code=400)
+
+    if if_none_match is not None:
+        etag = read_etag(symbol)
+        if etag is not None and etag_coincide(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    if since is not None:
+        deltas = read_deltas(symbol, since)
+        if deltas is not None:
+            entradas, version = deltas
+            return JSONResponse(deltas_to_json(symbol, since, entradas, version),
+                                headers={"ETag": book_etag(version)})
+
+    ticks_por_bucket = None
+    if agrupacion is not None:
+        try:
+            ticks_por_bucket = ticks_de_agrupacion(agrupacion, order_books[symbol]['bids'].tick_size)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+    copia = read_book(symbol, top, band_pct, ticks_por_bucket)
+    if copia is None:
+        return JSONResponse({"error": "Order book aún no inicializado"}, status_code=503)
+    cabeceras = {"ETag": book_etag(copia)}
+
+    if ticks_por_bucket is None:
+        respuesta = book_to_json(copia)
+        if since is not None:
+            respuesta['delta'] = False
+        return JSONResponse(respuesta, headers=cabeceras)
+
+    return JSONResponse({
+        "symbol": copia['symbol'],
+        "bids": lado_agrupado(copia['bids'], ticks_por_bucket, top),
+        "asks": lado_agrupado(copia['asks'], ticks_por_bucket, top),
+        "lastUpdateId": copia['lastUpdateId'],
+        "last_u": copia['last_u'],
+        "provisional": copia['provisional'],
+        "agrupacion": agrupacion
+    }, headers=cabeceras)
+
+@app.get("/orderbooks")
+def get_orderbooks_bulk(symbols: str = None, format: str = "json", compress: bool = False):
+    """Varios libros en una sola respuesta.
+
+    symbols: lista separada por comas (por defecto todos los monitoreados)
+    format: "json" (mismo formato que /orderbooks/{symbol}) o "binary" (book_codec;
+            los libros provisionales van listados en la cabecera X-Provisional)
+    compress: comprime la respuesta binaria con zlib
+    """
+    if symbols:
+        lista = [s.strip().upper() for s in symbols.split(',') if s.strip()]
+    else:
+        lista = list(order_books.keys())
+
+    copias = []
+    pending = []
+    unknown = []
+    for sym in lista:
+        if sym not in order_books:
+            unknown.append(sym)
+            continue
+        copia = read_book(sym)
+        if copia is None:
+            pending.append(sym)
+        else:
+            copias.append(copia)
+
+    if format == "binary":
+        libros = []
+        for copia in copias:
+            bid_prices, bid_qtys = copia['bids'].arrays()
+            ask_prices, ask_qtys = copia['asks'].arrays()
+            libros.append({
+                "symbol": copia['symbol'],
+                "lastUpdateId": copia['lastUpdateId'],
+                "last_u": copia['last_u'],
+                "bid_prices": bid_prices,
+                "bid_qtys": bid_qtys,
+                "ask_prices": ask_prices,
+                "ask_qtys": ask_qtys
+            })
+        provisionales = [copia['symbol'] for copia in copias if copia['provisional']]
+        return Response(
+            content=encode_books(libros, comprimir=compress),
+            media_type="application/octet-stream",
+            headers={"X-Pending": ",".join(pending), "X-Unknown": ",".join(unknown),
+                     "X-Provisional": ",".join(provisionales)}
+        )
+
+    return JSONResponse({
+        "books": {copia['symbol']: book_to_json(copia) for copia in copias},
+        "pending": pending,
+        "unknown": unknown
+    })
+
+def parse_agrupacion(valor):
+    """Agrupación como float; ValueError si no es un número finito mayor que 0.
+    Puede no ser múltiplo del tick: esos casos usan el cálculo Decimal."""
+    try:
+        agrupacion = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"agrupacion inválida: {valor!r}")
+    if not math.isfinite(agrupacion) or agrupacion <= 0:
+        raise ValueError(f"agrupacion debe ser un número mayor que 0: {valor!r}")
+    return agrupacion
+
+def parse_agrupaciones(agrupaciones, lista):
+    """{symbol: agrupación} de la lista separada por comas alineada con lista (ValueError si no es válida)"""
+    valores = agrupaciones.split(',')
+    if len(valores) != len(lista):
+        raise ValueError("agrupaciones debe tener un valor por símbolo")
+    agrupacion_de = {}
+    for sym, valor in zip(lista, valores):
+        if valor.strip():
+            try:
+                agrupacion_de[sym] = parse_agrupacion(valor.strip())
+            except ValueError as e:
+                raise ValueError(f"{sym}: {e}")
+    return agrupacion_de
+
+@app.get("/shocks/{symbol}")
+def get_shocks(symbol: str, agrupacion: float = None, top: int = 8):
+    symbol = symbol.upper()
+    if symbol not in order_books:
+        return JSONResponse({"error": "Símbolo no monitoreado"}, status_code=404)
+    if agrupacion is not None:
+        try:
+            agrupacion = parse_agrupacion(agrupacion)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+    resultado = compute_shocks(symbol, agrupacion, top)
+    if resultado is None:
+        return JSONResponse({"error": "Order book aún no inicializado"}, status_code=503)
+    return JSONResponse(resultado)
+
+@app.get("/shocks")
+def get_shocks_bulk(symbols: str = None, agrupaciones: str = None, top: int = 8):
+    """Shocks de varios símbolos en una sola respuesta.
+
+    symbols: lista separada por comas (por defecto todos los monitoreados)
+    agrupaciones: lista separada por comas alineada con symbols (opcional)
+    """
+    if symbols:
+        lista = [s.strip().upper() for s in symbols.split(',') if s.strip()]
+    else:
+        lista = list(order_books.keys())
+
+    agrupaciones_por_simbolo = {}
+    if agrupaciones:
+        try:
+            agrupaciones_por_simbolo = parse_agrupaciones(agrupaciones, lista)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+    resultados = {}
+    pending = []
+    unknown = []
+    for sym in lista:
+        if sym not in order_books:
+            unknown.append(sym)
+            continue
+        resultado = compute_shocks(sym, agrupaciones_por_simbolo.get(sym), top)
+        if resultado is None:
+            pending.append(sym)
+        else:
+            resultados[sym] = resultado
+
+    return JSONResponse({
+        "shocks": resultados,
+        "pending": pending,
+        "unknown": unknown
+    })
+
+@app.websocket("/ws/books")
+async def stream_books(websocket: WebSocket, symbols: str = None):
+    """Stream de libros: snapshot inicial por símbolo y luego deltas secuenciados.
+
+    Mensajes: {"type": "snapshot", "s", "last_u", "bids", "asks"},
+    {"type": "delta", "s", "pu", "u", "b", "a"} y {"type": "reset", "s"} cuando el
+    libro se está resincronizando (llega un snapshot nuevo al terminar).
+    El cliente puede enviar {"resync": "SYMBOL"} para pedir un snapshot nuevo.
+    """
+    await websocket.accept()
+    if symbols:
+        lista = [s.strip().upper() for s in symbols.split(',') if s.strip().upper() in order_books]
+    else:
+        lista = list(order_books.keys())
+
+    suscriptor = SuscriptorDeltas(asyncio.get_running_loop())
+    for sym in lista:
+        subscribe(sym, suscriptor)
+
+    async def recibir_pedidos():
+        try:
+            async for texto in websocket.iter_text():
+                try:
+                    symbol = json.loads(texto).get('resync', '').upper()
+                except Exception:
+                    continue
+                if symbol in lista:
+                    book = order_books[symbol]
+                    with book['lock']:
+                        suscriptor.enviar(snapshot_message(symbol, book))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            suscriptor.cola.put_nowait(None)  # Cliente desconectado: terminar el emisor
+
+    receptor = asyncio.create_task(recibir_pedidos())
+    try:
+        while True:
+            mensaje = await suscriptor.cola.get()
+            if mensaje is None:
+                if suscriptor.desbordado:
+                    print("⚠️ Cliente de /ws/books demasiado lento, desconectando", flush=True)
+                    await websocket.close()
+                break
+            await websocket.send_text(serialize_message(mensaje))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receptor.cancel()
+        for sym in lista:
+            unsubscribe(sym, suscriptor)
 
 @app.get("/symbols")
 def get_symbols():
-    with order_book_lock:
-        initialized = [s for s, b in order_books.items() if b['initialized']]
-        pending = [s for s, b in order_books.items() if not b['initialized']]
+    # Lectura sin locks: 'initialized' es un bool y un valor momentáneamente
+    # desactualizado es aceptable para un resumen de estado
+    initialized = [s for s, b in order_books.items() if b['initialized']]
+    pending = [s for s, b in order_books.items() if not b['initialized']]
+    # Pendientes que ya se sirven con los datos del último checkpoint
+    provisional = [s for s, b in order_books.items() if b['provisional'] is not None]
 
     return {
         "symbols": list(order_books.keys()),
         "initialized": initialized,
-        "pending": pending
+        "pending": pending,
+        "provisional": provisional
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """Métricas de ingesta, libros y API en formato de texto de Prometheus.
+
+    Se leen sin locks: son contadores que solo escribe el hilo de ingesta de
+    cada símbolo, y un valor momentáneamente desactualizado no importa aquí.
+    """
+    ahora = time.time()
+    libros = list(order_books.items())
+    salida = EscritorMetricas()
+
+    def por_simbolo(valor):
+        return [({"symbol": symbol}, valor(book)) for symbol, book in libros]
+
+    # Ingesta por símbolo
+    salida.metrica("orderbook_events_total", "counter",
+                   "Eventos de depth procesados (rate() = eventos por segundo)",
+                   por_simbolo(lambda b: b['metricas'].eventos))
+    salida.metrica("orderbook_apply_seconds_total", "counter",
+                   "Tiempo total aplicando eventos al libro (qué símbolos cuestan más)",
+                   por_simbolo(lambda b: b['metricas'].apply.suma))
+    salida.metrica("orderbook_lock_hold_seconds_total", "counter",
+                   "Tiempo total con el lock del libro tomado por la ingesta",
+                   por_simbolo(lambda b: b['metricas'].lock_retenido.suma))
+    salida.metrica("orderbook_discontinuities_total", "counter",
+                   "Eventos fuera de secuencia (pu != last_u o primer evento sin cubrir el snapshot)",
+                   por_simbolo(lambda b: b['metricas'].discontinuidades))
+    salida.metrica("orderbook_resyncs_total", "counter",
+                   "Snapshots pedidos al scheduler",
+                   por_simbolo(lambda b: b['metricas'].resyncs))
+    salida.metrica("orderbook_snapshots_total", "counter",
+                   "Snapshots cargados",
+                   por_simbolo(lambda b: b['metricas'].snapshots))
+    salida.metrica("orderbook_snapshot_failures_total", "counter",
+                   "Snapshots que no encadenaron con el buffer",
+                   por_simbolo(lambda b: b['metricas'].snapshots_fallidos))
+
+    # Estado de cada libro
+    salida.metrica("orderbook_initialized", "gauge",
+                   "1 si el libro está sincronizado",
+                   por_simbolo(lambda b: int(b['initialized'])))
+    salida.metrica("orderbook_provisional", "gauge",
+                   "1 si el libro se sirve desde el checkpoint mientras se sincroniza",
+                   por_simbolo(lambda b: int(b['provisional'] is not None)))
+    salida.metrica("orderbook_buffer_events", "gauge",
+                   "Eventos en el buffer pre-sync",
+                   por_simbolo(lambda b: len(b['buffer'])))
+    salida.metrica("orderbook_buffer_dropped_events_total", "counter",
+                   "Eventos pre-sync perdidos por el límite del buffer (snapshot demasiado lento)",
+                   por_simbolo(lambda b: b['buffer'].descartados))
+    salida.metrica("orderbook_levels", "gauge", "Niveles por lado", [
+        ({"symbol": symbol, "side": side}, len(book[side])) for symbol, book in libros for side in ('bids', 'asks')
+    ])
+    salida.metrica("orderbook_bytes", "gauge",
+                   "Memoria estimada de los niveles del libro",
+                   por_simbolo(lambda b: b['bids'].nbytes() + b['asks'].nbytes()))
+    salida.metrica("orderbook_last_event_age_seconds", "gauge",
+                   "Segundos desde el último evento procesado (libro quieto o ingesta caída)", [
+        ({"symbol": symbol}, ahora - book['metricas'].ultimo_evento)
+        for symbol, book in libros if book['metricas'].ultimo_evento is not None
+    ])
+    salida.metrica("orderbook_ingest_lag_seconds", "gauge",
+                   "Retraso entre la hora del evento en Binance (E) y su procesamiento",
+                   por_simbolo(lambda b: b['metricas'].retraso_ingesta))
+
+    # Histogramas globales: suma de los de cada libro
+    for nombre, atributo, ayuda in (
+        ("orderbook_apply_seconds", "apply", "Latencia de apply_order_book_update por evento"),
+        ("orderbook_lock_wait_seconds", "espera_lock", "Espera de la ingesta por el lock del libro"),
+        ("orderbook_lock_hold_seconds", "lock_retenido", "Tiempo con el lock del libro tomado por evento"),
+    ):
+        total = Histograma()
+        for _, book in libros:
+            total.acumular(getattr(book['metricas'], atributo))
+        salida.histograma(nombre, ayuda, [({}, total)])
+
+    # Scheduler de snapshots y suscriptores
+    estado_snapshots = snapshot_scheduler.estado()
+    salida.metrica("snapshot_queue_pending", "gauge", "Snapshots en cola o en vuelo",
+                   [({}, estado_snapshots['pendientes'])])
+    salida.metrica("snapshot_weight_used", "gauge", "Peso de requests usado en el último minuto",
+                   [({}, estado_snapshots['peso_usado'])])
+    salida.metrica("snapshot_weight_limit", "gauge", "Peso de requests usable por minuto",
+                   [({}, estado_snapshots['peso_limite'])])
+    salida.metrica("ws_books_subscribers", "gauge", "Suscripciones activas a /ws/books",
+                   [({}, sum(len(s) for s in list(suscriptores.values())))])
+
+    # API
+    salida.histograma("api_request_duration_seconds", "Latencia de la API por ruta", [
+        ({"method": metodo, "route": ruta}, h) for (metodo, ruta), h in list(api_latency.items())
+    ])
+    salida.metrica("api_requests_total", "counter", "Requests a la API por ruta y código", [
+        ({"method": metodo, "route": ruta, "status": codigo}, cantidad)
+        for (metodo, ruta, codigo), cantidad in list(api_requests.items())
+    ])
+
+    return Response(salida.texto(), media_type=EscritorMetricas.CONTENT_TYPE)
+
 # ===== MAIN =====
-async def main():
-    # Iniciar WebSockets individuales (1 conexión por símbolo)
-    print("🚀 Iniciando WebSockets individuales...")
-    start_individual_websockets()
+def start_api(aplicacion=app, puerto=PUERTO_API):
+    """Inicia la API en un hilo independiente"""
+    threading.Thread(
+        target=uvicorn.run,
+        args=(aplicacion,),
+        kwargs={"host": "0.0.0.0", "port": puerto, "log_level": "info"},
+        daemon=True
+    ).start()
+
+    print(f"🚀 API de OrderBooks corriendo en http://localhost:{puerto}")
+
+async def main(puerto_api=PUERTO_API, ruta=RUTA_CHECKPOINT):
+    # Libros del último checkpoint y API desde el primer segundo: los clientes
+    # tienen datos (provisionales) mientras corre la sincronización
+    if ruta:
+        start_checkpoints(ruta)
+    start_api(puerto=puerto_api)
+
+    if INGEST_MODE == "individual":
+        # Iniciar WebSockets individuales (1 conexión por símbolo)
+        print("🚀 Iniciando WebSockets individuales...")
+        start_individual_websockets()
+    else:
+        # Iniciar WebSockets combinados (NUM_SHARDS conexiones para todo el universo)
+        print("🚀 Iniciando WebSockets combinados por shards...")
+        start_sharded_websockets()
 
     # Esperar para que empiecen a llegar eventos y se acumulen en el buffer
     print("⏳ Esperando acumulación de eventos...")
     await asyncio.sleep(5)
 
-    # Cargar snapshots e inicializar (pasos 2-5)
+    # Cargar snapshots e inicializar (pasos 2-5): el scheduler los descarga al ritmo
+    # que permite el límite de peso de Binance
+    snapshot_scheduler.iniciar()
     for symbol in coins:
-        threading.Thread(target=initialize_order_book, args=(symbol,), daemon=True).start()
-        await asyncio.sleep(0.2)  # Escalonar las peticiones
-
-    # Iniciar la API en otro hilo independiente
-    def start_api():
-        uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
-
-    threading.Thread(target=start_api, daemon=True).start()
-
-    print("🚀 API de OrderBooks corriendo en http://localhost:8000")
+        initialize_order_book(symbol)
 
     # Mantener vivo el proceso principal y mostrar estado cada 60 segundos
     while True:
         await asyncio.sleep(60)
 
-        # Recopilar estadísticas detalladas
-        with order_book_lock:
-            initialized_count = sum(1 for b in order_books.values() if b['initialized'])
-            pending_count = len(coins) - initialized_count
+        # Recopilar estadísticas detalladas (sin locks, no bloquea la ingesta)
+        initialized_count = sum(1 for b in order_books.values() if b['initialized'])
+        pending_count = len(coins) - initialized_count
 
-            # Contar símbolos con datos
-            symbols_con_datos = []
-            symbols_pendientes = []
-            for symbol, book in order_books.items():
-                if book['initialized']:
-                    symbols_con_datos.append(symbol)
-                else:
-                    symbols_pendientes.append(symbol)
+        # Contar símbolos con datos
+        symbols_con_datos = []
+        symbols_pendientes = []
+        for symbol, book in order_books.items():
+            if book['initialized']:
+                symbols_con_datos.append(symbol)
+            else:
+                symbols_pendientes.append(symbol)
 
         # Mostrar resumen de estado claro
         porcentaje = (initialized_count / len(coins) * 100) if len(coins) > 0 else 0
@@ -407,6 +1396,9 @@ async def main():
         print("="*80, flush=True)
         print(f"✅ Order books inicializados: {initialized_count}/{len(coins)} ({porcentaje:.1f}%)", flush=True)
         print(f"⏳ Pendientes de inicializar: {pending_count}", flush=True)
+        estado_snapshots = snapshot_scheduler.estado()
+        print(f"📸 Snapshots: {estado_snapshots['pendientes']} en cola, {estado_snapshots['descargados']} descargados, "
+              f"{estado_snapshots['reducidos']} con profundidad reducida | peso {estado_snapshots['peso_usado']}/{estado_snapshots['peso_limite']} por minuto", flush=True)
 
         if initialized_count == len(coins):
             print(f"🟢 SISTEMA OPERATIVO AL 100% - Todos los order books funcionando correctamente", flush=True)
@@ -417,8 +1409,400 @@ async def main():
         else:
             print(f"🔴 SISTEMA NO OPERATIVO - Ningún order book inicializado", flush=True)
 
-        print(f"🌐 API REST: http://localhost:8000/orderbooks/{{symbol}}", flush=True)
+        print(f"🌐 API REST: http://localhost:{puerto_api}/orderbooks/{{symbol}}", flush=True)
         print("="*80 + "\n", flush=True)
 
+        upgrade_reduced_books()
+
+# ===== MODO MULTIPROCESO =====
+# Proceso trabajador: dueño de un subconjunto de símbolos. Atiende pedidos del
+# frente por multiprocessing.connection llamando a los mismos endpoints de la API.
+ENDPOINTS_SHARD = {
+    "orderbook": get_orderbook,
+    "orderbooks": get_orderbooks_bulk,
+    "shock": get_shocks,
+    "shocks": get_shocks_bulk,
+    "symbols": get_symbols,
+}
+
+def serve_shard_connection(conexion):
+    while True:
+        try:
+            endpoint, parametros = conexion.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            respuesta = ENDPOINTS_SHARD[endpoint](**parametros)
+            if not isinstance(respuesta, Response):
+                respuesta = JSONResponse(respuesta)
+            # Solo viajan las cabeceras propias (X-Pending, X-Unknown) y el ETag; el resto las arma el frente
+            cabeceras = {k: v for k, v in respuesta.headers.items() if k.startswith("x-") or k == "etag"}
+            resultado = (respuesta.status_code, bytes(respuesta.body), respuesta.media_type, cabeceras)
+        except Exception as e:
+            resultado = (500, json.dumps({"error": str(e)}).encode(), "application/json", {})
+        try:
+            conexion.send(resultado)
+        except (EOFError, OSError):
+            break
+    conexion.close()
+
+def serve_shard_ipc(listener):
+    while True:
+        conexion = listener.accept()
+        threading.Thread(target=serve_shard_connection, args=(conexion,), daemon=True).start()
+
+# Cierre de un trabajador: puede llegar por el finally del hilo principal, por
+# watch_parent (el frente murió) o por SIGTERM (multiprocessing termina los hijos
+# daemon al salir el frente). Se ejecuta una sola vez; los demás esperan a que termine.
+cierre_shard_lock = threading.Lock()
+shard_cerrado = False
+
+def close_shard():
+    """Cierra el grabador y guarda el último checkpoint del trabajador"""
+    global shard_cerrado
+    with cierre_shard_lock:
+        if shard_cerrado:
+            return
+        shard_cerrado = True
+        if grabador is not None:
+            grabador.cerrar()
+        if ruta_checkpoint is not None:
+            save_checkpoint(ruta_checkpoint)
+            print(f"💾 Checkpoint final guardado en {ruta_checkpoint}", flush=True)
+
+def exit_shard():
+    # os._exit no ejecuta los finally: el cierre va antes
+    close_shard()
+    os._exit(0)
+
+def watch_parent(conexion):
+    # El frente nunca escribe en esta conexión: EOF significa que murió
+    try:
+        conexion.recv()
+    except (EOFError, OSError):
+        pass
+    exit_shard()
+
+def on_sigterm(signum, frame):
+    # En un hilo aparte: el hilo principal puede estar dentro de close_shard (con el lock tomado)
+    threading.Thread(target=exit_shard, name="cierre").start()
+
+def run_shard_process(shard_id, symbols, tick_sizes_shard, puerto_api, authkey, conexion, directorio_grabacion=None):
+    """Punto de entrada de cada proceso trabajador (multiprocessing spawn)"""
+    coins.extend(symbols)
+    tick_sizes.update(tick_sizes_shard)
+    init_order_books(coins)
+    if directorio_grabacion:
+        start_recording(os.path.join(directorio_grabacion, f"shard{shard_id}"))
+
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    threading.Thread(target=serve_shard_ipc, args=(listener,), name="ipc", daemon=True).start()
+    conexion.send(listener.address)
+    threading.Thread(target=watch_parent, args=(conexion,), daemon=True).start()
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    try:
+        asyncio.run(main(puerto_api, RUTA_CHECKPOINT and f"{RUTA_CHECKPOINT}.shard{shard_id}"))
+    finally:
+        close_shard()
+
+class ShardNoDisponible(Exception):
+    pass
+
+class Shard:
+    """Lado del frente de un proceso trabajador: lo lanza y le reenvía pedidos.
+
+    Las conexiones IPC no admiten pedidos concurrentes, así que cada hilo de la
+    API toma una conexión libre del pool (o abre una nueva) mientras espera.
+    """
+
+    def __init__(self, shard_id, symbols, authkey, directorio_grabacion=None):
+        self.shard_id = shard_id
+        self.symbols = symbols
+        self.puerto_api = PUERTO_API + 1 + shard_id
+        self.authkey = authkey
+        self.directorio_grabacion = directorio_grabacion
+        self.proceso = None
+        self.conexion_padre = None
+        self.direccion = None
+        self.libres = []
+        self.lock = threading.Lock()
+        self.espera_reinicio = 10
+        self.proximo_reinicio = 0
+
+    def iniciar(self, contexto):
+        """Lanza (o relanza) el trabajador. ShardNoDisponible si no llega a publicar su dirección"""
+        if self.conexion_padre is not None:
+            self.conexion_padre.close()  # Al cerrarla, el trabajador anterior (si sigue) se apaga
+            self.conexion_padre = None
+        if self.proceso is not None:
+            self.proceso.join(timeout=5)
+
+        padre, hijo = contexto.Pipe()
+        self.proceso = contexto.Process(
+            target=run_shard_process,
+            args=(self.shard_id, self.symbols, {s: tick_sizes[s] for s in self.symbols if s in tick_sizes},
+                  self.puerto_api, self.authkey, hijo, self.directorio_grabacion),
+            name=f"shard-{self.shard_id}",
+            daemon=True,
+        )
+        self.proceso.start()
+        hijo.close()
+        try:
+            if not padre.poll(ESPERA_ARRANQUE_SHARD):
+                raise TimeoutError(f"sin dirección IPC en {ESPERA_ARRANQUE_SHARD}s")
+            direccion = padre.recv()
+        except (EOFError, OSError) as e:
+            padre.close()
+            if self.proceso.is_alive():
+                self.proceso.terminate()
+            raise ShardNoDisponible(f"shard {self.shard_id} no arrancó: {type(e).__name__} {e}".strip())
+
+        with self.lock:
+            for conexion in self.libres:
+                conexion.close()
+            self.libres = []
+            self.direccion = direccion
+        self.conexion_padre = padre
+        print(f"🧩 Shard {self.shard_id}: {len(self.symbols)} símbolos | pid {self.proceso.pid} | API http://localhost:{self.puerto_api}")
+
+    def vivo(self):
+        return self.proceso is not None and self.proceso.is_alive()
+
+    def reiniciar(self, contexto):
+        """Relanza el trabajador caído; si falla, el próximo intento espera el doble (hasta MAX_ESPERA_REINICIO)"""
+        if time.monotonic() < self.proximo_reinicio:
+            return
+        try:
+            self.iniciar(contexto)
+            self.espera_reinicio = 10
+        except ShardNoDisponible as e:
+            print(f"❌ {e}, reintento en {self.espera_reinicio}s", flush=True)
+            self.proximo_reinicio = time.monotonic() + self.espera_reinicio
+            self.espera_reinicio = min(self.espera_reinicio * 2, MAX_ESPERA_REINICIO)
+
+    def llamar(self, endpoint, **parametros):
+        """(status, body, media_type, cabeceras) de un endpoint del trabajador"""
+        with self.lock:
+            conexion = self.libres.pop() if self.libres else None
+            direccion = self.direccion
+        if conexion is None and direccion is None:
+            raise ShardNoDisponible(f"shard {self.shard_id}: sin arrancar")
+        try:
+            if conexion is None:
+                conexion = ClienteIPC(direccion, authkey=self.authkey)
+            conexion.send((endpoint, parametros))
+            resultado = conexion.recv()
+        except (EOFError, OSError) as e:
+            if conexion is not None:
+                conexion.close()
+            raise ShardNoDisponible(f"shard {self.shard_id}: {type(e).__name__} {e}".strip())
+        with self.lock:
+            self.libres.append(conexion)
+        return resultado
+
+# Frente: enruta cada símbolo a su shard
+frente = FastAPI()
+shards = []
+shard_de_simbolo = {}
+ejecutor_frente = None  # Pedidos a varios shards en paralelo
+
+def respuesta_shard(resultado):
+    status, cuerpo, media_type, cabeceras = resultado
+    return Response(content=cuerpo, status_code=status, media_type=media_type, headers=cabeceras)
+
+def shard_no_disponible(e):
+    return JSONResponse({"error": f"Shard no disponible ({e})"}, status_code=503)
+
+def repartir_por_shard(symbols):
+    """{shard: [symbols]} y la lista de símbolos que ningún shard monitorea"""
+    por_shard = {}
+    unknown = []
+    for sym in symbols:
+        shard = shard_de_simbolo.get(sym)
+        if shard is None:
+            unknown.append(sym)
+        else:
+            por_shard.setdefault(shard, []).append(sym)
+    return por_shard, unknown
+
+def lista_de_simbolos(symbols):
+    if symbols:
+        return [s.strip().upper() for s in symbols.split(',') if s.strip()]
+    return list(shard_de_simbolo)
+
+@frente.get("/orderbooks/{symbol}")
+def front_get_orderbook(symbol: str, top: int = None, band_pct: float = None, agrupacion: float = None,
+                        since: int = None, if_none_match: Annotated[str, Header()] = None):
+    symbol = symbol.upper()
+    shard = shard_de_simbolo.get(symbol)
+    if shard is None:
+        return JSONResponse({"error": "Símbolo no monitoreado"}, status_code=404)
+    try:
+        return respuesta_shard(shard.llamar("orderbook", symbol=symbol, top=top, band_pct=band_pct,
+                                            agrupacion=agrupacion, since=since, if_none_match=if_none_match))
+    except ShardNoDisponible as e:
+        return shard_no_disponible(e)
+
+@frente.get("/shocks/{symbol}")
+def front_get_shocks(symbol: str, agrupacion: float = None, top: int = 8):
+    symbol = symbol.upper()
+    shard = shard_de_simbolo.get(symbol)
+    if shard is None:
+        return JSONResponse({"error": "Símbolo no monitoreado"}, status_code=404)
+    try:
+        return respuesta_shard(shard.llamar("shock", symbol=symbol, agrupacion=agrupacion, top=top))
+    except ShardNoDisponible as e:
+        return shard_no_disponible(e)
+
+def llamar_shards(por_shard, endpoint, parametros_de):
+    """Llama a endpoint en cada shard en paralelo. Devuelve [(símbolos, resultado o None)]."""
+    def llamar(item):
+        shard, simbolos = item
+        try:
+            return simbolos, shard.llamar(endpoint, **parametros_de(simbolos))
+        except ShardNoDisponible as e:
+            print(f"⚠️ {e}")
+            return simbolos, None
+    return list(ejecutor_frente.map(llamar, por_shard.items()))
+
+@frente.get("/orderbooks")
+def front_get_orderbooks_bulk(symbols: str = None, format: str = "json", compress: bool = False):
+    por_shard, unknown = repartir_por_shard(lista_de_simbolos(symbols))
+    resultados = llamar_shards(
+        por_shard, "orderbooks",
+        lambda simbolos: {"symbols": ",".join(simbolos), "format": format, "compress": False},
+    )
+
+    pending = []
+    if format == "binary":
+        cuerpos = []
+        provisionales = []
+        for simbolos, resultado in resultados:
+            if resultado is None or resultado[0] != 200:
+                pending.extend(simbolos)
+                continue
+            cuerpos.append(resultado[1])
+            pending.extend(p for p in resultado[3].get("x-pending", "").split(",") if p)
+            provisionales.extend(p for p in resultado[3].get("x-provisional", "").split(",") if p)
+        return Response(
+            content=merge_books(cuerpos, comprimir=compress),
+            media_type="application/octet-stream",
+            headers={"X-Pending": ",".join(pending), "X-Unknown": ",".join(unknown),
+                     "X-Provisional": ",".join(provisionales)}
+        )
+
+    books = {}
+    for simbolos, resultado in resultados:
+        if resultado is None or resultado[0] != 200:
+            pending.extend(simbolos)
+            continue
+        parcial = json.loads(resultado[1])
+        books.update(parcial["books"])
+        pending.extend(parcial["pending"])
+    return JSONResponse({"books": books, "pending": pending, "unknown": unknown})
+
+@frente.get("/shocks")
+def front_get_shocks_bulk(symbols: str = None, agrupaciones: str = None, top: int = 8):
+    lista = lista_de_simbolos(symbols)
+    agrupacion_de = {}
+    if agrupaciones:
+        # Se valida acá: un valor inválido en un shard dejaría sus símbolos como pendientes
+        try:
+            agrupacion_de = parse_agrupaciones(agrupaciones, lista)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+    por_shard, unknown = repartir_por_shard(lista)
+    resultados = llamar_shards(por_shard, "shocks", lambda simbolos: {
+        "symbols": ",".join(simbolos),
+        "agrupaciones": ",".join(repr(agrupacion_de[s]) if s in agrupacion_de else "" for s in simbolos)
+                        if agrupacion_de else None,
+        "top": top,
+    })
+
+    shocks = {}
+    pending = []
+    for simbolos, resultado in resultados:
+        if resultado is None or resultado[0] != 200:
+            pending.extend(simbolos)
+            continue
+        parcial = json.loads(resultado[1])
+        shocks.update(parcial["shocks"])
+        pending.extend(parcial["pending"])
+    return JSONResponse({"shocks": shocks, "pending": pending, "unknown": unknown})
+
+@frente.get("/symbols")
+def front_get_symbols():
+    resultado_total = {"symbols": [], "initialized": [], "pending": [], "provisional": []}
+    for simbolos, resultado in llamar_shards({shard: shard.symbols for shard in shards}, "symbols", lambda simbolos: {}):
+        if resultado is None:
+            # Shard caído: sus símbolos cuentan como pendientes
+            resultado_total["symbols"].extend(simbolos)
+            resultado_total["pending"].extend(simbolos)
+            continue
+        parcial = json.loads(resultado[1])
+        for clave in resultado_total:
+            resultado_total[clave].extend(parcial[clave])
+    return resultado_total
+
+def run_multiprocess(num_procesos, directorio_grabacion=None):
+    """Reparte coins en num_procesos trabajadores y sirve la API frontal en PUERTO_API"""
+    global ejecutor_frente
+    contexto = multiprocessing.get_context("spawn")  # Igual en Windows y Linux, sin heredar hilos
+    authkey = os.urandom(16)
+
+    for shard_id, symbols in enumerate(repartir_en_shards(coins, num_procesos)):
+        shard = Shard(shard_id, symbols, authkey, directorio_grabacion)
+        shard.reiniciar(contexto)  # Si no arranca, el bucle de vigilancia lo reintenta
+        shards.append(shard)
+        for symbol in symbols:
+            shard_de_simbolo[symbol] = shard
+
+    ejecutor_frente = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="frente")
+    start_api(frente)
+
+    # Vigilar a los trabajadores: un shard caído se vuelve a lanzar con los mismos símbolos
+    while True:
+        time.sleep(10)
+        for shard in shards:
+            if not shard.vivo():
+                if shard.conexion_padre is not None:
+                    print(f"❌ Shard {shard.shard_id} terminó (código {shard.proceso.exitcode}), reiniciando...", flush=True)
+                shard.reiniciar(contexto)
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Servidor de order books de Binance Futures")
+    parser.add_argument("--grabar", metavar="DIR", help="graba los streams de depth y los snapshots en DIR")
+    parser.add_argument("--replay", metavar="DIR", help="reproduce una grabación de DIR sin conectarse a Binance")
+    parser.add_argument("--velocidad", type=float, default=1.0, help="velocidad del replay (0 = sin esperas)")
+    parser.add_argument("--shm", metavar="NOMBRE", nargs="?", const=NOMBRE_SEGMENTO,
+                        help=f"exporta los libros en memoria compartida (por defecto '{NOMBRE_SEGMENTO}')")
+    parser.add_argument("--procesos", type=int, default=0,
+                        help="reparte los símbolos en N procesos trabajadores detrás de una API frontal")
+    args = parser.parse_args()
+
+    try:
+        if args.replay:
+            run_replay(args.replay, args.velocidad, args.shm)
+        elif args.procesos > 0:
+            if args.shm:
+                print("⚠️ --shm no está disponible con --procesos: cada trabajador tiene sus propios libros")
+            load_universe()
+            run_multiprocess(args.procesos, args.grabar)
+        else:
+            load_universe()
+            init_order_books(coins)
+            if args.grabar:
+                start_recording(args.grabar)
+            if args.shm:
+                start_shm_export(args.shm)
+            asyncio.run(main())
+    finally:
+        if grabador is not None:
+            grabador.cerrar()
+        if exportador is not None:
+            exportador.cerrar()
+        # Último checkpoint al cerrar: el próximo arranque empieza con los libros de ahora
+        if ruta_checkpoint is not None:
+            save_checkpoint(ruta_checkpoint)
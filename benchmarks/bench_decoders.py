@@ -0,0 +1,128 @@
+"""Benchmark de decodificación de mensajes de depth y ticker.
+
+Compara, para cada backend JSON disponible (orjson, ujson, json):
+- depth "anterior": parseo completo + split del stream + conversión de niveles
+- depth "rápido": enrutado con symbol_de_stream + decodificar_depth
+- ticker "anterior": parseo completo del ticker de 24h
+- ticker "rápido": extraer_ticker (slicing de 's' y 'c')
+
+Los mensajes son sintéticos salvo que se pase --grabacion con el directorio de
+una grabación de stream_recorder (servidor con --grabar y/o tickers de Oraculo).
+
+Uso:
+    python benchmarks/bench_decoders.py --eventos 20000
+    python benchmarks/bench_decoders.py --grabacion grabaciones/
+"""
+import argparse
+import json
+import time
+
+from common import eventos_sinteticos, mensaje_combinado, ticker_combinado
+
+import decoders
+from stream_recorder import leer_grabacion
+
+
+def cargar_grabacion(directorio):
+    depth = []
+    tickers = []
+    for _, tipo, _, message in leer_grabacion(directorio):
+        if tipo != "ws":
+            continue
+        if '@ticker' in message[:40]:
+            tickers.append(message)
+        elif '@depth' in message[:40]:
+            depth.append(message)
+    return depth, tickers
+
+
+def mensajes_sinteticos(simbolos, eventos):
+    por_simbolo = max(1, eventos // simbolos)
+    depth = []
+    tickers = []
+    for i in range(simbolos):
+        symbol = f"SIM{i}USDT"
+        depth.extend(mensaje_combinado(e) for e in eventos_sinteticos(symbol, por_simbolo, semilla=i))
+        tickers.extend(ticker_combinado(symbol, 1.0 + j * 0.0001, j) for j in range(por_simbolo))
+    return depth, tickers
+
+
+def depth_anterior(message):
+    parsed = decoders.loads(message)
+    symbol = parsed['stream'].split('@')[0].upper()
+    data = parsed['data']
+    niveles = [(float(p), float(q)) for p, q in data['b']] + [(float(p), float(q)) for p, q in data['a']]
+    return symbol, niveles
+
+
+def depth_rapido(message):
+    symbol = decoders.symbol_de_stream(message)
+    return symbol, decoders.decodificar_depth(message)
+
+
+def ticker_anterior(message):
+    data = decoders.loads(message)['data']
+    return data['s'], float(data['c'])
+
+
+def cronometrar(funcion, mensajes, repeticiones):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for mensaje in mensajes:
+            funcion(mensaje)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grabacion", help="directorio con una grabación de stream_recorder")
+    parser.add_argument("--simbolos", type=int, default=20)
+    parser.add_argument("--eventos", type=int, default=20000, help="mensajes sintéticos de cada tipo")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    if args.grabacion:
+        depth, tickers = cargar_grabacion(args.grabacion)
+    else:
+        depth, tickers = mensajes_sinteticos(args.simbolos, args.eventos)
+    print(f"📦 {len(depth)} mensajes de depth | {len(tickers)} tickers")
+
+    pruebas = [
+        ("depth", "anterior", depth_anterior, depth),
+        ("depth", "rápido", depth_rapido, depth),
+        ("ticker", "anterior", ticker_anterior, tickers),
+        ("ticker", "rápido", decoders.extraer_ticker, tickers),
+    ]
+
+    resultados = []
+    backend_original = decoders.BACKEND
+    for backend in decoders.BACKENDS:
+        decoders.usar_backend(backend)
+        for tipo, ruta, funcion, mensajes in pruebas:
+            if not mensajes:
+                continue
+            # decodificar_depth modifica el dict, por eso cada pasada parsea el texto original
+            duracion = cronometrar(funcion, mensajes, args.repeticiones)
+            r = {
+                "backend": backend,
+                "tipo": tipo,
+                "ruta": ruta,
+                "mensajes": len(mensajes),
+                "us_por_mensaje": duracion / len(mensajes) * 1e6,
+                "mensajes_por_segundo": len(mensajes) / duracion if duracion else 0.0,
+            }
+            resultados.append(r)
+            print(f"{backend:>7} | {tipo:>6} {ruta:>8}: {r['us_por_mensaje']:7.2f} µs/msg "
+                  f"| {r['mensajes_por_segundo']:>10.0f} msg/s")
+    decoders.usar_backend(backend_original)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark de contención de locks entre la ingesta y las lecturas de la API.
+
+Mide cuánto espera el hilo de ingesta por el lock de cada evento mientras varios
+hilos lectores piden libros completos con get_orderbook. Compara:
+- "global": todos los libros comparten un único lock (esquema anterior)
+- "por_simbolo": cada libro tiene su propio lock (esquema actual)
+
+Uso:
+    python benchmarks/bench_lock_contention.py --simbolos 50 --niveles 5000 --lectores 4
+"""
+import argparse
+import json
+import threading
+import time
+
+from common import cargar_servidor, eventos_sinteticos, mensaje_combinado, percentil, preparar_libro
+
+
+class LockCronometrado:
+    """Envuelve un Lock y registra la espera de adquisición del hilo de ingesta"""
+
+    def __init__(self, lock, esperas, hilo_ingesta):
+        self._lock = lock
+        self._esperas = esperas
+        self._hilo_ingesta = hilo_ingesta
+
+    def __enter__(self):
+        inicio = time.perf_counter()
+        self._lock.acquire()
+        if threading.get_ident() == self._hilo_ingesta:
+            self._esperas.append(time.perf_counter() - inicio)
+        return self
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
+def ejecutar_escenario(servidor, modo, simbolos, niveles, eventos_por_simbolo, lectores):
+    for symbol in simbolos:
+        preparar_libro(servidor, symbol, niveles)
+
+    esperas = []
+    hilo_ingesta = threading.get_ident()
+    lock_compartido = threading.Lock()
+    for symbol in simbolos:
+        base = lock_compartido if modo == "global" else threading.Lock()
+        servidor.order_books[symbol]['lock'] = LockCronometrado(base, esperas, hilo_ingesta)
+
+    # Intercalar los eventos de todos los símbolos como en un stream combinado
+    por_simbolo = [
+        [mensaje_combinado(e) for e in eventos_sinteticos(symbol, eventos_por_simbolo, niveles=niveles, semilla=i)]
+        for i, symbol in enumerate(simbolos)
+    ]
+    mensajes = [m for grupo in zip(*por_simbolo) for m in grupo]
+
+    detener = threading.Event()
+    lecturas = [0]
+
+    def lector(indice):
+        i = indice
+        while not detener.is_set():
+            servidor.get_orderbook(simbolos[i % len(simbolos)])
+            lecturas[0] += 1
+            i += 1
+
+    hilos = [threading.Thread(target=lector, args=(i,), daemon=True) for i in range(lectores)]
+    for hilo in hilos:
+        hilo.start()
+
+    inicio = time.perf_counter()
+    for mensaje in mensajes:
+        servidor.on_message_combined(None, mensaje)
+    duracion = time.perf_counter() - inicio
+
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+
+    return {
+        "modo": modo,
+        "eventos": len(mensajes),
+        "lecturas": lecturas[0],
+        "eventos_por_segundo": len(mensajes) / duracion if duracion else 0.0,
+        "espera_media_us": sum(esperas) / len(esperas) * 1e6 if esperas else 0.0,
+        "espera_p99_us": percentil(esperas, 99) * 1e6,
+        "espera_max_us": max(esperas) * 1e6 if esperas else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--simbolos", type=int, default=50)
+    parser.add_argument("--niveles", type=int, default=5000)
+    parser.add_argument("--eventos", type=int, default=200, help="eventos por símbolo")
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    servidor = cargar_servidor()
+    simbolos = [f"SIM{i}USDT" for i in range(args.simbolos)]
+
+    resultados = []
+    for modo in ("global", "por_simbolo"):
+        r = ejecutar_escenario(servidor, modo, simbolos, args.niveles, args.eventos, args.lectores)
+        resultados.append(r)
+        print(f"{modo:>12}: {r['eventos_por_segundo']:>10.0f} ev/s | espera media {r['espera_media_us']:8.1f} µs "
+              f"| p99 {r['espera_p99_us']:8.1f} µs | máx {r['espera_max_us']:9.1f} µs | lecturas {r['lecturas']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
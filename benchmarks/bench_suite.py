@@ -0,0 +1,371 @@
+"""Suite de microbenchmarks de los caminos calientes del libro y de los shocks.
+
+Mide:
+- apply:         apply_order_book_update por evento según el tamaño del libro
+- buffer:        on_message_combined con el libro sin inicializar (buffer pre-sync)
+- get_orderbook: copia + serialización JSON de /orderbooks/{symbol} (1k-20k niveles),
+  completo y recortado con top / band_pct / agrupacion
+- shocks:        obtener_nivel_agrupacion_optimo, calcular_shocks (NumPy y Decimal)
+                 y compute_shocks del servidor (agregador incremental) por símbolo
+- escaneo:       escaneo completo de MotorOraculo sobre N símbolos, con la red
+                 reemplazada por la API del servidor en proceso (TestClient), y
+                 el tiempo hasta las primeras tarjetas publicadas
+- replay:        ingesta completa de una grabación (solo con --grabacion)
+
+Los resultados se guardan en JSON con el commit y las versiones para comparar
+entre versiones; --comparar muestra la variación contra un JSON anterior.
+
+Uso:
+    python benchmarks/bench_suite.py --json resultados.json
+    python benchmarks/bench_suite.py --solo apply,shocks --comparar resultados.json
+    python benchmarks/bench_suite.py --grabacion grabaciones/ --json replay.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import (
+    RAIZ, TICK, cargar_servidor, eventos_sinteticos, mensaje_combinado, percentil, preparar_libro,
+)
+
+import decoders
+import shocks
+
+BENCHMARKS = ("apply", "buffer", "get_orderbook", "shocks", "escaneo", "replay")
+
+
+def resultado(benchmark, parametros, tiempos, **extra):
+    """Resumen de una lista de duraciones (segundos por operación)"""
+    r = {
+        "benchmark": benchmark,
+        "parametros": parametros,
+        "muestras": len(tiempos),
+        "us_por_op": sum(tiempos) / len(tiempos) * 1e6 if tiempos else 0.0,
+        "p50_us": percentil(tiempos, 50) * 1e6,
+        "p99_us": percentil(tiempos, 99) * 1e6,
+    }
+    r.update(extra)
+    return r
+
+
+def imprimir(r):
+    parametros = " ".join(f"{k}={v}" for k, v in r["parametros"].items())
+    print(f"{r['benchmark']:>14} | {parametros:<34} | {r['us_por_op']:10.2f} µs/op "
+          f"| p50 {r['p50_us']:10.2f} | p99 {r['p99_us']:10.2f}")
+
+
+# ---------- apply_order_book_update ----------
+
+def bench_apply(servidor, tamanos, eventos):
+    resultados = []
+    for niveles in tamanos:
+        symbol = f"APPLY{niveles}USDT"
+        preparar_libro(servidor, symbol, niveles)
+        datos = [
+            decoders.decodificar_depth(mensaje_combinado(e))
+            for e in eventos_sinteticos(symbol, eventos, niveles=niveles)
+        ]
+        tiempos = []
+        for data in datos:
+            inicio = time.perf_counter()
+            servidor.apply_order_book_update(symbol, data)
+            tiempos.append(time.perf_counter() - inicio)
+        resultados.append(resultado("apply", {"niveles": niveles}, tiempos,
+                                    eventos_por_segundo=len(tiempos) / sum(tiempos)))
+    return resultados
+
+
+# ---------- buffer pre-sync ----------
+
+def bench_buffer(servidor, cantidades):
+    resultados = []
+    for cantidad in cantidades:
+        symbol = f"BUF{cantidad}USDT"
+        servidor.tick_sizes[symbol] = TICK
+        book = servidor.new_order_book(symbol)
+        servidor.order_books[symbol] = book
+        mensajes = [mensaje_combinado(e) for e in eventos_sinteticos(symbol, cantidad)]
+        tiempos = []
+        for mensaje in mensajes:
+            inicio = time.perf_counter()
+            servidor.on_message_combined(None, mensaje)
+            tiempos.append(time.perf_counter() - inicio)
+        resultados.append(resultado("buffer", {"eventos": cantidad}, tiempos,
+                                    eventos_en_buffer=len(book['buffer']),
+                                    tramos=len(book['buffer'].tramos)))
+    return resultados
+
+
+# ---------- get_orderbook ----------
+
+# Consultas recortadas (además del libro completo): (nombre, parámetros)
+CONSULTAS_RECORTE = (
+    ("top=100", {"top": 100}),
+    ("band_pct=2", {"band_pct": 2.0}),
+    ("top=20,agrupacion=10t", {"top": 20, "agrupacion": TICK * 10}),
+)
+
+def bench_get_orderbook(servidor, tamanos, repeticiones):
+    resultados = []
+    for niveles in tamanos:
+        symbol = f"GET{niveles}USDT"
+        preparar_libro(servidor, symbol, niveles)
+        consultas = [(None, {})] + list(CONSULTAS_RECORTE)
+        for nombre, parametros in consultas:
+            tiempos = []
+            tamano = 0
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                respuesta = servidor.get_orderbook(symbol, **parametros)
+                tiempos.append(time.perf_counter() - inicio)
+                tamano = len(respuesta.body)
+            etiquetas = {"niveles": niveles}
+            if nombre is not None:
+                etiquetas["consulta"] = nombre
+            resultados.append(resultado("get_orderbook", etiquetas, tiempos, bytes=tamano))
+    return resultados
+
+
+# ---------- shocks ----------
+
+def libro_float(book):
+    """Libro como dicts {precio: cantidad} float, el formato que usa Oraculo"""
+    return {"bids": dict(book['bids'].items()), "asks": dict(book['asks'].items())}
+
+
+def bench_shocks(servidor, simbolos):
+    """simbolos: lista de símbolos con libro inicializado en el servidor"""
+    precios = {}
+    libros = {}
+    for symbol in simbolos:
+        book = servidor.order_books[symbol]
+        mejor_bid = book['bids'].best()
+        mejor_ask = book['asks'].best()
+        precios[symbol] = (mejor_bid[0] + mejor_ask[0]) / 2
+        libros[symbol] = libro_float(book)
+
+    def medir(nombre, funcion):
+        tiempos = []
+        for symbol in simbolos:
+            inicio = time.perf_counter()
+            funcion(symbol)
+            tiempos.append(time.perf_counter() - inicio)
+        return resultado("shocks", {"operacion": nombre, "simbolos": len(simbolos)}, tiempos)
+
+    def agrupacion(symbol):
+        return shocks.obtener_nivel_agrupacion_optimo(servidor.tick_sizes[symbol], precios[symbol])
+
+    resultados = [medir("agrupacion_optima", agrupacion)]
+    if shocks.np is not None:
+        resultados.append(medir("calcular_shocks_numpy", lambda s: shocks.calcular_shocks_numpy(
+            libros[s], agrupacion(s), servidor.tick_sizes[s])))
+    resultados.append(medir("calcular_shocks_decimal", lambda s: shocks.calcular_shocks_decimal(
+        libros[s], agrupacion(s), servidor.tick_sizes[s])))
+    # Primera consulta: construye el agregador; las siguientes solo leen el top-K
+    resultados.append(medir("compute_shocks_primera", lambda s: servidor.compute_shocks(s, agrupacion(s))))
+    resultados.append(medir("compute_shocks", lambda s: servidor.compute_shocks(s, agrupacion(s))))
+    return resultados
+
+
+# ---------- escaneo del motor ----------
+
+class SesionEnProceso:
+    """Reemplaza la sesión HTTP del motor por la API del servidor en el mismo proceso"""
+
+    def __init__(self, app, sin_shocks=False):
+        from fastapi.testclient import TestClient
+        self.cliente = TestClient(app)
+        self.sin_shocks = sin_shocks
+
+    def get(self, url, params=None, timeout=None):
+        ruta = url.split("://", 1)[-1].split("/", 1)[-1]
+        if self.sin_shocks and ruta.startswith("shocks"):
+            return self.cliente.get("/no-existe")  # 404 como un servidor sin /shocks
+        return self.cliente.get(f"/{ruta}", params=params)
+
+
+def cargar_motor():
+    spec = importlib.util.spec_from_file_location("motor_bench", os.path.join(RAIZ, "motor_oraculo.py"))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def bench_escaneo(cantidades, niveles, repeticiones):
+    servidor = cargar_servidor()
+    try:
+        motor = cargar_motor()
+    except ImportError as e:
+        print(f"⚠️ escaneo omitido: {e}")
+        return []
+
+    # Nada de exchangeInfo ni caché en disco del usuario
+    motor.RUTA_CACHE = os.path.join(tempfile.mkdtemp(), "oraculo_cache.json")
+
+    resultados = []
+    for cantidad in cantidades:
+        simbolos = [f"SCAN{i}USDT" for i in range(cantidad)]
+        servidor.coins[:] = simbolos
+        for symbol in simbolos:
+            preparar_libro(servidor, symbol, niveles)
+            motor.metadata_simbolos[symbol] = {'tick_size': TICK, 'filtros': {}}
+            libro = servidor.order_books[symbol]
+            with motor.precios_lock:
+                motor.precios_websocket[symbol] = (libro['bids'].best()[0] + libro['asks'].best()[0]) / 2
+
+        for modo, sin_shocks in (("servidor", False), ("local", True)):
+            motor.sesion_api = SesionEnProceso(servidor.app, sin_shocks)
+            tiempos = []
+            primeras = []
+            for _ in range(repeticiones):
+                for symbol in simbolos:
+                    servidor.order_books[symbol]['agregadores'].clear()
+
+                oraculo = motor.MotorOraculo()
+                oraculo.ws_precios_iniciado = True  # Precios ya cargados: sin WebSocket ni espera de 5s
+                oraculo.usar_replica = False        # Sin réplica por WebSocket
+                publicadas = []
+                oraculo.suscribir(lambda evento: evento['evento'] == 'tarjetas' and publicadas.append(time.perf_counter()))
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    inicio = time.perf_counter()
+                    oraculo.escanear()
+                    tiempos.append(time.perf_counter() - inicio)
+                if publicadas:
+                    primeras.append(publicadas[0] - inicio)
+
+            resultados.append(resultado("escaneo", {"simbolos": cantidad, "shocks": modo}, tiempos,
+                                        ms_por_escaneo=sum(tiempos) / len(tiempos) * 1e3,
+                                        ms_primeras_tarjetas=sum(primeras) / len(primeras) * 1e3 if primeras else None,
+                                        simbolos_con_shocks=len(oraculo.shocks_activos)))
+    return resultados
+
+
+# ---------- replay de una grabación ----------
+
+def bench_replay(directorio):
+    from stream_recorder import reproducir
+
+    servidor = cargar_servidor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        cantidad = reproducir(
+            directorio,
+            lambda message: servidor.on_message_combined(None, message),
+            servidor.apply_snapshot,
+            on_meta=servidor.load_recorded_universe,
+            velocidad=0,
+            prefijo="stream",
+        )
+        duracion = time.perf_counter() - inicio
+
+    resultados = [resultado("replay", {"registros": cantidad}, [duracion / cantidad] * cantidad if cantidad else [],
+                            mensajes_por_segundo=cantidad / duracion if duracion else 0.0)]
+    inicializados = [s for s, b in servidor.order_books.items() if b['initialized'] and b['bids'] and b['asks']]
+    if inicializados:
+        resultados.extend(bench_shocks(servidor, inicializados))
+    return resultados
+
+
+# ---------- salida ----------
+
+def metadatos():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "numpy": getattr(shocks.np, "__version__", None),
+        "json_backend": decoders.BACKEND,
+    }
+
+
+def clave(r):
+    return r["benchmark"], json.dumps(r["parametros"], sort_keys=True)
+
+
+def comparar(resultados, ruta):
+    with open(ruta, encoding="utf-8") as f:
+        anterior = json.load(f)
+    previos = {clave(r): r for r in anterior.get("resultados", [])}
+    print(f"\n📊 Comparación con {ruta} (commit {anterior.get('meta', {}).get('commit')})")
+    for r in resultados:
+        previo = previos.get(clave(r))
+        if not previo or not previo["us_por_op"]:
+            continue
+        variacion = (r["us_por_op"] / previo["us_por_op"] - 1) * 100
+        marca = "🔴" if variacion > 10 else "🟢" if variacion < -10 else "⚪"
+        parametros = " ".join(f"{k}={v}" for k, v in r["parametros"].items())
+        print(f"{marca} {r['benchmark']:>14} | {parametros:<34} | {previo['us_por_op']:10.2f} -> "
+              f"{r['us_por_op']:10.2f} µs/op ({variacion:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--solo", help=f"benchmarks a correr separados por coma ({','.join(BENCHMARKS)})")
+    parser.add_argument("--niveles", default="1000,5000,10000,20000", help="tamaños de libro por lado")
+    parser.add_argument("--eventos", type=int, default=5000, help="eventos por tamaño en apply")
+    parser.add_argument("--buffer", default="100,1000,5000", help="eventos acumulados en el buffer pre-sync")
+    parser.add_argument("--repeticiones", type=int, default=50, help="repeticiones de get_orderbook")
+    parser.add_argument("--simbolos-shocks", type=int, default=100)
+    parser.add_argument("--niveles-shocks", type=int, default=10000, help="niveles por lado en shocks y escaneo")
+    parser.add_argument("--escaneo", default="50,200", help="símbolos por escaneo_inicial")
+    parser.add_argument("--grabacion", help="directorio con una grabación de stream_recorder")
+    parser.add_argument("--json", help="ruta donde guardar los resultados en JSON")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    elegidos = set(args.solo.split(",")) if args.solo else set(BENCHMARKS)
+    tamanos = [int(n) for n in args.niveles.split(",")]
+    servidor = cargar_servidor()
+
+    resultados = []
+    pasos = []
+    if "apply" in elegidos:
+        pasos.append(lambda: bench_apply(servidor, tamanos, args.eventos))
+    if "buffer" in elegidos:
+        pasos.append(lambda: bench_buffer(servidor, [int(n) for n in args.buffer.split(",")]))
+    if "get_orderbook" in elegidos:
+        pasos.append(lambda: bench_get_orderbook(servidor, tamanos, args.repeticiones))
+    if "shocks" in elegidos:
+        def paso_shocks():
+            simbolos = [f"SHOCK{i}USDT" for i in range(args.simbolos_shocks)]
+            for symbol in simbolos:
+                preparar_libro(servidor, symbol, args.niveles_shocks)
+            return bench_shocks(servidor, simbolos)
+        pasos.append(paso_shocks)
+    if "escaneo" in elegidos:
+        pasos.append(lambda: bench_escaneo([int(n) for n in args.escaneo.split(",")], args.niveles_shocks, 3))
+    if "replay" in elegidos and args.grabacion:
+        pasos.append(lambda: bench_replay(args.grabacion))
+
+    for paso in pasos:
+        for r in paso():
+            imprimir(r)
+            resultados.append(r)
+        sys.stdout.flush()
+
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": metadatos(), "resultados": resultados}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
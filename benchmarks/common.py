@@ -0,0 +1,100 @@
+"""Utilidades compartidas por los benchmarks (carga del servidor y datos sintéticos)"""
+import importlib.util
+import json
+import os
+import random
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+TICK = 0.0001
+PRECIO_MEDIO = 5.0  # Con TICK=0.0001 deja lugar para libros de hasta 50k niveles por lado
+
+
+def cargar_servidor():
+    """Importa "Order book v2.py" como módulo (sin arrancar WebSockets ni la API)"""
+    ruta = os.path.join(RAIZ, "Order book v2.py")
+    spec = importlib.util.spec_from_file_location("order_book_server", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def precio_str(tick):
+    return f"{tick * TICK:.4f}"
+
+
+def snapshot_sintetico(niveles, last_update_id=1, semilla=0):
+    """Snapshot estilo /fapi/v1/depth con `niveles` niveles por lado alrededor de PRECIO_MEDIO"""
+    rnd = random.Random(semilla)
+    centro = int(round(PRECIO_MEDIO / TICK))
+    bids = [[precio_str(centro - 1 - i), f"{rnd.uniform(1, 5000):.1f}"] for i in range(niveles)]
+    asks = [[precio_str(centro + 1 + i), f"{rnd.uniform(1, 5000):.1f}"] for i in range(niveles)]
+    return {"lastUpdateId": last_update_id, "bids": bids, "asks": asks}
+
+
+def eventos_sinteticos(symbol, cantidad, primer_u=2, niveles=1000, cambios=10, semilla=0):
+    """Eventos depthUpdate encadenados (U/u/pu) con `cambios` niveles por lado cerca del precio"""
+    rnd = random.Random(semilla)
+    centro = int(round(PRECIO_MEDIO / TICK))
+    eventos = []
+    pu = primer_u - 1
+    u = primer_u
+    for _ in range(cantidad):
+        U = u
+        u = U + rnd.randint(1, 5)
+        b = []
+        a = []
+        for _ in range(cambios):
+            distancia = min(int(rnd.expovariate(1 / 20)), niveles)
+            qty = "0" if rnd.random() < 0.2 else f"{rnd.uniform(1, 5000):.1f}"
+            if rnd.random() < 0.5:
+                b.append([precio_str(centro - 1 - distancia), qty])
+            else:
+                a.append([precio_str(centro + 1 + distancia), qty])
+        eventos.append({"e": "depthUpdate", "s": symbol, "U": U, "u": u, "pu": pu, "b": b, "a": a})
+        pu = u
+        u += 1
+    return eventos
+
+
+def mensaje_combinado(data):
+    """Mensaje de stream combinado serializado compacto, como lo envía Binance"""
+    return json.dumps({"stream": f"{data['s'].lower()}@depth@100ms", "data": data}, separators=(',', ':'))
+
+
+def ticker_combinado(symbol, precio, evento=1):
+    """Mensaje @ticker de 24h combinado con los mismos campos que envía Binance"""
+    data = {
+        "e": "24hrTicker", "E": evento, "s": symbol,
+        "p": "-0.0012", "P": "-0.120", "w": f"{precio:.4f}", "c": f"{precio:.4f}", "Q": "120.5",
+        "o": f"{precio * 1.001:.4f}", "h": f"{precio * 1.02:.4f}", "l": f"{precio * 0.98:.4f}",
+        "v": "15320441.2", "q": "15301234.88", "O": 0, "C": evento, "F": 1, "L": evento, "n": evento,
+    }
+    return json.dumps({"stream": f"{symbol.lower()}@ticker", "data": data}, separators=(',', ':'))
+
+
+def preparar_libro(servidor, symbol, niveles, last_update_id=1):
+    """Crea un libro inicializado en el servidor a partir de un snapshot sintético"""
+    servidor.tick_sizes[symbol] = TICK
+    book = servidor.new_order_book(symbol)
+    snap = snapshot_sintetico(niveles, last_update_id)
+    book['bids'].load(snap['bids'])
+    book['asks'].load(snap['asks'])
+    book['lastUpdateId'] = last_update_id
+    book['deltas'].reiniciar(last_update_id)
+    book['last_u'] = last_update_id
+    book['initialized'] = True
+    book['first_event_after_snapshot'] = False
+    servidor.order_books[symbol] = book
+    return book
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
@@ -0,0 +1,95 @@
+"""Verificación aleatoria: AgregadorShocks da los mismos niveles que calcular_shocks_decimal.
+
+Arma libros al azar (distintos ticks, agrupaciones de 1 tick y de varios ticks,
+cantidades repetidas para forzar empates), les aplica deltas por el agregador
+y compara sus shocks con los de calcular_shocks_decimal sobre el mismo libro.
+Corre con el motor NumPy (si está instalado) y con el camino en Python puro.
+Termina con código 1 si algún libro difiere.
+
+Uso:
+    python benchmarks/verificar_shocks.py --libros 1000
+"""
+import argparse
+import random
+import sys
+
+import common  # noqa: F401 (agrega la raíz del repo al path)
+
+import shocks
+from tick_book import Ladder
+
+AGRUPACIONES_EN_TICKS = (1, 1, 2, 5, 10, 37, 100, 1000)
+CANTIDADES_REPETIDAS = (1.5, 0.1, 0.2, 0.3)
+
+
+def cantidad(rnd):
+    if rnd.random() < 0.5:
+        return rnd.choice(CANTIDADES_REPETIDAS)
+    return float(f"{rnd.uniform(0.001, 500):.3f}")
+
+
+def libro_al_azar(semilla):
+    rnd = random.Random(semilla)
+    tick = rnd.choice((0.0001, 0.001, 0.01, 0.1, 1.0))
+    decimales = shocks.obtener_decimales_de_tick(tick)
+    centro = rnd.randint(3200, 200000)
+    bids = Ladder(tick, 'bids')
+    asks = Ladder(tick, 'asks')
+    bids.load([[f"{(centro - 1 - rnd.randint(0, 3000)) * tick:.{decimales}f}", cantidad(rnd)]
+               for _ in range(rnd.randint(0, 800))])
+    asks.load([[f"{(centro + 1 + rnd.randint(0, 3000)) * tick:.{decimales}f}", cantidad(rnd)]
+               for _ in range(rnd.randint(0, 800))])
+
+    g = rnd.choice(AGRUPACIONES_EN_TICKS)
+    agrupacion = float(f"{g * tick:.{decimales}f}")
+    agregador = shocks.AgregadorShocks(bids, asks, agrupacion)
+    for _ in range(rnd.randint(0, 500)):
+        ladder, side = (bids, 'bids') if rnd.random() < 0.5 else (asks, 'asks')
+        signo = -1 if side == 'bids' else 1
+        tick_nivel = centro + signo * (1 + rnd.randint(0, 3000))
+        qty = 0.0 if rnd.random() < 0.3 else cantidad(rnd)
+        anterior = ladder.set_tick(tick_nivel, qty)
+        agregador.actualizar(side, tick_nivel, anterior, qty)
+    return bids, asks, agrupacion, g, agregador, rnd.choice((1, 3, 8, 20))
+
+
+def verificar(libros):
+    """Lista de (semilla, g, incremental, referencia) de los libros que difieren"""
+    diferencias = []
+    for semilla in range(libros):
+        bids, asks, agrupacion, g, agregador, top = libro_al_azar(semilla)
+        referencia = shocks.calcular_shocks_decimal(
+            {'bids': bids.to_dict(), 'asks': asks.to_dict()}, agrupacion, bids.tick_size, top)
+        incremental = agregador.shocks(top)
+        if incremental != referencia:
+            diferencias.append((semilla, g, incremental, referencia))
+    return diferencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--libros", type=int, default=1000)
+    args = parser.parse_args()
+
+    motores = [("python", None)]
+    if shocks.np is not None:
+        motores.insert(0, ("numpy", shocks.np))
+
+    fallos = 0
+    np_original = shocks.np
+    for nombre, np in motores:
+        shocks.np = np
+        try:
+            diferencias = verificar(args.libros)
+        finally:
+            shocks.np = np_original
+        for semilla, g, incremental, referencia in diferencias[:10]:
+            print(f"❌ {nombre} semilla={semilla} g={g}: {incremental} != {referencia}")
+        print(f"{'✅' if not diferencias else '❌'} {nombre}: {args.libros - len(diferencias)}/{args.libros} libros idénticos")
+        fallos += len(diferencias)
+
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == "__main__":
+    main()
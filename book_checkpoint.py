@@ -0,0 +1,124 @@
+"""Checkpoints en disco de los libros de órdenes para arrancar en caliente.
+
+Formato (little-endian), todo el cuerpo en zlib detrás de MAGIC:
+    guardado (f64, time.time()) + número de libros (u32)
+    Por libro:
+        largo del símbolo (u8) + símbolo (ascii)
+        tick_size (f64) + lastUpdateId (i64) + last_u (i64, -1 = None)
+        n_bids (u32) + n_asks (u32)
+        claves bids (i64 * n_bids) + cantidades bids (f64 * n_bids)
+        claves asks (i64 * n_asks) + cantidades asks (f64 * n_asks)
+
+Las claves y cantidades son las de Ladder tal cual: cargar un libro es copiar
+los arrays, sin pasar por precios float ni reordenar. El archivo se escribe
+en un temporal y se reemplaza de una vez, así un corte a mitad de escritura
+deja el checkpoint anterior intacto.
+"""
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from tick_book import Ladder
+
+MAGIC = b'OCK1'
+
+_CABECERA = struct.Struct('<dI')
+_LIBRO = struct.Struct('<dqqII')
+
+
+def _a_bytes(datos):
+    if sys.byteorder != 'little':
+        datos = array(datos.typecode, datos)
+        datos.byteswap()
+    return datos.tobytes()
+
+
+def _desde_bytes(typecode, buffer, inicio, cantidad):
+    datos = array(typecode)
+    datos.frombytes(buffer[inicio:inicio + 8 * cantidad])
+    if len(datos) != cantidad:
+        raise ValueError("checkpoint truncado")
+    if sys.byteorder != 'little':
+        datos.byteswap()
+    return datos
+
+
+def guardar_checkpoint(ruta, libros):
+    """Escribe los libros (dicts con 'symbol', 'bids', 'asks' Ladder, 'lastUpdateId'
+    y 'last_u'). Devuelve el tamaño del archivo en bytes."""
+    partes = [_CABECERA.pack(time.time(), len(libros))]
+    for libro in libros:
+        symbol = libro['symbol'].encode('ascii')
+        bids = libro['bids']
+        asks = libro['asks']
+        partes.append(struct.pack('<B', len(symbol)))
+        partes.append(symbol)
+        partes.append(_LIBRO.pack(
+            bids.tick_size,
+            libro['lastUpdateId'],
+            -1 if libro['last_u'] is None else libro['last_u'],
+            len(bids),
+            len(asks),
+        ))
+        for lado in (bids, asks):
+            partes.append(_a_bytes(lado.keys))
+            partes.append(_a_bytes(lado.qtys))
+
+    datos = MAGIC + zlib.compress(b''.join(partes), 1)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(datos)
+        archivo.flush()
+        os.fsync(archivo.fileno())  # En disco antes del reemplazo: un corte no deja el checkpoint vacío
+    os.replace(temporal, ruta)
+    return len(datos)
+
+
+def cargar_checkpoint(ruta):
+    """(guardado, {symbol: libro}) con Ladders en 'bids'/'asks', o None si no hay
+    checkpoint o no se puede leer."""
+    try:
+        with open(ruta, "rb") as archivo:
+            datos = archivo.read()
+        if datos[:4] != MAGIC:
+            raise ValueError("formato desconocido")
+        return _leer_libros(zlib.decompress(datos[4:]))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, zlib.error, struct.error, IndexError, UnicodeDecodeError) as e:
+        print(f"⚠️ Checkpoint {ruta} ilegible: {e}")
+        return None
+
+
+def _leer_libros(cuerpo):
+    guardado, cantidad = _CABECERA.unpack_from(cuerpo, 0)
+    posicion = _CABECERA.size
+    libros = {}
+    for _ in range(cantidad):
+        largo = cuerpo[posicion]
+        posicion += 1
+        symbol = cuerpo[posicion:posicion + largo].decode('ascii')
+        posicion += largo
+        tick_size, last_update_id, last_u, n_bids, n_asks = _LIBRO.unpack_from(cuerpo, posicion)
+        posicion += _LIBRO.size
+
+        lados = []
+        for side, n in (('bids', n_bids), ('asks', n_asks)):
+            ladder = Ladder(tick_size, side)
+            ladder.keys = _desde_bytes('q', cuerpo, posicion, n)
+            posicion += 8 * n
+            ladder.qtys = _desde_bytes('d', cuerpo, posicion, n)
+            posicion += 8 * n
+            lados.append(ladder)
+
+        libros[symbol] = {
+            "symbol": symbol,
+            "bids": lados[0],
+            "asks": lados[1],
+            "lastUpdateId": last_update_id,
+            "last_u": None if last_u == -1 else last_u,
+        }
+    return guardado, libros
@@ -0,0 +1,125 @@
+"""Codificación binaria compacta de libros de órdenes (endpoint bulk /orderbooks).
+
+Formato (little-endian):
+    MAGIC (4 bytes) + número de libros (u32)
+    Por libro:
+        largo del símbolo (u8) + símbolo (ascii)
+        lastUpdateId (i64, -1 = None) + last_u (i64, -1 = None)
+        n_bids (u32) + n_asks (u32)
+        precios bids (f64 * n_bids) + cantidades bids (f64 * n_bids)
+        precios asks (f64 * n_asks) + cantidades asks (f64 * n_asks)
+
+Los niveles van desde el mejor precio hacia afuera. Con compresión el cuerpo
+completo va en zlib detrás de MAGIC_ZLIB.
+"""
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b'OBK1'
+MAGIC_ZLIB = b'OBZ1'
+
+_CABECERA = struct.Struct('<4sI')
+_LIBRO = struct.Struct('<qqII')
+
+
+def _a_bytes(valores):
+    datos = array('d', valores)
+    if sys.byteorder != 'little':
+        datos.byteswap()
+    return datos.tobytes()
+
+
+def _desde_bytes(buffer, inicio, cantidad):
+    datos = array('d')
+    datos.frombytes(buffer[inicio:inicio + 8 * cantidad])
+    if sys.byteorder != 'little':
+        datos.byteswap()
+    return datos
+
+
+def encode_books(books, comprimir=False):
+    """Codifica una lista de libros.
+
+    Cada libro es un dict con 'symbol', 'lastUpdateId', 'last_u' y los niveles en
+    'bid_prices', 'bid_qtys', 'ask_prices', 'ask_qtys' (secuencias de floats).
+    """
+    partes = [_CABECERA.pack(MAGIC, len(books))]
+    for book in books:
+        symbol = book['symbol'].encode('ascii')
+        n_bids = len(book['bid_prices'])
+        n_asks = len(book['ask_prices'])
+        last_update_id = book['lastUpdateId']
+        last_u = book['last_u']
+        partes.append(struct.pack('<B', len(symbol)))
+        partes.append(symbol)
+        partes.append(_LIBRO.pack(
+            -1 if last_update_id is None else last_update_id,
+            -1 if last_u is None else last_u,
+            n_bids,
+            n_asks,
+        ))
+        partes.append(_a_bytes(book['bid_prices']))
+        partes.append(_a_bytes(book['bid_qtys']))
+        partes.append(_a_bytes(book['ask_prices']))
+        partes.append(_a_bytes(book['ask_qtys']))
+
+    cuerpo = b''.join(partes)
+    if comprimir:
+        return MAGIC_ZLIB + zlib.compress(cuerpo, 1)
+    return cuerpo
+
+
+def merge_books(payloads, comprimir=False):
+    """Une varias respuestas binarias sin comprimir en una sola (sin decodificar los libros)"""
+    cantidad = 0
+    cuerpos = []
+    for payload in payloads:
+        magic, n = _CABECERA.unpack_from(payload, 0)
+        if magic != MAGIC:
+            raise ValueError("Formato binario de order books desconocido")
+        cantidad += n
+        cuerpos.append(memoryview(payload)[_CABECERA.size:])
+
+    cuerpo = _CABECERA.pack(MAGIC, cantidad) + b''.join(cuerpos)
+    if comprimir:
+        return MAGIC_ZLIB + zlib.compress(cuerpo, 1)
+    return cuerpo
+
+
+def decode_books(payload):
+    """Decodifica la respuesta binaria a {symbol: libro} con el mismo formato que
+    /orderbooks/{symbol}, pero con precios y cantidades float en vez de str."""
+    if payload[:4] == MAGIC_ZLIB:
+        payload = zlib.decompress(payload[4:])
+    magic, cantidad = _CABECERA.unpack_from(payload, 0)
+    if magic != MAGIC:
+        raise ValueError("Formato binario de order books desconocido")
+
+    posicion = _CABECERA.size
+    libros = {}
+    for _ in range(cantidad):
+        largo = payload[posicion]
+        posicion += 1
+        symbol = payload[posicion:posicion + largo].decode('ascii')
+        posicion += largo
+        last_update_id, last_u, n_bids, n_asks = _LIBRO.unpack_from(payload, posicion)
+        posicion += _LIBRO.size
+
+        lados = []
+        for n in (n_bids, n_asks):
+            precios = _desde_bytes(payload, posicion, n)
+            posicion += 8 * n
+            qtys = _desde_bytes(payload, posicion, n)
+            posicion += 8 * n
+            lados.append(dict(zip(precios, qtys)))
+
+        libros[symbol] = {
+            "symbol": symbol,
+            "bids": lados[0],
+            "asks": lados[1],
+            "lastUpdateId": None if last_update_id == -1 else last_update_id,
+            "last_u": None if last_u == -1 else last_u,
+        }
+    return libros
@@ -0,0 +1,79 @@
+"""Historial acotado de los cambios recientes de un libro (/orderbooks/{symbol}?since=u).
+
+Cada evento aplicado deja una entrada (u, ticks y cantidades de bids, ticks y
+cantidades de asks) con los niveles tal como quedaron (cantidad 0 = nivel
+eliminado). Un cliente que tiene el libro en la versión v (su last_u) recibe la
+combinación de las entradas con u > v: para cada precio, la última cantidad.
+
+base es la versión desde la que el historial está completo: el lastUpdateId del
+último snapshot, que avanza a medida que se descartan las entradas más viejas.
+Una versión anterior a base (o posterior a la actual, de otra secuencia) no se
+puede responder con deltas y el cliente recibe el libro completo.
+
+El historial se acota por niveles guardados, no por eventos: en un símbolo
+activo cubre menos tiempo, pero la memoria por libro es la misma.
+"""
+from collections import deque
+
+MAX_NIVELES = 20000  # Niveles guardados por libro (~320 KB con los arrays)
+
+
+class HistorialDeltas:
+    """Cambios recientes de un libro. Se usa con el lock del libro tomado."""
+
+    __slots__ = ('entradas', 'base', 'niveles', 'max_niveles')
+
+    def __init__(self, max_niveles=MAX_NIVELES):
+        self.entradas = deque()
+        self.base = None  # None: sin snapshot, no hay deltas que servir
+        self.niveles = 0
+        self.max_niveles = max_niveles
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def reiniciar(self, version):
+        """Nuevo snapshot: los cambios anteriores ya no aplican"""
+        self.entradas.clear()
+        self.niveles = 0
+        self.base = version
+
+    def registrar(self, u, bids, asks):
+        """Agrega los cambios de un evento: bids/asks son (array de ticks, array de cantidades)"""
+        if self.base is None:
+            return
+        self.entradas.append((u, bids, asks))
+        self.niveles += len(bids[0]) + len(asks[0])
+        while self.niveles > self.max_niveles and len(self.entradas) > 1:
+            viejo = self.entradas.popleft()
+            self.niveles -= len(viejo[1][0]) + len(viejo[2][0])
+            self.base = viejo[0]
+
+    def version(self):
+        return self.entradas[-1][0] if self.entradas else self.base
+
+    def desde(self, version):
+        """Entradas posteriores a version en orden, o None si el historial no la cubre.
+
+        Solo junta referencias (las entradas no se modifican después de
+        registrarse): la combinación se puede hacer fuera del lock.
+        """
+        if self.base is None or version < self.base or version > self.version():
+            return None
+        posteriores = []
+        for entrada in reversed(self.entradas):
+            if entrada[0] <= version:
+                break
+            posteriores.append(entrada)
+        posteriores.reverse()
+        return posteriores
+
+
+def combinar(entradas):
+    """({tick: cantidad} bids, {tick: cantidad} asks) con la última cantidad de cada precio"""
+    bids = {}
+    asks = {}
+    for _, (ticks_bids, qtys_bids), (ticks_asks, qtys_asks) in entradas:
+        bids.update(zip(ticks_bids, qtys_bids))
+        asks.update(zip(ticks_asks, qtys_asks))
+    return bids, asks
@@ -0,0 +1,108 @@
+"""Decodificación rápida de los mensajes de streams de Binance.
+
+- Backend JSON intercambiable: orjson o ujson si están instalados, si no json.
+- Enrutado por símbolo leyendo el nombre del stream con slicing, antes del
+  parseo completo, para no decodificar mensajes de símbolos sin libro.
+- Los niveles de profundidad salen ya convertidos a (precio, cantidad) float.
+- El ticker de 24h se lee sin parsear el payload completo (solo 's' y 'c').
+
+Los mensajes combinados de Binance llegan compactos:
+    {"stream":"btcusdt@depth@100ms","data":{...}}
+Si un mensaje no tiene esa forma exacta se usa el parseo completo.
+"""
+import json
+
+BACKENDS = {'json': json.loads}
+
+try:
+    import ujson
+    BACKENDS['ujson'] = ujson.loads
+except ImportError:
+    pass
+
+try:
+    import orjson
+    BACKENDS['orjson'] = orjson.loads
+except ImportError:
+    pass
+
+BACKEND = next(nombre for nombre in ('orjson', 'ujson', 'json') if nombre in BACKENDS)
+_loads = BACKENDS[BACKEND]
+
+_MARCA_STREAM = '{"stream":"'
+_MARCA_STREAM_BYTES = b'{"stream":"'
+_MARCA_SIMBOLO = '"s":"'
+_MARCA_CIERRE = '"c":"'
+
+
+def usar_backend(nombre):
+    """Cambia el backend JSON ('orjson', 'ujson' o 'json')"""
+    global BACKEND, _loads
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend JSON no disponible: {nombre} (disponibles: {', '.join(BACKENDS)})")
+    BACKEND = nombre
+    _loads = BACKENDS[nombre]
+
+
+def loads(message):
+    return _loads(message)
+
+
+def symbol_de_stream(message):
+    """Símbolo en mayúsculas del stream combinado ("btcusdt@depth@100ms" -> "BTCUSDT") sin parsear el JSON"""
+    if isinstance(message, bytes):
+        if message.startswith(_MARCA_STREAM_BYTES):
+            fin = message.find(b'@', len(_MARCA_STREAM_BYTES))
+            if fin != -1:
+                return message[len(_MARCA_STREAM_BYTES):fin].decode('ascii').upper()
+    elif message.startswith(_MARCA_STREAM):
+        fin = message.find('@', len(_MARCA_STREAM))
+        if fin != -1:
+            return message[len(_MARCA_STREAM):fin].upper()
+
+    parsed = _loads(message)
+    if 'stream' not in parsed:
+        return None
+    return parsed['stream'].split('@')[0].upper()
+
+
+def convertir_niveles(niveles):
+    """[["precio", "cantidad"], ...] -> [(precio, cantidad), ...] como floats"""
+    return [(float(price), float(qty)) for price, qty in niveles]
+
+
+def decodificar_depth(message):
+    """Payload 'data' de un depthUpdate combinado con 'b' y 'a' ya convertidos a floats"""
+    parsed = _loads(message)
+    data = parsed.get('data')
+    if data is None:
+        return None
+    data['b'] = convertir_niveles(data['b'])
+    data['a'] = convertir_niveles(data['a'])
+    return data
+
+
+def _valor_str(message, marca):
+    inicio = message.find(marca)
+    if inicio == -1:
+        return None
+    inicio += len(marca)
+    fin = message.find('"', inicio)
+    if fin == -1:
+        return None
+    return message[inicio:fin]
+
+
+def extraer_ticker(message):
+    """(symbol, precio) de un mensaje combinado de @ticker, o None si no es un ticker"""
+    if isinstance(message, str) and message.startswith(_MARCA_STREAM):
+        symbol = _valor_str(message, _MARCA_SIMBOLO)
+        cierre = _valor_str(message, _MARCA_CIERRE)
+        if symbol is not None and cierre is not None:
+            return symbol, float(cierre)
+
+    parsed = _loads(message)
+    if 'stream' not in parsed:
+        return None
+    data = parsed['data']
+    return data['s'], float(data['c'])
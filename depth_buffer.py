@@ -0,0 +1,121 @@
+"""Buffer de eventos de profundidad de un libro que espera su snapshot.
+
+El procedimiento de sincronización de Binance guarda los eventos desde que se
+abre el stream y, con el snapshot ya cargado:
+- descarta los eventos con u < lastUpdateId
+- el primero que queda tiene que cubrir el snapshot: U <= lastUpdateId <= u
+- cada evento encadena con el anterior: pu == u del anterior
+
+Guardar los eventos tal cual crece sin límite en un símbolo activo con un
+snapshot lento. Acá los eventos encadenados se consolidan en tramos: un tramo
+guarda el rango [U, u] de los eventos que absorbió y, por precio, solo la
+última cantidad (la última actualización de un precio cubre las anteriores).
+
+Aplicar un tramo que cubre lastUpdateId da el mismo libro que aplicar sus
+eventos uno por uno: para un precio cuya última actualización del tramo es
+anterior a lastUpdateId, el snapshot ya tiene esa misma cantidad. La cadena
+pu/u se verifica al agregar cada evento, y un corte vacía el buffer.
+
+Los tramos van en un deque acotado: si el snapshot tarda tanto que se llena,
+se pierden los tramos más viejos y un snapshot anterior a ellos no encadena
+(se reintenta, como con cualquier secuencia incorrecta).
+"""
+from collections import deque
+
+EVENTOS_POR_TRAMO = 100  # 10 s de un stream @100ms por tramo
+MAX_TRAMOS = 60          # ~10 minutos de eventos como máximo
+
+
+class Tramo:
+    __slots__ = ('U', 'u', 'pu', 'bids', 'asks', 'eventos')
+
+    def __init__(self, data):
+        self.U = data['U']
+        self.u = data['u']
+        self.pu = data.get('pu')
+        self.bids = dict(data['b'])
+        self.asks = dict(data['a'])
+        self.eventos = 1
+
+    def absorber(self, data):
+        self.u = data['u']
+        self.bids.update(data['b'])
+        self.asks.update(data['a'])
+        self.eventos += 1
+
+    def como_evento(self):
+        """Dict con el formato de un evento decodificado (lo que espera apply_order_book_update)"""
+        return {
+            'U': self.U,
+            'u': self.u,
+            'pu': self.pu,
+            'b': list(self.bids.items()),
+            'a': list(self.asks.items()),
+        }
+
+
+class BufferProfundidad:
+    """Eventos pre-sync consolidados por precio. Se usa con el lock del libro tomado."""
+
+    __slots__ = ('tramos', 'eventos', 'eventos_por_tramo', 'descartados')
+
+    def __init__(self, eventos_por_tramo=EVENTOS_POR_TRAMO, max_tramos=MAX_TRAMOS):
+        self.tramos = deque(maxlen=max_tramos)
+        self.eventos = 0  # Eventos representados por los tramos
+        self.eventos_por_tramo = eventos_por_tramo
+        self.descartados = 0  # Eventos perdidos por el límite de tramos
+
+    def __len__(self):
+        return self.eventos
+
+    def __bool__(self):
+        return self.eventos > 0
+
+    def limpiar(self):
+        self.tramos.clear()
+        self.eventos = 0
+
+    def reiniciar(self, data):
+        """Vacía el buffer y lo deja con un solo evento"""
+        self.limpiar()
+        self.agregar(data)
+
+    def agregar(self, data):
+        """Agrega un evento en O(niveles del evento).
+
+        Devuelve False si no encadenaba con el anterior (pu != u): lo acumulado
+        ya no sirve para ningún snapshot posterior y se descarta.
+        """
+        encadena = True
+        if self.tramos:
+            ultimo = self.tramos[-1]
+            pu = data.get('pu')
+            if pu is not None and pu != ultimo.u:
+                self.limpiar()
+                encadena = False
+            elif ultimo.eventos < self.eventos_por_tramo:
+                ultimo.absorber(data)
+                self.eventos += 1
+                return True
+
+        if len(self.tramos) == self.tramos.maxlen:
+            viejo = self.tramos.popleft()
+            self.eventos -= viejo.eventos
+            self.descartados += viejo.eventos
+        self.tramos.append(Tramo(data))
+        self.eventos += 1
+        return encadena
+
+    def descartar_hasta(self, last_update_id):
+        """Paso 4: descarta los tramos que terminan antes del snapshot (u < lastUpdateId)"""
+        while self.tramos and self.tramos[0].u < last_update_id:
+            self.eventos -= self.tramos.popleft().eventos
+
+    def rango(self):
+        """(U, u) del primer tramo"""
+        primero = self.tramos[0]
+        return primero.U, primero.u
+
+    def como_eventos(self):
+        """Los tramos en orden, cada uno como un evento consolidado"""
+        return [tramo.como_evento() for tramo in self.tramos]
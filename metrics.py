@@ -0,0 +1,106 @@
+"""Métricas de rendimiento en formato de texto de Prometheus (sin dependencias).
+
+Cada libro tiene su propio MetricasLibro, que solo actualiza el hilo de ingesta
+de ese símbolo: no hace falta ningún lock. Los histogramas globales se arman
+sumando los de cada libro en el momento del scrape.
+"""
+from bisect import bisect_left
+
+# Límites en segundos: de 5 µs (apply de un evento chico) a 1 s (request pesado)
+BUCKETS_SEGUNDOS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class Histograma:
+    __slots__ = ('limites', 'conteos', 'suma', 'total')
+
+    def __init__(self, limites=BUCKETS_SEGUNDOS):
+        self.limites = limites
+        self.conteos = [0] * (len(limites) + 1)  # El último es +Inf
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.conteos[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumular(self, otro):
+        for i, conteo in enumerate(otro.conteos):
+            self.conteos[i] += conteo
+        self.suma += otro.suma
+        self.total += otro.total
+
+
+class MetricasLibro:
+    """Contadores de ingesta de un símbolo"""
+
+    __slots__ = (
+        'eventos', 'discontinuidades', 'resyncs', 'snapshots', 'snapshots_fallidos',
+        'apply', 'espera_lock', 'lock_retenido', 'ultimo_evento', 'retraso_ingesta',
+    )
+
+    def __init__(self):
+        self.eventos = 0
+        self.discontinuidades = 0
+        self.resyncs = 0
+        self.snapshots = 0
+        self.snapshots_fallidos = 0
+        self.apply = Histograma()
+        self.espera_lock = Histograma()
+        self.lock_retenido = Histograma()
+        self.ultimo_evento = None    # time.time() del último evento procesado
+        self.retraso_ingesta = None  # segundos entre el 'E' de Binance y el procesamiento
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in etiquetas.items()) + "}"
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        return repr(valor)
+    return str(valor)
+
+
+class EscritorMetricas:
+    """Arma la respuesta de /metrics (text/plain; version=0.0.4)"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.lineas = []
+
+    def cabecera(self, nombre, tipo, ayuda):
+        self.lineas.append(f"# HELP {nombre} {ayuda}")
+        self.lineas.append(f"# TYPE {nombre} {tipo}")
+
+    def valor(self, nombre, valor, etiquetas=None):
+        if valor is None:
+            return
+        self.lineas.append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+
+    def metrica(self, nombre, tipo, ayuda, valores):
+        """valores: lista de (etiquetas, valor)"""
+        self.cabecera(nombre, tipo, ayuda)
+        for etiquetas, valor in valores:
+            self.valor(nombre, valor, etiquetas)
+
+    def histograma(self, nombre, ayuda, histogramas):
+        """histogramas: lista de (etiquetas, Histograma)"""
+        self.cabecera(nombre, "histogram", ayuda)
+        for etiquetas, h in histogramas:
+            acumulado = 0
+            for limite, conteo in zip(h.limites, h.conteos):
+                acumulado += conteo
+                self.valor(f"{nombre}_bucket", acumulado, dict(etiquetas, le=repr(limite)))
+            self.valor(f"{nombre}_bucket", h.total, dict(etiquetas, le="+Inf"))
+            self.valor(f"{nombre}_sum", h.suma, etiquetas)
+            self.valor(f"{nombre}_count", h.total, etiquetas)
+
+    def texto(self):
+        return "\n".join(self.lineas) + "\n"
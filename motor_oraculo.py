@@ -0,0 +1,1020 @@
+"""Motor del Oráculo sin interfaz gráfica.
+
+Todo lo que no es Tk: precios por WebSocket, motor de cruces, caché, carga de
+libros y shocks desde el servidor, y MotorOraculo, que escanea el universo,
+elige entrada y stop y los recalcula tras cada toque. Las señales salen como
+eventos a los suscriptores: el dashboard de Oraculo.py es uno más, igual que
+las salidas JSONL y por socket de la línea de comandos:
+
+    python motor_oraculo.py --salida stdout --salida socket:127.0.0.1:8765
+"""
+import requests
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import websocket
+import sys
+import io
+from bisect import bisect_left, bisect_right
+from book_codec import decode_books
+import decoders
+from shm_books import LectorLibros
+from stream_recorder import StreamRecorder
+from shocks import (
+    obtener_decimales_de_tick,
+    obtener_nivel_agrupacion_optimo,
+    calcular_shocks,
+)
+
+# Configurar encoding UTF-8 para Windows
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=True)
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', line_buffering=True)
+
+# ---------- OBTENER DATOS BINANCE ----------
+
+# Diccionario global para almacenar precios en tiempo real desde WebSocket
+precios_websocket = {}
+precios_lock = threading.Lock()
+
+# Directorio donde grabar el stream crudo de tickers para reproducirlo después (None = no grabar)
+RUTA_GRABACION_PRECIOS = None
+
+# Segmento de memoria compartida del servidor de order books (arrancado con --shm).
+# Solo sirve si corre en el mismo host; None = leer los libros por HTTP.
+NOMBRE_SHM_LIBROS = None
+
+def obtener_precio_actual(symbol):
+    """Obtiene el precio desde el WebSocket en memoria (sin REST API)"""
+    with precios_lock:
+        return precios_websocket.get(symbol)
+
+def iniciar_websocket_precios(symbols, on_precio=None):
+    """Inicia WebSocket combinado para obtener precios en tiempo real.
+
+    Si se pasa on_precio(symbol, precio) se llama en cada ticker recibido, desde
+    el hilo del WebSocket.
+    """
+    grabador = None
+    if RUTA_GRABACION_PRECIOS:
+        grabador = StreamRecorder(RUTA_GRABACION_PRECIOS, prefijo="tickers", meta={"symbols": list(symbols)}).iniciar()
+
+    def on_message_precio(ws, message):
+        if grabador is not None:
+            grabador.grabar(message)
+        try:
+            # Solo se leen 's' (símbolo) y 'c' (close = precio actual) del ticker de 24h
+            ticker = decoders.extraer_ticker(message)
+            if ticker is not None:
+                symbol, precio = ticker
+
+                with precios_lock:
+                    precios_websocket[symbol] = precio
+
+                if on_precio is not None:
+                    on_precio(symbol, precio)
+        except Exception:
+            pass
+
+    def run_ws_precios():
+        while True:
+            try:
+                # Crear streams combinados para ticker: btcusdt@ticker/ethusdt@ticker/...
+                streams = '/'.join([f"{symbol.lower()}@ticker" for symbol in symbols])
+                url = f"wss://fstream.binance.com/stream?streams={streams}"
+
+                print(f"🔌 Conectando WebSocket de precios ({len(symbols)} símbolos)...")
+
+                ws = websocket.WebSocketApp(
+                    url,
+                    on_message=on_message_precio,
+                    on_error=lambda _, err: print(f"⚠️ Error WS precios: {err}"),
+                    on_close=lambda _, __, msg: print("❌ WS precios cerrado"),
+                )
+                ws.run_forever()
+            except Exception as e:
+                print(f"💥 Error en WS precios: {e}")
+
+            print("🔁 Reconectando WS precios en 10 segundos...")
+            time.sleep(10)
+
+    # Iniciar en hilo separado
+    threading.Thread(target=run_ws_precios, daemon=True).start()
+
+# ---------- MOTOR DE CRUCES ----------
+
+CRUCE_BAJANDO = 'bajando'    # se dispara cuando el precio cae hasta el nivel (entrada/stop LONG)
+CRUCE_SUBIENDO = 'subiendo'  # se dispara cuando el precio sube hasta el nivel (entrada/stop SHORT)
+
+class MotorCruces:
+    """Detecta cruces de niveles armados en cada precio recibido, sin hilos por símbolo.
+
+    Por símbolo guarda los niveles ordenados de cada dirección. Con cada precio
+    nuevo busca con bisect los niveles entre el precio anterior y el actual, así
+    una mecha que atraviesa varios niveles entre dos tickers los dispara todos.
+    on_cruce(symbol, clave, nivel, precio) se llama fuera del lock, en el hilo
+    que entregó el precio.
+    """
+
+    def __init__(self, on_cruce):
+        self.on_cruce = on_cruce
+        self.lock = threading.Lock()
+        self.niveles = {}         # symbol -> {direccion: ([niveles ordenados], [claves])}
+        self.ultimo_precio = {}
+
+    def armar(self, symbol, niveles):
+        """Reemplaza los niveles armados de un símbolo por [(clave, nivel, direccion), ...]"""
+        indice = {}
+        for direccion in (CRUCE_BAJANDO, CRUCE_SUBIENDO):
+            ordenados = sorted((nivel, clave) for clave, nivel, d in niveles if d == direccion)
+            if ordenados:
+                indice[direccion] = ([n for n, _ in ordenados], [c for _, c in ordenados])
+        with self.lock:
+            if indice:
+                self.niveles[symbol] = indice
+            else:
+                self.niveles.pop(symbol, None)
+
+    def desarmar(self, symbol):
+        with self.lock:
+            self.niveles.pop(symbol, None)
+
+    def procesar_precio(self, symbol, precio):
+        with self.lock:
+            anterior = self.ultimo_precio.get(symbol)
+            self.ultimo_precio[symbol] = precio
+            indice = self.niveles.get(symbol)
+            if anterior is None or indice is None or precio == anterior:
+                return
+
+            if precio < anterior:
+                # anterior > nivel >= precio, del más cercano al más lejano
+                niveles, claves = indice.get(CRUCE_BAJANDO, ((), ()))
+                i = bisect_left(niveles, precio)
+                j = bisect_left(niveles, anterior)
+                disparados = [(claves[k], niveles[k]) for k in range(j - 1, i - 1, -1)]
+            else:
+                # anterior < nivel <= precio, del más cercano al más lejano
+                niveles, claves = indice.get(CRUCE_SUBIENDO, ((), ()))
+                i = bisect_right(niveles, anterior)
+                j = bisect_right(niveles, precio)
+                disparados = [(claves[k], niveles[k]) for k in range(i, j)]
+
+        for clave, nivel in disparados:
+            try:
+                self.on_cruce(symbol, clave, nivel, precio)
+            except Exception as e:
+                print(f"Error procesando cruce en {symbol}: {e}")
+
+# ---------- CACHÉ DE METADATOS Y ESTADO ----------
+
+RUTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oraculo_cache.json")
+TTL_METADATA = 24 * 3600  # exchangeInfo se vuelve a descargar como mucho una vez al día
+MAX_EDAD_ESTADO = 12 * 3600  # Un estado de shocks más viejo no se muestra al arrancar
+
+# Filtros de exchangeInfo indexados por símbolo: {symbol: {'tick_size', 'filtros'}}
+metadata_simbolos = {}
+metadata_lock = threading.Lock()
+metadata_ultimo_fallo = [0.0]  # Evita reintentar la descarga por cada símbolo si Binance no responde
+cache_lock = threading.Lock()
+
+def leer_cache():
+    try:
+        with open(RUTA_CACHE, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def escribir_cache(actualizacion):
+    """Actualiza secciones del archivo de caché de forma atómica"""
+    with cache_lock:
+        datos = leer_cache()
+        datos.update(actualizacion)
+        temporal = RUTA_CACHE + ".tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f)
+            os.replace(temporal, RUTA_CACHE)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la caché: {e}")
+
+def cargar_metadata_simbolos(forzar=False):
+    """Descarga exchangeInfo UNA vez e indexa los filtros por símbolo.
+
+    Usa la copia en disco mientras no supere TTL_METADATA; si la descarga falla
+    se sigue usando la copia vencida.
+    """
+    with metadata_lock:
+        if metadata_simbolos and not forzar:
+            return metadata_simbolos
+        if not forzar and time.time() - metadata_ultimo_fallo[0] < 60:
+            return metadata_simbolos
+
+        cache = leer_cache().get('metadata', {})
+        vigente = time.time() - cache.get('ts', 0) < TTL_METADATA
+        if cache.get('symbols') and vigente and not forzar:
+            metadata_simbolos.update(cache['symbols'])
+            return metadata_simbolos
+
+        try:
+            print("📡 Descargando exchangeInfo...")
+            data = requests.get("https://fapi.binance.com/fapi/v1/exchangeInfo", timeout=10).json()
+        except Exception as e:
+            print(f"⚠️ No se pudo descargar exchangeInfo: {e}")
+            metadata_ultimo_fallo[0] = time.time()
+            metadata_simbolos.update(cache.get('symbols', {}))
+            return metadata_simbolos
+
+        indice = {}
+        for s in data["symbols"]:
+            filtros = {f["filterType"]: f for f in s["filters"]}
+            indice[s["symbol"]] = {
+                'tick_size': float(filtros.get("PRICE_FILTER", {}).get("tickSize", 0.01)),
+                'filtros': filtros
+            }
+        metadata_simbolos.clear()
+        metadata_simbolos.update(indice)
+        escribir_cache({'metadata': {'ts': time.time(), 'symbols': indice}})
+        print(f"✅ Metadatos de {len(indice)} símbolos guardados en caché")
+        return metadata_simbolos
+
+def obtener_tick_size(symbol):
+    metadata = cargar_metadata_simbolos().get(symbol)
+    if metadata is None:
+        return 0.01
+    return metadata['tick_size']
+
+def guardar_estado_oraculo(agrupaciones, tick_sizes, shocks_activos, precios):
+    """Guarda el último resultado del escaneo para mostrarlo al instante en el próximo arranque"""
+    escribir_cache({'estado': {
+        'ts': time.time(),
+        'agrupaciones': agrupaciones,
+        'tick_sizes': tick_sizes,
+        'shocks_activos': shocks_activos,
+        'precios': precios
+    }})
+
+def cargar_estado_oraculo():
+    estado = leer_cache().get('estado')
+    if not estado or time.time() - estado.get('ts', 0) > MAX_EDAD_ESTADO:
+        return None
+    return estado
+
+# Sesión HTTP compartida con el servidor de order books (conexiones keep-alive reutilizadas)
+sesion_api = requests.Session()
+sesion_api.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+def cargar_libro_ordenes_api(symbols, base_url="http://localhost:8000", lote=200, comprimir=False):
+    """Descarga libros con el endpoint bulk binario: una petición por lote de símbolos.
+
+    Si el servidor no tiene /orderbooks (versión anterior) los pide uno por uno.
+    Los precios y cantidades del resultado son float.
+    """
+    order_books = {}
+    print(f"📖 Cargando libros de órdenes para {len(symbols)} símbolos...")
+    sys.stdout.flush()
+
+    for i in range(0, len(symbols), lote):
+        grupo = symbols[i:i + lote]
+        params = {"symbols": ",".join(grupo), "format": "binary", "compress": str(comprimir).lower()}
+        try:
+            resp = sesion_api.get(f"{base_url}/orderbooks", params=params, timeout=30)
+        except Exception:
+            continue
+        if resp.status_code == 404:
+            return cargar_libro_ordenes_individual(symbols, base_url)
+        if resp.status_code == 200:
+            order_books.update(decode_books(resp.content))
+
+    print(f"✅ Libros de órdenes cargados: {len(order_books)}/{len(symbols)}")
+    sys.stdout.flush()
+    return order_books
+
+def cargar_libro_ordenes_individual(symbols, base_url="http://localhost:8000"):
+    order_books = {}
+
+    for idx, symbol in enumerate(symbols):
+        try:
+            resp = sesion_api.get(f"{base_url}/orderbooks/{symbol}", timeout=5)
+            if resp.status_code == 200:
+                order_books[symbol] = resp.json()
+                # Mostrar progreso cada 10 símbolos
+                if (idx + 1) % 10 == 0:
+                    print(f"   Cargados {idx + 1}/{len(symbols)} libros...")
+                    sys.stdout.flush()
+        except Exception:
+            pass
+
+    print(f"✅ Libros de órdenes cargados: {len(order_books)}/{len(symbols)}")
+    sys.stdout.flush()
+    return order_books
+
+def cargar_shocks_api(symbols, agrupaciones, base_url="http://localhost:8000", lote=50):
+    """Obtiene los shocks calculados por el servidor en /shocks (pocos números por símbolo).
+
+    Devuelve {symbol: (shocks_long, shocks_short, decimales)} o None si el servidor
+    no expone /shocks (versión anterior del servidor de order books).
+    """
+    shocks = {}
+    simbolos = [s for s in symbols if s in agrupaciones]
+    print(f"📡 Cargando shocks del servidor para {len(simbolos)} símbolos...")
+    sys.stdout.flush()
+
+    for i in range(0, len(simbolos), lote):
+        grupo = simbolos[i:i + lote]
+        params = {
+            "symbols": ",".join(grupo),
+            "agrupaciones": ",".join(str(agrupaciones[s]) for s in grupo)
+        }
+        try:
+            resp = sesion_api.get(f"{base_url}/shocks", params=params, timeout=10)
+        except Exception:
+            continue
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            continue
+        for symbol, r in resp.json().get("shocks", {}).items():
+            shocks[symbol] = (r["shocks_long"], r["shocks_short"], r["decimales"])
+
+    print(f"✅ Shocks cargados: {len(shocks)}/{len(simbolos)}")
+    sys.stdout.flush()
+    return shocks
+
+def obtener_shocks(symbols, agrupaciones, tick_sizes, base_url="http://localhost:8000", lector=None):
+    """Shocks por símbolo desde el servidor; si no tiene /shocks, descarga los libros y calcula localmente.
+
+    Con un LectorLibros los libros se leen de la memoria compartida del servidor
+    (mismo host) y solo los que falten se piden por HTTP.
+    """
+    simbolos = [s for s in symbols if s in agrupaciones]
+    if lector is not None:
+        order_books = lector.cargar(simbolos)
+        faltantes = [s for s in simbolos if s not in order_books]
+        if faltantes:
+            order_books.update(cargar_libro_ordenes_api(faltantes, base_url))
+        return {
+            symbol: calcular_shocks(order_book, agrupaciones[symbol], tick_sizes[symbol])
+            for symbol, order_book in order_books.items()
+        }
+
+    shocks = cargar_shocks_api(symbols, agrupaciones, base_url)
+    if shocks is not None:
+        return shocks
+
+    order_books = cargar_libro_ordenes_api(simbolos, base_url)
+    return {
+        symbol: calcular_shocks(order_book, agrupaciones[symbol], tick_sizes[symbol])
+        for symbol, order_book in order_books.items()
+    }
+
+def obtener_simbolos(base_url="http://localhost:8000"):
+    try:
+        print(f"📡 Conectando a API: {base_url}/symbols")
+        sys.stdout.flush()
+        resp = sesion_api.get(f"{base_url}/symbols", timeout=5)
+        if resp.status_code == 200:
+            symbols = resp.json().get("symbols", [])
+            print(f"✅ API respondió con {len(symbols)} símbolos")
+            sys.stdout.flush()
+            return symbols
+        else:
+            print(f"❌ API respondió con código: {resp.status_code}")
+            sys.stdout.flush()
+    except requests.exceptions.ConnectionError:
+        print(f"❌ ERROR: No se puede conectar a {base_url}")
+        print("   Asegúrate de que el servidor del libro de órdenes esté corriendo")
+        sys.stdout.flush()
+    except requests.exceptions.Timeout:
+        print(f"❌ ERROR: Timeout al conectar a {base_url}")
+        sys.stdout.flush()
+    except Exception as e:
+        print(f"❌ ERROR al obtener símbolos: {e}")
+        sys.stdout.flush()
+    return []
+
+class ReplicaLibros:
+    """Réplica local de los libros del servidor alimentada por /ws/books.
+
+    Recibe un snapshot por símbolo y después solo los deltas, así el libro local
+    se mantiene al día sin volver a descargarlo completo. Si un delta no encadena
+    con el anterior (pu != last_u) se descarta el libro y se pide un snapshot nuevo.
+    """
+
+    def __init__(self, symbols, base_url="http://localhost:8000"):
+        ws_url = base_url.replace("https://", "wss://").replace("http://", "ws://")
+        self.url = f"{ws_url}/ws/books?symbols={','.join(symbols)}"
+        self.libros = {}
+        self.lock = threading.Lock()
+
+    def iniciar(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                print(f"🔌 Conectando réplica de libros ({self.url.split('?')[0]})...")
+                ws = websocket.WebSocketApp(
+                    self.url,
+                    on_message=self._on_message,
+                    on_error=lambda _, err: print(f"⚠️ Error WS réplica: {err}"),
+                    on_close=lambda *args: print("❌ WS réplica cerrado"),
+                )
+                ws.run_forever()
+            except Exception as e:
+                print(f"💥 Error en WS réplica: {e}")
+
+            with self.lock:
+                self.libros.clear()
+            print("🔁 Reconectando réplica de libros en 5 segundos...")
+            time.sleep(5)
+
+    def _on_message(self, ws, message):
+        try:
+            mensaje = decoders.loads(message)
+        except Exception:
+            return
+
+        symbol = mensaje.get('s')
+        tipo = mensaje.get('type')
+        pedir_resync = False
+
+        with self.lock:
+            if tipo == 'snapshot':
+                self.libros[symbol] = {
+                    'bids': {float(p): float(q) for p, q in mensaje['bids']},
+                    'asks': {float(p): float(q) for p, q in mensaje['asks']},
+                    'last_u': mensaje['last_u']
+                }
+            elif tipo == 'reset':
+                self.libros.pop(symbol, None)
+            elif tipo == 'delta':
+                libro = self.libros.get(symbol)
+                if libro is None or mensaje['u'] <= libro['last_u']:
+                    return
+                if mensaje['pu'] != libro['last_u']:
+                    del self.libros[symbol]
+                    pedir_resync = True
+                else:
+                    for lado, cambios in (('bids', mensaje['b']), ('asks', mensaje['a'])):
+                        niveles = libro[lado]
+                        for price, qty in cambios:
+                            price, qty = float(price), float(qty)
+                            if qty == 0:
+                                niveles.pop(price, None)
+                            else:
+                                niveles[price] = qty
+                    libro['last_u'] = mensaje['u']
+
+        if pedir_resync:
+            print(f"⚠️ Réplica de {symbol} fuera de secuencia, pidiendo snapshot")
+            ws.send(json.dumps({'resync': symbol}))
+
+    def obtener(self, symbol):
+        """Copia del libro replicado (None si no está sincronizado)"""
+        with self.lock:
+            libro = self.libros.get(symbol)
+            if libro is None:
+                return None
+            return {'bids': dict(libro['bids']), 'asks': dict(libro['asks']), 'last_u': libro['last_u']}
+
+# ---------- MOTOR DE SHOCKS ----------
+
+# Índices de los shocks usados como (entrada, stop) en la lista ordenada desde el precio
+INDICES_SHOCK = (3, 4)
+# Si no hay suficientes shocks: el escaneo usa el 3º y 4º, el recálculo tras un toque los 2 primeros
+FALLBACK_ESCANEO = (2, 3)
+FALLBACK_RECALCULO = (0, 1)
+
+ESPERA_PRECIOS = 5       # Segundos como máximo esperando el primer ticker de cada símbolo
+ESPERA_REINTENTO = 10    # Segundos antes de reintentar un escaneo fallido
+
+# El escaneo no espera al universo entero: los símbolos con precio salen en lotes
+# chicos a un pool de hilos (HTTP y cálculo de shocks en paralelo) y cada lote
+# publica sus tarjetas apenas termina
+HILOS_ESCANEO = 4        # Lotes en vuelo a la vez (sesion_api mantiene hasta 16 conexiones)
+LOTE_INICIAL = 2         # El primer lote es chico y los siguientes duplican el tamaño hasta
+LOTE_ESCANEO = 20        # LOTE_ESCANEO: los lotes en vuelo se reparten la CPU del servidor y
+                         # uno chico termina primero
+SONDEO_ESCANEO = 0.05    # Segundos entre revisiones de precios nuevos mientras hay lotes en vuelo
+
+def seleccionar_shocks(shocks, fallback):
+    """(entrada, stop, es_fallback) de una lista de shocks, o None si no alcanzan"""
+    i, j = INDICES_SHOCK
+    if len(shocks) > j:
+        return shocks[i], shocks[j], False
+    i, j = fallback
+    if len(shocks) > j:
+        return shocks[i], shocks[j], True
+    return None
+
+class MotorOraculo:
+    """Detector de shocks sin interfaz gráfica.
+
+    Escanea el universo del servidor de order books, elige entrada y stop de cada
+    lado, arma los niveles en el MotorCruces y recalcula un símbolo cuando el
+    precio toca su entrada. Todo lo que produce sale como eventos (dicts) hacia
+    los suscriptores:
+
+    - tarjetas: {"evento", "ts", "longs", "shorts"} con la lista completa, tras
+      el escaneo, cada recálculo y al restaurar la caché
+    - toque / stop: {"evento", "ts", "symbol", "tipo", "nivel", "precio"}
+    - estado: {"evento", "ts", "mensaje"}
+    - precio: {"evento", "symbol", "precio"}, solo para quien se suscribe con
+      precios=True (uno por ticker)
+
+    Los suscriptores se llaman desde los hilos del motor (WebSocket de precios,
+    escaneo o recálculo): una interfaz gráfica tiene que pasar a su propio hilo.
+    """
+
+    def __init__(self, base_url="http://localhost:8000"):
+        self.base_url = base_url
+        self.agrupaciones = {}
+        self.tick_sizes = {}
+        self.shocks_activos = {}
+        self.precios_actuales = {}
+        self.motor_cruces = MotorCruces(self.on_cruce)
+        self.replica = None
+        self.lector_libros = None
+        self.usar_replica = True   # False en un escaneo único: no vale la pena el WebSocket de profundidad
+        self.ws_precios_iniciado = False
+        self.activo = True
+        self.suscriptores = []  # (callback, recibe_precios)
+        # Un solo recálculo por símbolo: un precio que oscila sobre la entrada la
+        # cruza muchas veces seguidas y cada cruce dispararía otro hilo
+        self.recalculando = set()
+        self.recalculo_lock = threading.Lock()
+
+    # ----- Eventos -----
+
+    def suscribir(self, callback, precios=False):
+        self.suscriptores.append((callback, precios))
+
+    def emitir(self, evento):
+        es_precio = evento['evento'] == 'precio'
+        for callback, recibe_precios in list(self.suscriptores):
+            if es_precio and not recibe_precios:
+                continue
+            try:
+                callback(evento)
+            except Exception as e:
+                print(f"⚠️ Error en suscriptor del motor: {e}")
+
+    def estado(self, mensaje):
+        self.emitir({'evento': 'estado', 'ts': time.time(), 'mensaje': mensaje})
+
+    def emitir_tarjetas(self):
+        longs, shorts = self.tarjetas()
+        self.emitir({'evento': 'tarjetas', 'ts': time.time(), 'longs': longs, 'shorts': shorts})
+
+    def tarjetas(self):
+        """(longs, shorts) de shocks_activos ordenados por distancia al precio actual"""
+        resultados_long = []
+        resultados_short = []
+
+        for symbol, shocks in list(self.shocks_activos.items()):
+            precio_actual = self.precios_actuales.get(symbol)
+            if precio_actual is None:
+                continue
+
+            tick = self.tick_sizes.get(symbol, 0.01)
+            decimales = obtener_decimales_de_tick(tick)
+            agrupacion = self.agrupaciones.get(symbol, 0.01)
+
+            for lado, tipo, resultados in (('long', 'LONG', resultados_long), ('short', 'SHORT', resultados_short)):
+                if lado not in shocks:
+                    continue
+                entrada = shocks[lado]['entrada']
+                resultados.append({
+                    'symbol': symbol,
+                    'tipo': tipo,
+                    'entrada': entrada,
+                    'stop_loss': shocks[lado]['stop'],
+                    'distancia_pct': abs((entrada - precio_actual) / precio_actual * 100),
+                    'precio_actual': precio_actual,
+                    'decimales': decimales,
+                    'agrupacion': agrupacion,
+                    'tick_size': tick
+                })
+
+        resultados_long.sort(key=lambda x: x['distancia_pct'])
+        resultados_short.sort(key=lambda x: x['distancia_pct'])
+        return resultados_long, resultados_short
+
+    # ----- Estado en caché -----
+
+    def restaurar_estado_cache(self):
+        """Carga el último escaneo guardado. Devuelve True si había uno vigente."""
+        estado = cargar_estado_oraculo()
+        if not estado:
+            return False
+
+        self.agrupaciones.update(estado.get('agrupaciones', {}))
+        self.tick_sizes.update(estado.get('tick_sizes', {}))
+        self.shocks_activos.update(estado.get('shocks_activos', {}))
+        # Solo precios para mostrar: el motor de cruces compara contra los precios
+        # del WebSocket, nunca contra un precio viejo de la caché
+        self.precios_actuales.update(estado.get('precios', {}))
+
+        print(f"♻️ Estado en caché restaurado: {len(self.shocks_activos)} símbolos")
+        sys.stdout.flush()
+        self.estado("♻️ Último estado guardado - actualizando...")
+        self.emitir_tarjetas()
+        return True
+
+    def guardar_estado(self):
+        try:
+            guardar_estado_oraculo(
+                dict(self.agrupaciones),
+                dict(self.tick_sizes),
+                {symbol: dict(shocks) for symbol, shocks in list(self.shocks_activos.items())},
+                dict(self.precios_actuales)
+            )
+        except Exception as e:
+            print(f"⚠️ Error guardando estado: {e}")
+
+    # ----- Cruces -----
+
+    def armar_niveles(self, symbols=None):
+        """Arma en el motor de cruces las entradas y stops de shocks_activos"""
+        if symbols is None:
+            symbols = list(self.shocks_activos.keys())
+
+        for symbol in symbols:
+            shocks = self.shocks_activos.get(symbol, {})
+            niveles = []
+            if 'long' in shocks:
+                niveles.append((('long', 'entrada'), shocks['long']['entrada'], CRUCE_BAJANDO))
+                niveles.append((('long', 'stop'), shocks['long']['stop'], CRUCE_BAJANDO))
+            if 'short' in shocks:
+                niveles.append((('short', 'entrada'), shocks['short']['entrada'], CRUCE_SUBIENDO))
+                niveles.append((('short', 'stop'), shocks['short']['stop'], CRUCE_SUBIENDO))
+            self.motor_cruces.armar(symbol, niveles)
+
+        print(f"🔍 Niveles armados en el motor de cruces: {len(symbols)} símbolos")
+        sys.stdout.flush()
+
+    def on_precio(self, symbol, precio):
+        """Cada ticker del WebSocket: detecta cruces y publica el precio"""
+        if not self.activo:
+            return
+
+        self.motor_cruces.procesar_precio(symbol, precio)
+
+        if symbol in self.shocks_activos:
+            self.precios_actuales[symbol] = precio
+            self.emitir({'evento': 'precio', 'symbol': symbol, 'precio': precio})
+
+    def on_cruce(self, symbol, clave, nivel, precio):
+        tipo, nivel_tipo = clave
+        if nivel_tipo == 'entrada':
+            print(f"🎯 TOQUE {tipo.upper()} detectado en {symbol} - Precio: {precio}, Entrada: {nivel}")
+            self.emitir({'evento': 'toque', 'ts': time.time(), 'symbol': symbol,
+                         'tipo': tipo.upper(), 'nivel': nivel, 'precio': precio})
+            self.estado(f"🎯 TOQUE {tipo.upper()}: {symbol}")
+            with self.recalculo_lock:
+                en_curso = symbol in self.recalculando
+                self.recalculando.add(symbol)
+            if not en_curso:
+                threading.Thread(target=self.recalcular, args=(symbol,), daemon=True).start()
+        else:
+            print(f"🛑 STOP {tipo.upper()} cruzado en {symbol} - Precio: {precio}, Stop: {nivel}")
+            self.emitir({'evento': 'stop', 'ts': time.time(), 'symbol': symbol,
+                         'tipo': tipo.upper(), 'nivel': nivel, 'precio': precio})
+        sys.stdout.flush()
+
+    # ----- Escaneo -----
+
+    def iniciar_precios(self, symbols):
+        """WebSocket de precios para todo el universo (una sola vez). No espera: el
+        escaneo toma cada símbolo cuando llega su primer ticker."""
+        if self.ws_precios_iniciado:
+            return
+        print(f"🚀 Iniciando WebSocket de precios para {len(symbols)} símbolos...")
+        sys.stdout.flush()
+        iniciar_websocket_precios(symbols, on_precio=self.on_precio)
+        self.ws_precios_iniciado = True
+
+    def iniciar_libros(self, symbols):
+        # Libros en memoria compartida del servidor (mismo host): sin HTTP ni réplica
+        if NOMBRE_SHM_LIBROS and self.lector_libros is None:
+            try:
+                self.lector_libros = LectorLibros(NOMBRE_SHM_LIBROS)
+                print(f"🧠 Leyendo libros de la memoria compartida '{NOMBRE_SHM_LIBROS}'")
+            except (FileNotFoundError, ValueError) as e:
+                print(f"⚠️ Memoria compartida '{NOMBRE_SHM_LIBROS}' no disponible ({e}), se usa la API")
+            sys.stdout.flush()
+
+        # Réplica local de libros: los recálculos tras un toque no descargan el libro
+        if self.usar_replica and self.replica is None and self.lector_libros is None:
+            self.replica = ReplicaLibros(symbols, self.base_url)
+            self.replica.iniciar()
+
+    def shocks_de_lote(self, symbols):
+        """Shocks de un lote de símbolos (corre en el pool del escaneo)"""
+        try:
+            return obtener_shocks(symbols, self.agrupaciones, self.tick_sizes, self.base_url, self.lector_libros)
+        except Exception as e:
+            print(f"⚠️ Error escaneando lote de {len(symbols)} símbolos: {e}")
+            sys.stdout.flush()
+            return {}
+
+    def aplicar_shocks(self, shocks_por_simbolo, simbolos_sin_shocks):
+        """Elige entrada y stop de cada símbolo del lote (hilo del escaneo)"""
+        for symbol, (shocks_long, shocks_short, decimales_tick) in shocks_por_simbolo.items():
+            precio_actual = obtener_precio_actual(symbol)
+            if precio_actual is not None:
+                self.precios_actuales[symbol] = precio_actual
+
+            # Reemplaza lo que hubiera en caché para este símbolo
+            self.shocks_activos[symbol] = {}
+
+            for lado, shocks in (('long', shocks_long), ('short', shocks_short)):
+                seleccion = seleccionar_shocks(shocks, FALLBACK_ESCANEO)
+                if seleccion is None:
+                    simbolos_sin_shocks.append(f"{symbol} ({lado.upper()}: {len(shocks)} shocks)")
+                    continue
+                entrada, stop, es_fallback = seleccion
+                self.shocks_activos[symbol][lado] = {'entrada': entrada, 'stop': stop}
+                if es_fallback:
+                    print(f"⚠️ {symbol} {lado.upper()}: Solo {len(shocks)} shocks (usando fallback)")
+                    sys.stdout.flush()
+
+    def escanear(self):
+        """Escaneo completo del universo. Devuelve False si hay que reintentar.
+
+        Cada símbolo entra al pool en cuanto tiene precio (hace falta para la
+        agrupación) y las tarjetas se publican lote a lote. Los símbolos sin ticker
+        después de ESPERA_PRECIOS segundos quedan fuera del escaneo.
+        """
+        print("🔍 Realizando escaneo inicial de order books...")
+        sys.stdout.flush()
+        self.estado("🔍 Escaneando...")
+
+        symbols = obtener_simbolos(self.base_url)
+        if not symbols:
+            print("❌ No hay símbolos disponibles")
+            self.estado(f"❌ No hay símbolos - Reintentando en {ESPERA_REINTENTO}s")
+            sys.stdout.flush()
+            return False
+
+        print(f"✅ Símbolos obtenidos: {len(symbols)}")
+        sys.stdout.flush()
+
+        self.iniciar_precios(symbols)
+        self.iniciar_libros(symbols)
+
+        # Tick sizes desde la caché de exchangeInfo (una sola descarga para todo el universo)
+        cargar_metadata_simbolos()
+
+        pendientes = list(symbols)
+        en_vuelo = set()
+        tamano_lote = LOTE_INICIAL
+        limite_precios = time.time() + ESPERA_PRECIOS
+        simbolos_sin_precio = []
+        simbolos_sin_shocks = []
+        analizados = 0
+
+        with ThreadPoolExecutor(max_workers=HILOS_ESCANEO, thread_name_prefix="escaneo") as ejecutor:
+            while pendientes or en_vuelo:
+                listos = []
+                esperando = []
+                for symbol in pendientes:
+                    precio = obtener_precio_actual(symbol)
+                    if precio is None:
+                        esperando.append(symbol)
+                        continue
+                    self.tick_sizes[symbol] = obtener_tick_size(symbol)
+                    self.agrupaciones[symbol] = obtener_nivel_agrupacion_optimo(self.tick_sizes[symbol], precio)
+                    listos.append(symbol)
+
+                pendientes = esperando
+                if pendientes and time.time() >= limite_precios:
+                    simbolos_sin_precio.extend(pendientes)
+                    pendientes = []
+
+                while listos:
+                    lote, listos = listos[:tamano_lote], listos[tamano_lote:]
+                    en_vuelo.add(ejecutor.submit(self.shocks_de_lote, lote))
+                    tamano_lote = min(tamano_lote * 2, LOTE_ESCANEO)
+
+                if not en_vuelo:
+                    if pendientes:
+                        time.sleep(SONDEO_ESCANEO)
+                    continue
+
+                hechos, en_vuelo = wait(en_vuelo, timeout=SONDEO_ESCANEO if pendientes else None,
+                                        return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    shocks_lote = futuro.result()
+                    if not shocks_lote:
+                        continue
+                    analizados += len(shocks_lote)
+                    self.aplicar_shocks(shocks_lote, simbolos_sin_shocks)
+                    self.armar_niveles(list(shocks_lote))
+                    self.emitir_tarjetas()
+                    self.estado(f"🔍 Escaneando... {analizados}/{len(symbols)}")
+
+        print(f"✅ Precios recibidos: {len(symbols) - len(simbolos_sin_precio)}/{len(symbols)}")
+        sys.stdout.flush()
+
+        if not analizados:
+            print("❌ No hay datos de libros de órdenes")
+            self.estado(f"❌ No hay datos del libro - Reintentando en {ESPERA_REINTENTO}s")
+            sys.stdout.flush()
+            return False
+
+        resultados_long, resultados_short = self.tarjetas()
+
+        # Reporte detallado de escaneo
+        print(f"\n{'='*60}")
+        print("✅ Escaneo inicial completado:")
+        print(f"   📊 Total símbolos: {len(symbols)}")
+        print(f"   📖 Libros analizados: {analizados}")
+        print(f"   🟢 LONGs detectados: {len(resultados_long)}")
+        print(f"   🔴 SHORTs detectados: {len(resultados_short)}")
+
+        if simbolos_sin_precio:
+            print(f"   ⚠️ Símbolos sin precio WebSocket ({len(simbolos_sin_precio)}): {simbolos_sin_precio[:5]}")
+            if len(simbolos_sin_precio) > 5:
+                print(f"      ... y {len(simbolos_sin_precio) - 5} más")
+
+        if simbolos_sin_shocks:
+            print(f"   ⚠️ Símbolos sin suficientes shocks ({len(simbolos_sin_shocks)}):")
+            for s in simbolos_sin_shocks[:5]:
+                print(f"      - {s}")
+            if len(simbolos_sin_shocks) > 5:
+                print(f"      ... y {len(simbolos_sin_shocks) - 5} más")
+
+        print(f"{'='*60}\n")
+        sys.stdout.flush()
+
+        # Actualizar status con información útil
+        if len(resultados_long) == 0 and len(resultados_short) == 0:
+            self.estado(f"⚠️ Sin shocks - Sin precio: {len(simbolos_sin_precio)}, Sin data: {len(simbolos_sin_shocks)}")
+        else:
+            self.estado("🟢 Monitoreando")
+
+        self.guardar_estado()
+        return True
+
+    def escanear_hasta_lograrlo(self):
+        while self.activo and not self.escanear():
+            time.sleep(ESPERA_REINTENTO)
+
+    def iniciar(self):
+        """Escaneo inicial en un hilo NO daemon; después el motor sigue con los cruces"""
+        hilo_escaneo = threading.Thread(target=self.escanear_hasta_lograrlo, name="escanear", daemon=False)
+        hilo_escaneo.start()
+        return hilo_escaneo
+
+    def detener(self):
+        self.activo = False
+
+    # ----- Recálculo tras un toque -----
+
+    def recalcular(self, symbol):
+        print(f"📊 Recalculando order book para {symbol}...")
+        sys.stdout.flush()
+
+        try:
+            if self.lector_libros is not None:
+                libro = self.lector_libros.leer(symbol)
+            else:
+                libro = self.replica.obtener(symbol) if self.replica else None
+            if libro is not None:
+                shocks_por_simbolo = {
+                    symbol: calcular_shocks(libro, self.agrupaciones[symbol], self.tick_sizes[symbol])
+                }
+            else:
+                shocks_por_simbolo = obtener_shocks(
+                    [symbol], self.agrupaciones, self.tick_sizes, self.base_url, self.lector_libros)
+
+            if symbol not in shocks_por_simbolo:
+                print(f"❌ No se pudo obtener order book para {symbol}")
+                sys.stdout.flush()
+                return
+
+            shocks_long, shocks_short, decimales_tick = shocks_por_simbolo[symbol]
+
+            # Mismos índices (3 y 4) que en el escaneo inicial
+            for lado, shocks in (('long', shocks_long), ('short', shocks_short)):
+                seleccion = seleccionar_shocks(shocks, FALLBACK_RECALCULO)
+                if seleccion is None:
+                    continue
+                entrada, stop, es_fallback = seleccion
+                self.shocks_activos[symbol][lado] = {'entrada': entrada, 'stop': stop}
+                if es_fallback:
+                    print(f"⚠️ {symbol} {lado.upper()} actualizado (fallback) - Nueva entrada: {entrada}")
+                else:
+                    print(f"✅ {symbol} {lado.upper()} actualizado - Nueva entrada: {entrada}")
+                sys.stdout.flush()
+
+            self.armar_niveles([symbol])
+            self.emitir_tarjetas()
+            self.guardar_estado()
+
+        except Exception as e:
+            print(f"Error recalculando shock para {symbol}: {e}")
+            sys.stdout.flush()
+        finally:
+            with self.recalculo_lock:
+                self.recalculando.discard(symbol)
+
+# ---------- SALIDAS DE SEÑALES ----------
+
+class SalidaJSONL:
+    """Escribe cada evento como una línea JSON en un archivo abierto (o stdout)"""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.lock = threading.Lock()
+
+    def __call__(self, evento):
+        linea = json.dumps(evento, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self.archivo.write(linea + "\n")
+            self.archivo.flush()
+
+class SalidaSocket:
+    """Servidor TCP local: cada cliente conectado recibe los eventos como líneas JSON.
+
+    Un cliente nuevo recibe primero las últimas tarjetas, así no espera al próximo
+    escaneo o toque para tener la lista completa.
+    """
+
+    def __init__(self, host, puerto):
+        self.servidor = socket.create_server((host, puerto))
+        self.clientes = []
+        self.ultimas_tarjetas = None
+        self.lock = threading.Lock()
+        threading.Thread(target=self._aceptar, daemon=True).start()
+        print(f"📡 Señales disponibles en tcp://{host}:{self.servidor.getsockname()[1]}")
+
+    def _aceptar(self):
+        while True:
+            cliente, _ = self.servidor.accept()
+            with self.lock:
+                try:
+                    if self.ultimas_tarjetas is not None:
+                        cliente.sendall(self.ultimas_tarjetas)
+                    self.clientes.append(cliente)
+                except OSError:
+                    cliente.close()
+
+    def __call__(self, evento):
+        datos = (json.dumps(evento, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        with self.lock:
+            if evento['evento'] == 'tarjetas':
+                self.ultimas_tarjetas = datos
+            for cliente in list(self.clientes):
+                try:
+                    cliente.sendall(datos)
+                except OSError:
+                    self.clientes.remove(cliente)
+                    cliente.close()
+
+def crear_salida(destino, stdout_real):
+    """stdout | jsonl:RUTA | socket:HOST:PUERTO"""
+    if destino == "stdout":
+        return SalidaJSONL(stdout_real)
+    if destino.startswith("jsonl:"):
+        return SalidaJSONL(open(destino[len("jsonl:"):], "a", encoding="utf-8"))
+    if destino.startswith("socket:"):
+        host, _, puerto = destino[len("socket:"):].rpartition(":")
+        return SalidaSocket(host or "127.0.0.1", int(puerto))
+    raise ValueError(f"Salida desconocida: {destino}")
+
+# ---------- EJECUTAR SIN INTERFAZ ----------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Detector de shocks sin interfaz gráfica")
+    parser.add_argument("--api", default="http://localhost:8000", help="URL del servidor de order books")
+    parser.add_argument("--salida", action="append",
+                        help="stdout | jsonl:RUTA | socket:HOST:PUERTO (se puede repetir; por defecto stdout)")
+    parser.add_argument("--una-vez", action="store_true", help="un solo escaneo: emite las tarjetas y termina")
+    parser.add_argument("--shm", metavar="NOMBRE", help="lee los libros de la memoria compartida del servidor")
+    args = parser.parse_args()
+
+    # Los eventos por stdout no se mezclan con los mensajes de progreso, que van a stderr
+    stdout_real = sys.stdout
+    sys.stdout = sys.stderr
+
+    if args.shm:
+        NOMBRE_SHM_LIBROS = args.shm
+
+    motor = MotorOraculo(args.api)
+    for destino in args.salida or ["stdout"]:
+        motor.suscribir(crear_salida(destino, stdout_real))
+
+    if args.una_vez:
+        motor.usar_replica = False
+        sys.exit(0 if motor.escanear() else 1)
+
+    motor.iniciar().join()
+    while True:
+        time.sleep(60)
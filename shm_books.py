@@ -0,0 +1,229 @@
+"""Exportación de los libros de órdenes en memoria compartida (mismo host).
+
+El servidor publica el top-N de cada libro en un segmento de
+multiprocessing.shared_memory; los lectores lo mapean y copian los niveles de
+un símbolo sin HTTP, sin JSON y sin gastar CPU del servidor por lectura.
+
+Formato del segmento (orden de bytes nativo, todo alineado a 8 bytes):
+    cabecera: MAGIC (4s) + versión (u32) + slots (u32) + profundidad (u32) + relleno hasta 64
+    por slot (uno por símbolo):
+        secuencia (u64) + símbolo (16s) + tick_size (f64) + lastUpdateId (i64)
+        + last_u (i64) + publicado (f64, time.time()) + n_bids (u32) + n_asks (u32)
+        claves bids (i64 * profundidad) + cantidades bids (f64 * profundidad)
+        claves asks (i64 * profundidad) + cantidades asks (f64 * profundidad)
+
+Las claves y cantidades son las de Ladder tal cual (el mejor nivel al final),
+así publicar es un memcpy de los últimos n niveles de cada array.
+
+Consistencia con seqlock: el escritor deja la secuencia impar mientras escribe
+y par al terminar. El lector copia el slot y lo descarta si la secuencia era
+impar o cambió durante la copia. Hay un único escritor (el hilo publicador).
+lastUpdateId = -1 indica un libro todavía no inicializado.
+"""
+import struct
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from tick_book import Ladder
+
+NOMBRE_SEGMENTO = "oraculo_books"
+PROFUNDIDAD = 1000  # Niveles por lado publicados (el snapshot completo de Binance)
+MAX_INTENTOS = 100
+
+MAGIC = b'OSHM'
+VERSION = 1
+
+_CABECERA = struct.Struct('=4sIII')
+_TAMANO_CABECERA = 64
+_SECUENCIA = struct.Struct('=Q')
+_SLOT = struct.Struct('=Q16sdqqdII')
+
+_creados = set()  # Segmentos creados por este proceso (ya registrados en el resource_tracker)
+
+
+def _tamano_slot(profundidad):
+    return _SLOT.size + 4 * 8 * profundidad
+
+
+def _abrir_sin_seguimiento(nombre):
+    """Abre un segmento existente sin que el resource_tracker lo borre al salir.
+
+    En POSIX, Python < 3.13 registra también los segmentos que solo se abren y
+    los elimina cuando termina el proceso lector (el servidor perdería el suyo).
+    """
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=nombre)
+        if nombre in _creados:
+            return shm
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class ExportadorLibros:
+    """Lado del servidor: crea el segmento y publica los libros"""
+
+    def __init__(self, symbols, nombre=NOMBRE_SEGMENTO, profundidad=PROFUNDIDAD):
+        self.profundidad = profundidad
+        self.tamano_slot = _tamano_slot(profundidad)
+        tamano = _TAMANO_CABECERA + self.tamano_slot * len(symbols)
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+        except FileExistsError:
+            # Segmento de una ejecución anterior que terminó sin limpiar
+            viejo = shared_memory.SharedMemory(name=nombre)
+            viejo.close()
+            viejo.unlink()
+            self.shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+
+        _creados.add(nombre)
+        self.nombre = nombre
+        self.buf = self.shm.buf
+        self.slots = {}
+        self.secuencias = {}
+        self.publicados = {}  # symbol -> last_u publicado
+        for i, symbol in enumerate(symbols):
+            offset = _TAMANO_CABECERA + i * self.tamano_slot
+            self.slots[symbol] = offset
+            self.secuencias[symbol] = 0
+            _SLOT.pack_into(self.buf, offset, 0, symbol.encode('ascii'), 0.0, -1, -1, 0.0, 0, 0)
+        _CABECERA.pack_into(self.buf, 0, MAGIC, VERSION, len(symbols), profundidad)
+
+    def _copiar_lado(self, offset, ladder):
+        n = min(len(ladder), self.profundidad)
+        inicio = len(ladder) - n
+        with memoryview(ladder.keys) as keys:
+            self.buf[offset:offset + 8 * n] = keys[inicio:].cast('B')
+        offset += 8 * self.profundidad
+        with memoryview(ladder.qtys) as qtys:
+            self.buf[offset:offset + 8 * n] = qtys[inicio:].cast('B')
+        return n
+
+    def publicar(self, symbol, book):
+        """Escribe el libro en su slot. Llamar con book['lock'] tomado."""
+        offset = self.slots[symbol]
+        secuencia = self.secuencias[symbol] + 1
+        _SECUENCIA.pack_into(self.buf, offset, secuencia)  # Impar: escritura en curso
+
+        bids = book['bids']
+        datos = offset + _SLOT.size
+        if book['initialized']:
+            n_bids = self._copiar_lado(datos, bids)
+            n_asks = self._copiar_lado(datos + 16 * self.profundidad, book['asks'])
+            last_update_id = book['lastUpdateId']
+            last_u = -1 if book['last_u'] is None else book['last_u']
+        else:
+            n_bids = n_asks = 0
+            last_update_id = last_u = -1
+
+        _SLOT.pack_into(self.buf, offset, secuencia, symbol.encode('ascii'), bids.tick_size,
+                        last_update_id, last_u, time.time(), n_bids, n_asks)
+        self.secuencias[symbol] = secuencia + 1
+        _SECUENCIA.pack_into(self.buf, offset, secuencia + 1)  # Par: slot consistente
+        self.publicados[symbol] = book['last_u'] if book['initialized'] else None
+
+    def publicar_cambios(self, order_books):
+        """Publica los libros cuyo last_u cambió desde la última publicación"""
+        publicados = 0
+        for symbol, book in order_books.items():
+            if symbol not in self.slots:
+                continue
+            actual = book['last_u'] if book['initialized'] else None
+            if symbol in self.publicados and self.publicados[symbol] == actual:
+                continue
+            with book['lock']:
+                self.publicar(symbol, book)
+            publicados += 1
+        return publicados
+
+    def cerrar(self):
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+        _creados.discard(self.nombre)
+
+
+class LectorLibros:
+    """Lado del cliente: mapea el segmento del servidor y lee libros consistentes"""
+
+    def __init__(self, nombre=NOMBRE_SEGMENTO):
+        self.shm = _abrir_sin_seguimiento(nombre)
+        self.buf = self.shm.buf
+        magic, version, cantidad, profundidad = _CABECERA.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Segmento {nombre} con formato desconocido")
+        self.profundidad = profundidad
+        tamano_slot = _tamano_slot(profundidad)
+
+        self.slots = {}
+        for i in range(cantidad):
+            offset = _TAMANO_CABECERA + i * tamano_slot
+            symbol = _SLOT.unpack_from(self.buf, offset)[1].rstrip(b'\x00').decode('ascii')
+            self.slots[symbol] = offset
+
+    def symbols(self):
+        return list(self.slots)
+
+    def _leer_lado(self, offset, n):
+        keys = array('q')
+        keys.frombytes(self.buf[offset:offset + 8 * n])
+        offset += 8 * self.profundidad
+        qtys = array('d')
+        qtys.frombytes(self.buf[offset:offset + 8 * n])
+        return keys, qtys
+
+    def leer(self, symbol):
+        """Copia consistente del libro de symbol con el formato de /orderbooks/{symbol},
+        pero con Ladders en 'bids'/'asks' (to_dict() da el dict de la API).
+
+        Devuelve None si el símbolo no se exporta, el libro no está inicializado o
+        el escritor no dejó el slot quieto durante MAX_INTENTOS intentos.
+        """
+        offset = self.slots.get(symbol)
+        if offset is None:
+            return None
+
+        datos = offset + _SLOT.size
+        for _ in range(MAX_INTENTOS):
+            secuencia, _, tick_size, last_update_id, last_u, publicado, n_bids, n_asks = _SLOT.unpack_from(self.buf, offset)
+            if secuencia & 1:
+                time.sleep(0)
+                continue
+            if last_update_id == -1:
+                return None
+
+            bids = Ladder(tick_size, 'bids')
+            asks = Ladder(tick_size, 'asks')
+            bids.keys, bids.qtys = self._leer_lado(datos, n_bids)
+            asks.keys, asks.qtys = self._leer_lado(datos + 16 * self.profundidad, n_asks)
+
+            if _SECUENCIA.unpack_from(self.buf, offset)[0] == secuencia:
+                return {
+                    "symbol": symbol,
+                    "bids": bids,
+                    "asks": asks,
+                    "lastUpdateId": last_update_id,
+                    "last_u": None if last_u == -1 else last_u,
+                    "publicado": publicado,
+                }
+        return None
+
+    def cargar(self, symbols):
+        """{symbol: libro} de los símbolos inicializados (reemplazo de cargar_libro_ordenes_api)"""
+        libros = {}
+        for symbol in symbols:
+            libro = self.leer(symbol)
+            if libro is not None:
+                libros[symbol] = libro
+        return libros
+
+    def cerrar(self):
+        self.buf = None
+        self.shm.close()
@@ -0,0 +1,378 @@
+"""Análisis de shocks de liquidez compartido por Oráculo y el servidor de order books"""
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from decimal import Decimal, ROUND_DOWN
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el cálculo Decimal en Python puro
+    np = None
+
+# ---------- FUNCIONES DE PRECIO ----------
+
+def obtener_decimales_de_tick(tick_size):
+    tick_str = f"{tick_size:.10f}".rstrip('0')
+    if '.' not in tick_str:
+        return 0
+    return len(tick_str.split('.')[1])
+
+def obtener_nivel_agrupacion_optimo(tick_size, precio_actual):
+    try:
+        if precio_actual is None or precio_actual <= 0:
+            return tick_size
+            
+        if precio_actual >= 100:
+            agrupacion_base = 10.0
+        elif precio_actual >= 10:
+            agrupacion_base = 1.0
+        elif precio_actual >= 1:
+            agrupacion_base = 0.1
+        elif precio_actual >= 0.1:
+            agrupacion_base = 0.01
+        elif precio_actual >= 0.01:
+            agrupacion_base = 0.001
+        elif precio_actual >= 0.001:
+            agrupacion_base = 0.0001
+        else:
+            agrupacion_base = 0.00001
+        
+        tick_decimal = Decimal(str(tick_size))
+        agrupacion_decimal = Decimal(str(agrupacion_base))
+        cociente = agrupacion_decimal / tick_decimal
+        
+        if cociente % 1 == 0:
+            return agrupacion_base
+        
+        niveles_posibles = [0.00001, 0.0001, 0.001, 0.01, 0.1, 1, 10, 100]
+        
+        for nivel in reversed(niveles_posibles):
+            nivel_decimal = Decimal(str(nivel))
+            cociente = nivel_decimal / tick_decimal
+            if cociente % 1 == 0 and nivel <= agrupacion_base:
+                return nivel
+        
+        return tick_size
+        
+    except Exception:
+        return tick_size
+
+def agrupar_precio_binance(price, agrupacion):
+    price_decimal = Decimal(str(price))
+    agrupacion_decimal = Decimal(str(agrupacion))
+    agrupado = (price_decimal / agrupacion_decimal).quantize(Decimal('1'), rounding=ROUND_DOWN) * agrupacion_decimal
+    return float(agrupado)
+
+# ---------- ANÁLISIS DE SHOCKS ----------
+
+def calcular_shocks(order_book, agrupacion, tick_size, top_n=8):
+    """Shocks LONG (bids) y SHORT (asks): precio medio ponderado de los top_n buckets
+    de `agrupacion` con más liquidez, ajustado al tick.
+
+    Usa el motor NumPy cuando está instalado; el resultado es idéntico al cálculo Decimal.
+    """
+    if np is not None:
+        resultado = calcular_shocks_numpy(order_book, agrupacion, tick_size, top_n)
+        if resultado is not None:
+            return resultado
+    return calcular_shocks_decimal(order_book, agrupacion, tick_size, top_n)
+
+def calcular_shocks_decimal(order_book, agrupacion, tick_size, top_n=8):
+    bid_ranges = defaultdict(lambda: {'total_qty': 0, 'price_count': {}})
+    ask_ranges = defaultdict(lambda: {'total_qty': 0, 'price_count': {}})
+
+    for price, qty in order_book.get('bids', {}).items():
+        price, qty = float(price), float(qty)
+        range_key = agrupar_precio_binance(price, agrupacion)
+        bid_ranges[range_key]['total_qty'] += qty
+        bid_ranges[range_key]['price_count'][price] = bid_ranges[range_key]['price_count'].get(price, 0) + qty
+
+    for price, qty in order_book.get('asks', {}).items():
+        price, qty = float(price), float(qty)
+        range_key = agrupar_precio_binance(price, agrupacion)
+        ask_ranges[range_key]['total_qty'] += qty
+        ask_ranges[range_key]['price_count'][price] = ask_ranges[range_key]['price_count'].get(price, 0) + qty
+
+    decimales_tick = obtener_decimales_de_tick(tick_size)
+
+    top_bids = sorted(bid_ranges.items(), key=lambda x: x[1]['total_qty'], reverse=True)[:top_n]
+    top_asks = sorted(ask_ranges.items(), key=lambda x: x[1]['total_qty'], reverse=True)[:top_n]
+
+    shocks_long = []
+    for pr_range, data in top_bids:
+        total_qty = data['total_qty']
+        if total_qty > 0:
+            weighted_avg_price = sum(p * q for p, q in data['price_count'].items()) / total_qty
+            weighted_avg_price = agrupar_precio_binance(weighted_avg_price, tick_size)
+            shocks_long.append(weighted_avg_price)
+
+    shocks_short = []
+    for pr_range, data in top_asks:
+        total_qty = data['total_qty']
+        if total_qty > 0:
+            weighted_avg_price = sum(p * q for p, q in data['price_count'].items()) / total_qty
+            weighted_avg_price = agrupar_precio_binance(weighted_avg_price, tick_size)
+            shocks_short.append(weighted_avg_price)
+
+    shocks_long.sort(reverse=True)
+    shocks_short.sort()
+
+    return shocks_long, shocks_short, decimales_tick
+
+# ---------- MOTOR VECTORIZADO (NumPy) ----------
+
+def _arrays_lado(lado, tick_size, decimales):
+    """Precios, cantidades y ticks de un lado del libro en su orden de iteración.
+
+    Acepta un dict {precio: cantidad} (str o float) o un Ladder. Devuelve None si
+    algún precio no cae en la grilla del tick.
+    """
+    if getattr(lado, 'qtys', None) is not None:
+        # Ladder: los ticks ya son enteros; se recorre desde el mejor precio como items()
+        signo = 1 if lado.side == 'bids' else -1
+        ticks = np.frombuffer(lado.keys, dtype=np.int64)[::-1] * signo
+        qtys = np.frombuffer(lado.qtys, dtype=np.float64)[::-1]
+        precios = np.round(ticks * tick_size, decimales)
+        return precios, qtys, ticks
+
+    n = len(lado)
+    precios = np.fromiter(map(float, lado.keys()), dtype=np.float64, count=n)
+    qtys = np.fromiter(map(float, lado.values()), dtype=np.float64, count=n)
+    ticks = np.rint(precios / tick_size).astype(np.int64)
+    if n and np.any(np.abs(ticks * tick_size - precios) > tick_size * 1e-6):
+        return None
+    return precios, qtys, ticks
+
+def _shocks_lado_numpy(precios, qtys, ticks, ticks_por_bucket, tick_size, top_n):
+    if len(ticks) == 0 or top_n <= 0:
+        return []
+
+    # Bucket entero por nivel (equivale a agrupar_precio_binance para precios positivos)
+    buckets = ticks // ticks_por_bucket
+    _, primer_indice, inverso = np.unique(buckets, return_index=True, return_inverse=True)
+    inverso = inverso.ravel()
+
+    # bincount acumula en el orden de entrada: mismas sumas float que el bucle Python
+    totales = np.bincount(inverso, weights=qtys)
+    sumas_pq = np.bincount(inverso, weights=precios * qtys)
+
+    # Top-N con argpartition; los empates en el umbral se incluyen y se ordenan
+    # igual que sorted(..., reverse=True): mayor total y, a igualdad, primero en aparecer
+    if len(totales) > top_n:
+        candidatos = np.argpartition(-totales, top_n - 1)[:top_n]
+        umbral = totales[candidatos].min()
+        candidatos = np.flatnonzero(totales >= umbral)
+    else:
+        candidatos = np.arange(len(totales))
+    orden = np.lexsort((primer_indice[candidatos], -totales[candidatos]))
+    seleccion = candidatos[orden][:top_n]
+
+    shocks = []
+    for i in seleccion:
+        total_qty = totales[i]
+        if total_qty > 0:
+            weighted_avg_price = float(sumas_pq[i] / total_qty)
+            shocks.append(agrupar_precio_binance(weighted_avg_price, tick_size))
+    return shocks
+
+def calcular_shocks_numpy(order_book, agrupacion, tick_size, top_n=8):
+    """Versión vectorizada de calcular_shocks_decimal.
+
+    Convierte cada lado a arrays una sola vez, agrupa con aritmética entera de
+    ticks y acumula con bincount. Devuelve None cuando la agrupación no es
+    múltiplo exacto del tick o hay precios fuera de la grilla (usar la versión Decimal).
+    """
+    cociente = Decimal(str(agrupacion)) / Decimal(str(tick_size))
+    if cociente <= 0 or cociente % 1 != 0:
+        return None
+    ticks_por_bucket = int(cociente)
+    decimales_tick = obtener_decimales_de_tick(tick_size)
+
+    resultado = []
+    for side in ('bids', 'asks'):
+        arrays = _arrays_lado(order_book.get(side, {}), tick_size, decimales_tick)
+        if arrays is None:
+            return None
+        resultado.append(_shocks_lado_numpy(*arrays, ticks_por_bucket, tick_size, top_n))
+
+    shocks_long, shocks_short = resultado
+    shocks_long.sort(reverse=True)
+    shocks_short.sort()
+    return shocks_long, shocks_short, decimales_tick
+
+# ---------- AGREGACIÓN INCREMENTAL ----------
+
+ESCALA_QTY = 10 ** 8  # Las cantidades se acumulan como enteros para no arrastrar error de float
+# Margen del ranking entero frente a las sumas float de calcular_shocks: relativo
+# (1/10^6 del total) más absoluto (0.01 de cantidad, cubre el redondeo a ESCALA_QTY
+# de miles de niveles)
+TOLERANCIA_RANKING = 10 ** 6
+MARGEN_RANKING = ESCALA_QTY // 100
+
+
+def ticks_de_agrupacion(agrupacion, tick_size):
+    """Ticks por bucket de una agrupación (ValueError si no es múltiplo del tick)"""
+    cociente = agrupacion / tick_size
+    g = int(round(cociente))
+    if g < 1 or abs(cociente - g) > 1e-9:
+        raise ValueError(f"La agrupación {agrupacion} no es múltiplo del tick {tick_size}")
+    return g
+
+
+class _LadoAgregado:
+    """Totales por bucket de un lado del libro y su ranking ordenado"""
+
+    def __init__(self, ladder, ticks_por_bucket):
+        self.ladder = ladder
+        self.g = ticks_por_bucket
+        # Desempate igual que calcular_shocks: ante igual total gana el bucket
+        # más cercano al mejor precio (el primero en aparecer al recorrer el libro)
+        self.signo = 1 if ladder.side == 'bids' else -1
+        self.totales = {}
+        self.ranking = []  # (total, desempate, bucket) ascendente
+
+    def reconstruir(self):
+        self.totales = {}
+        g = self.g
+        for tick, qty in self.ladder.iter_ticks():
+            bucket = tick // g
+            self.totales[bucket] = self.totales.get(bucket, 0) + int(round(qty * ESCALA_QTY))
+        signo = self.signo
+        self.ranking = sorted((total, signo * bucket, bucket) for bucket, total in self.totales.items())
+
+    def actualizar(self, tick, qty_anterior, qty_nueva):
+        delta = int(round(qty_nueva * ESCALA_QTY)) - int(round(qty_anterior * ESCALA_QTY))
+        if delta == 0:
+            return
+        bucket = tick // self.g
+        desempate = self.signo * bucket
+        total = self.totales.get(bucket, 0)
+        if total:
+            ranking = self.ranking
+            del ranking[bisect_left(ranking, (total, desempate, bucket))]
+        total += delta
+        if total > 0:
+            self.totales[bucket] = total
+            insort(self.ranking, (total, desempate, bucket))
+        else:
+            self.totales.pop(bucket, None)
+
+    def candidatos(self, top_n):
+        """Buckets que pueden quedar en el top_n de calcular_shocks: el top_n del
+        ranking entero más los que están a menos del margen del último.
+        Así un empate o casi empate que las sumas float ordenan distinto no deja
+        afuera al bucket correcto."""
+        ranking = self.ranking
+        if top_n <= 0 or not ranking:
+            return []
+        if len(ranking) <= top_n:
+            return [bucket for _, _, bucket in ranking]
+        umbral = ranking[-top_n][0]
+        umbral -= umbral // TOLERANCIA_RANKING + MARGEN_RANKING
+        i = bisect_left(ranking, (umbral,))
+        return [bucket for _, _, bucket in ranking[i:]]
+
+    def copiar_buckets(self, buckets):
+        """(ticks, cantidades) de los niveles de esos buckets, desde el mejor precio
+        hacia afuera. Son slices de los arrays del Ladder (memcpy)."""
+        ladder = self.ladder
+        keys = ladder.keys
+        g = self.g
+        rangos = []
+        for bucket in buckets:
+            inicio_tick = bucket * g
+            fin_tick = inicio_tick + g - 1
+            if self.signo == 1:
+                rangos.append((bisect_left(keys, inicio_tick), bisect_right(keys, fin_tick)))
+            else:
+                rangos.append((bisect_left(keys, -fin_tick), bisect_right(keys, -inicio_tick)))
+        # El mejor precio está al final de los arrays: los rangos más altos primero
+        rangos.sort(reverse=True)
+        return [(keys[desde:hasta], ladder.qtys[desde:hasta]) for desde, hasta in rangos]
+
+
+def _shocks_lado_copiado(tramos, signo, ticks_por_bucket, tick_size, decimales, top_n):
+    """Shocks de un lado a partir de los niveles copiados por copiar_buckets, con la
+    misma aritmética que calcular_shocks sobre el libro completo: los buckets que
+    no se copiaron no pueden entrar en el top_n."""
+    if np is not None:
+        if not tramos:
+            return []
+        claves = np.concatenate([np.frombuffer(keys, dtype=np.int64)[::-1] for keys, _ in tramos])
+        qtys = np.concatenate([np.frombuffer(qtys, dtype=np.float64)[::-1] for _, qtys in tramos])
+        ticks = claves * signo
+        precios = np.round(ticks * tick_size, decimales)
+        return _shocks_lado_numpy(precios, qtys, ticks, ticks_por_bucket, tick_size, top_n)
+
+    # Sin NumPy: mismo recorrido y mismas sumas que calcular_shocks_decimal
+    rangos = {}
+    for keys, qtys in tramos:
+        for i in range(len(keys) - 1, -1, -1):
+            tick = signo * keys[i]
+            price = round(tick * tick_size, decimales)
+            qty = qtys[i]
+            datos = rangos.get(tick // ticks_por_bucket)
+            if datos is None:
+                datos = rangos[tick // ticks_por_bucket] = [0, []]
+            datos[0] += qty
+            datos[1].append(price * qty)
+    top = sorted(rangos.values(), key=lambda x: x[0], reverse=True)[:top_n]
+    shocks = []
+    for total_qty, productos in top:
+        if total_qty > 0:
+            shocks.append(agrupar_precio_binance(sum(productos) / total_qty, tick_size))
+    return shocks
+
+
+class AgregadorShocks:
+    """Liquidez agrupada por `agrupacion` mantenida delta a delta sobre un libro de Ladders.
+
+    Cada nivel que cambia actualiza el total de su bucket y el ranking de buckets,
+    así que los candidatos al top-K por lado están siempre disponibles: una
+    consulta copia solo los niveles de esos buckets (seleccionar, con el lock del
+    libro) y calcula los shocks sobre la copia (calcular, sin el lock).
+
+    Los totales del ranking se guardan en enteros (cantidad * ESCALA_QTY) para que
+    sumar y restar el mismo nivel se cancele exactamente. Los precios ponderados y
+    el orden final salen de las mismas sumas float que calcular_shocks, así que
+    los niveles resultantes son idénticos.
+    """
+
+    def __init__(self, bids, asks, agrupacion):
+        tick_size = bids.tick_size
+        g = ticks_de_agrupacion(agrupacion, tick_size)
+        self.agrupacion = agrupacion
+        self.tick_size = tick_size
+        self.decimales = obtener_decimales_de_tick(tick_size)
+        self.g = g
+        self.lados = {
+            'bids': _LadoAgregado(bids, g),
+            'asks': _LadoAgregado(asks, g),
+        }
+        self.reconstruir()
+
+    def reconstruir(self):
+        """Recalcula todos los buckets (tras cargar un snapshot)"""
+        for lado in self.lados.values():
+            lado.reconstruir()
+
+    def actualizar(self, side, tick, qty_anterior, qty_nueva):
+        self.lados[side].actualizar(tick, qty_anterior, qty_nueva)
+
+    def seleccionar(self, top_n=8):
+        """Copia de los niveles de los buckets candidatos (llamar con el lock del libro)"""
+        return {
+            side: lado.copiar_buckets(lado.candidatos(top_n))
+            for side, lado in self.lados.items()
+        }
+
+    def calcular(self, seleccion, top_n=8):
+        """Mismo resultado que calcular_shocks(libro, agrupacion, tick_size, top_n)
+        sobre el libro del momento de seleccionar (no necesita el lock)"""
+        shocks_long = _shocks_lado_copiado(seleccion['bids'], 1, self.g, self.tick_size, self.decimales, top_n)
+        shocks_short = _shocks_lado_copiado(seleccion['asks'], -1, self.g, self.tick_size, self.decimales, top_n)
+        shocks_long.sort(reverse=True)
+        shocks_short.sort()
+        return shocks_long, shocks_short, self.decimales
+
+    def shocks(self, top_n=8):
+        return self.calcular(self.seleccionar(top_n), top_n)
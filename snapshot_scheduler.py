@@ -0,0 +1,248 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+URL_DEPTH = "https://fapi.binance.com/fapi/v1/depth"
+
+# Peso de /fapi/v1/depth según el límite pedido (documentación de Binance Futures)
+PESOS_DEPTH = {5: 2, 10: 2, 20: 2, 50: 2, 100: 5, 500: 10, 1000: 20}
+LIMITE_COMPLETO = 1000
+LIMITE_REDUCIDO = 500
+
+LIMITE_PESO_MINUTO = 2400  # Request weight por IP y minuto
+MARGEN_PESO = 0.8          # Fracción usable: deja aire para exchangeInfo, tickers, etc.
+
+MAX_REINTENTOS = 10
+MAX_ESPERA_REINTENTO = 60
+
+
+class LimiteExcedido(Exception):
+    """Binance respondió 429/418: hay que esperar Retry-After segundos"""
+
+
+class PresupuestoPeso:
+    """Ventana deslizante de 60s del peso de requests consumido"""
+
+    def __init__(self, limite=LIMITE_PESO_MINUTO, margen=MARGEN_PESO):
+        self.limite = int(limite * margen)
+        self.consumos = deque()  # (timestamp, peso)
+        self.usado = 0
+        self.bloqueado_hasta = 0.0
+
+    def _purgar(self, ahora):
+        while self.consumos and self.consumos[0][0] <= ahora - 60:
+            self.usado -= self.consumos.popleft()[1]
+
+    def disponible(self, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        self._purgar(ahora)
+        return max(0, self.limite - self.usado)
+
+    def espera(self, peso, ahora=None):
+        """Segundos hasta poder gastar `peso` (0 si ya se puede)"""
+        ahora = time.time() if ahora is None else ahora
+        if ahora < self.bloqueado_hasta:
+            return self.bloqueado_hasta - ahora
+        self._purgar(ahora)
+        if self.usado + peso <= self.limite:
+            return 0.0
+        # Esperar a que salgan de la ventana los consumos más viejos necesarios
+        sobrante = self.usado + peso - self.limite
+        for t, p in self.consumos:
+            sobrante -= p
+            if sobrante <= 0:
+                return max(0.0, t + 60 - ahora)
+        return 60.0
+
+    def consumir(self, peso, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        self.consumos.append((ahora, peso))
+        self.usado += peso
+
+    def sincronizar(self, usado_servidor, ahora=None):
+        """Ajusta con X-MBX-USED-WEIGHT-1M (incluye el peso de otros procesos de la IP)"""
+        ahora = time.time() if ahora is None else ahora
+        self._purgar(ahora)
+        if usado_servidor > self.usado:
+            self.consumir(usado_servidor - self.usado, ahora)
+
+    def bloquear(self, segundos, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        self.bloqueado_hasta = max(self.bloqueado_hasta, ahora + segundos)
+
+
+class SnapshotScheduler:
+    """Planificador central de snapshots REST del libro de órdenes.
+
+    - Un pool de conexiones keep-alive compartido por unos pocos hilos trabajadores.
+    - Presupuesto de peso por minuto; respeta 429/418 (Retry-After) y el peso
+      informado por Binance en cada respuesta.
+    - Cola de prioridad: prioridad(symbol) más baja sale primero (p. ej. la
+      distancia al shock activo más cercano).
+    - Una sola petición en cola o en vuelo por símbolo: pedidos repetidos se ignoran.
+    - Profundidad adaptativa: si la cola no entra en el presupuesto que queda, los
+      símbolos con prioridad peor que umbral_completo piden 500 niveles (mitad de
+      peso) y quedan en `reducidos` para mejorarlos cuando haya holgura.
+
+    on_snapshot(symbol, snap) aplica el snapshot y devuelve True si el libro quedó
+    sincronizado; False o una excepción reprograman el símbolo con backoff.
+    """
+
+    def __init__(self, on_snapshot, prioridad=None, trabajadores=4, umbral_completo=2.0,
+                 limite_peso=LIMITE_PESO_MINUTO, url=URL_DEPTH):
+        self.on_snapshot = on_snapshot
+        self.prioridad = prioridad or (lambda symbol: 0.0)
+        self.trabajadores = trabajadores
+        self.umbral_completo = umbral_completo
+        self.url = url
+        self.presupuesto = PresupuestoPeso(limite_peso)
+
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=trabajadores)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+
+        self.cond = threading.Condition()
+        self.diferidos = []   # heap (no_antes, secuencia, symbol, limite)
+        self.listos = []      # heap (prioridad, secuencia, symbol, limite)
+        self.pendientes = set()
+        self.en_vuelo = set()
+        self.reintentos = {}
+        self.reducidos = set()
+        self.secuencia = 0
+        self.descargados = 0
+        self.hilos = []
+
+    def iniciar(self):
+        for i in range(self.trabajadores):
+            hilo = threading.Thread(target=self._trabajador, name=f"snapshots-{i}", daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+
+    def solicitar(self, symbol, retraso=0.0, limite=None):
+        """Encola un snapshot para symbol. Devuelve False si ya había uno pendiente."""
+        with self.cond:
+            if symbol in self.pendientes:
+                return False
+            self.pendientes.add(symbol)
+            self._encolar(symbol, time.time() + retraso, limite)
+            return True
+
+    def _encolar(self, symbol, no_antes, limite):
+        self.secuencia += 1
+        heapq.heappush(self.diferidos, (no_antes, self.secuencia, symbol, limite))
+        self.cond.notify()
+
+    def para_mejorar(self, maximo):
+        """Hasta `maximo` símbolos cargados con snapshot reducido, solo si no hay nada pendiente"""
+        with self.cond:
+            if self.pendientes:
+                return []
+            return list(self.reducidos)[:maximo]
+
+    def estado(self):
+        with self.cond:
+            return {
+                "pendientes": len(self.pendientes),
+                "en_vuelo": len(self.en_vuelo),
+                "reducidos": len(self.reducidos),
+                "descargados": self.descargados,
+                "peso_usado": self.presupuesto.usado,
+                "peso_limite": self.presupuesto.limite,
+            }
+
+    def elegir_limite(self, prioridad):
+        """Profundidad completa salvo que la cola no entre en el presupuesto disponible"""
+        necesario = (len(self.listos) + len(self.diferidos) + 1) * PESOS_DEPTH[LIMITE_COMPLETO]
+        if necesario <= self.presupuesto.disponible() or prioridad <= self.umbral_completo:
+            return LIMITE_COMPLETO
+        return LIMITE_REDUCIDO
+
+    def _siguiente(self):
+        """Toma el próximo pedido respetando tiempos y presupuesto (llamar con cond tomado)"""
+        while True:
+            ahora = time.time()
+            while self.diferidos and self.diferidos[0][0] <= ahora:
+                _, secuencia, symbol, limite = heapq.heappop(self.diferidos)
+                heapq.heappush(self.listos, (self.prioridad(symbol), secuencia, symbol, limite))
+
+            if not self.listos:
+                espera = self.diferidos[0][0] - ahora if self.diferidos else None
+                self.cond.wait(espera)
+                continue
+
+            prioridad, _, symbol, limite = self.listos[0]
+            if limite is None:
+                limite = self.elegir_limite(prioridad)
+            espera = self.presupuesto.espera(PESOS_DEPTH[limite], ahora)
+            if espera > 0:
+                self.cond.wait(espera)
+                continue
+
+            heapq.heappop(self.listos)
+            self.presupuesto.consumir(PESOS_DEPTH[limite], ahora)
+            self.en_vuelo.add(symbol)
+            return symbol, limite
+
+    def _trabajador(self):
+        while True:
+            with self.cond:
+                symbol, limite = self._siguiente()
+
+            try:
+                snap = self.descargar(symbol, limite)
+                ok = self.on_snapshot(symbol, snap)
+                error = None
+            except Exception as e:
+                ok = False
+                error = e
+
+            with self.cond:
+                self.en_vuelo.discard(symbol)
+                if ok:
+                    self.descargados += 1
+                    self.reintentos.pop(symbol, None)
+                    self.pendientes.discard(symbol)
+                    if limite < LIMITE_COMPLETO:
+                        self.reducidos.add(symbol)
+                    else:
+                        self.reducidos.discard(symbol)
+                elif isinstance(error, LimiteExcedido):
+                    # 429/418: el presupuesto ya quedó bloqueado, reintentar sin contar el fallo
+                    self._encolar(symbol, time.time(), limite)
+                else:
+                    intento = self.reintentos.get(symbol, 0)
+                    if intento >= MAX_REINTENTOS:
+                        print(f"❌ Máximo de reintentos alcanzado para {symbol}: {error}")
+                        self.reintentos.pop(symbol, None)
+                        self.pendientes.discard(symbol)
+                    else:
+                        # Backoff exponencial: 1s, 2s, 4s, 8s, 16s, 32s, 60s (max)
+                        delay = min(2 ** intento, MAX_ESPERA_REINTENTO)
+                        self.reintentos[symbol] = intento + 1
+                        motivo = f"error: {error}" if error else "secuencia incorrecta"
+                        print(f"🔄 Reintentando snapshot de {symbol} en {delay}s ({motivo}, intento {intento + 1}/{MAX_REINTENTOS})")
+                        self._encolar(symbol, time.time() + delay, limite)
+
+    def descargar(self, symbol, limite):
+        response = self.sesion.get(self.url, params={"symbol": symbol, "limit": limite}, timeout=(5, 10))
+
+        usado = response.headers.get("X-MBX-USED-WEIGHT-1M")
+        if usado is not None:
+            with self.cond:
+                self.presupuesto.sincronizar(int(usado))
+
+        if response.status_code in (429, 418):
+            # 429: límite excedido; 418: IP baneada por seguir pidiendo tras un 429
+            segundos = int(response.headers.get("Retry-After", 60))
+            with self.cond:
+                self.presupuesto.bloquear(segundos)
+            print(f"🛑 Binance respondió {response.status_code}: snapshots en pausa {segundos}s")
+            raise LimiteExcedido(segundos)
+
+        response.raise_for_status()
+        return response.json()
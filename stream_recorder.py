@@ -0,0 +1,161 @@
+"""Grabación y reproducción de streams crudos de Binance.
+
+Una grabación es un directorio con segmentos gzip de solo-anexar, uno por
+intervalo de tiempo: <prefijo>-AAAAMMDD-HHMMSS.jsonl.gz (hora UTC de inicio).
+Cada línea es un registro separado por tabs:
+
+    timestamp \\t tipo \\t símbolo \\t payload
+
+- ws:   mensaje crudo del WebSocket tal como llegó (símbolo vacío)
+- snap: snapshot REST del símbolo en JSON
+- meta: JSON con el universo ({"symbols": [...], "tick_sizes": {...}}), al
+        principio de cada segmento para que cada uno se pueda leer solo
+
+El hilo que graba solo encola (timestamp, tipo, símbolo, payload); la
+serialización y la compresión ocurren en un hilo escritor aparte.
+"""
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+
+SEGUNDOS_SEGMENTO = 300
+MAX_COLA = 200000  # Si el disco no da abasto se descartan registros antes que frenar la ingesta
+
+
+class StreamRecorder:
+    def __init__(self, directorio, prefijo="stream", segundos_segmento=SEGUNDOS_SEGMENTO, meta=None):
+        self.directorio = directorio
+        self.prefijo = prefijo
+        self.segundos_segmento = segundos_segmento
+        self.meta = meta
+        self.cola = queue.SimpleQueue()
+        self.descartados = 0
+        self.grabados = 0
+        self.hilo = None
+
+    def iniciar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        self.hilo = threading.Thread(target=self._escritor, name=f"grabador-{self.prefijo}", daemon=True)
+        self.hilo.start()
+        return self
+
+    def _encolar(self, registro):
+        # SimpleQueue.put no toma locks de Python: es lo más barato para el hilo de ingesta
+        if self.cola.qsize() >= MAX_COLA:
+            self.descartados += 1
+            return
+        self.cola.put(registro)
+
+    def grabar(self, message):
+        """Mensaje crudo de un WebSocket (str o bytes)"""
+        self._encolar((time.time(), "ws", "", message))
+
+    def snapshot(self, symbol, snap):
+        self._encolar((time.time(), "snap", symbol, snap))
+
+    def cerrar(self):
+        """Vacía la cola y cierra el segmento actual"""
+        if self.hilo is not None:
+            self.cola.put(None)
+            self.hilo.join()
+            self.hilo = None
+        if self.descartados:
+            print(f"⚠️ Grabación {self.prefijo}: {self.descartados} registros descartados por cola llena")
+
+    def _abrir_segmento(self, inicio):
+        nombre = f"{self.prefijo}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime(inicio))}.jsonl.gz"
+        ruta = os.path.join(self.directorio, nombre)
+        archivo = gzip.open(ruta, "at", encoding="utf-8", compresslevel=1)
+        if self.meta is not None:
+            archivo.write(f"{inicio:.6f}\tmeta\t\t{json.dumps(self.meta, separators=(',', ':'))}\n")
+        print(f"💾 Grabando en {ruta}")
+        return archivo
+
+    def _escritor(self):
+        archivo = None
+        fin_segmento = 0.0
+        while True:
+            registro = self.cola.get()
+            if registro is None:
+                break
+
+            t, tipo, symbol, payload = registro
+            if archivo is None or t >= fin_segmento:
+                if archivo is not None:
+                    archivo.close()
+                archivo = self._abrir_segmento(t)
+                fin_segmento = t + self.segundos_segmento
+
+            if tipo == "ws":
+                if isinstance(payload, bytes):
+                    payload = payload.decode("utf-8")
+            else:
+                payload = json.dumps(payload, separators=(',', ':'))
+            archivo.write(f"{t:.6f}\t{tipo}\t{symbol}\t{payload}\n")
+            self.grabados += 1
+
+        if archivo is not None:
+            archivo.close()
+
+
+def listar_segmentos(directorio, prefijo=None):
+    nombres = sorted(
+        nombre for nombre in os.listdir(directorio)
+        if nombre.endswith(".jsonl.gz") and (prefijo is None or nombre.startswith(f"{prefijo}-"))
+    )
+    return [os.path.join(directorio, nombre) for nombre in nombres]
+
+
+def leer_grabacion(directorio, prefijo=None, desde=None, hasta=None):
+    """Itera (timestamp, tipo, símbolo, payload) en orden de grabación.
+
+    El payload de ws es el texto crudo; snap y meta llegan ya decodificados. Un
+    segmento truncado (proceso cortado a mitad de escritura) se lee hasta donde
+    se pueda.
+    """
+    for ruta in listar_segmentos(directorio, prefijo):
+        try:
+            with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+                for linea in archivo:
+                    t, tipo, symbol, payload = linea.rstrip("\n").split("\t", 3)
+                    t = float(t)
+                    if desde is not None and t < desde and tipo != "meta":
+                        continue
+                    if hasta is not None and t > hasta:
+                        return
+                    if tipo != "ws":
+                        payload = json.loads(payload)
+                    yield t, tipo, symbol, payload
+        except (EOFError, gzip.BadGzipFile, ValueError) as e:
+            print(f"⚠️ Segmento incompleto {os.path.basename(ruta)}: {e}")
+
+
+def reproducir(directorio, on_message, on_snapshot, on_meta=None, velocidad=1.0, prefijo=None, desde=None, hasta=None):
+    """Reproduce una grabación llamando a los callbacks en el orden original.
+
+    velocidad=1 respeta los tiempos reales, 10 va diez veces más rápido y 0 no
+    espera entre registros. Devuelve la cantidad de registros reproducidos.
+    """
+    inicio_real = None
+    inicio_grabacion = None
+    cantidad = 0
+    for t, tipo, symbol, payload in leer_grabacion(directorio, prefijo, desde, hasta):
+        if velocidad > 0 and tipo != "meta":
+            if inicio_grabacion is None:
+                inicio_grabacion = t
+                inicio_real = time.perf_counter()
+            espera = (t - inicio_grabacion) / velocidad - (time.perf_counter() - inicio_real)
+            if espera > 0:
+                time.sleep(espera)
+
+        if tipo == "ws":
+            on_message(payload)
+        elif tipo == "snap":
+            on_snapshot(symbol, payload)
+        elif tipo == "meta" and on_meta is not None:
+            on_meta(payload)
+        cantidad += 1
+    return cantidad
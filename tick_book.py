@@ -0,0 +1,192 @@
+from array import array
+from bisect import bisect_left
+
+from shocks import obtener_decimales_de_tick
+
+
+class Ladder:
+    """Un lado del libro de órdenes indexado por ticks enteros.
+
+    Los niveles se guardan en dos arrays paralelos (ticks 'q' y cantidades 'd')
+    ordenados de forma que el mejor precio siempre queda al final:
+    - bids: clave = tick (ascendente, el bid más alto al final)
+    - asks: clave = -tick (el ask más bajo al final)
+
+    Así el top-of-book es O(1), la búsqueda de un nivel es O(log n) con bisect
+    y las inserciones/borrados cerca del mejor precio (donde ocurre casi toda
+    la actividad) apenas mueven memoria.
+    """
+
+    __slots__ = ('tick_size', 'decimales', 'side', '_signo', 'keys', 'qtys')
+
+    def __init__(self, tick_size, side):
+        if side not in ('bids', 'asks'):
+            raise ValueError(f"Lado inválido: {side}")
+        self.tick_size = float(tick_size)
+        self.decimales = obtener_decimales_de_tick(self.tick_size)
+        self.side = side
+        self._signo = 1 if side == 'bids' else -1
+        self.keys = array('q')
+        self.qtys = array('d')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __bool__(self):
+        return len(self.keys) > 0
+
+    # ----- Conversión precio <-> tick -----
+
+    def to_tick(self, price):
+        return int(round(float(price) / self.tick_size))
+
+    def tick_to_price(self, tick):
+        return round(tick * self.tick_size, self.decimales)
+
+    def price_str(self, tick):
+        return f"{tick * self.tick_size:.{self.decimales}f}"
+
+    # ----- Escritura -----
+
+    def clear(self):
+        del self.keys[:]
+        del self.qtys[:]
+
+    def load(self, levels):
+        """Carga niveles [[precio, cantidad], ...] (formato snapshot de Binance)"""
+        signo = self._signo
+        niveles = {}
+        for price, qty in levels:
+            qty = float(qty)
+            if qty != 0:
+                niveles[signo * self.to_tick(price)] = qty
+        orden = sorted(niveles)
+        self.keys = array('q', orden)
+        self.qtys = array('d', (niveles[k] for k in orden))
+
+    def set_tick(self, tick, qty):
+        """Fija la cantidad de un tick (0 elimina el nivel). Devuelve la cantidad anterior."""
+        key = self._signo * tick
+        keys = self.keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            anterior = self.qtys[i]
+            if qty == 0:
+                del keys[i]
+                del self.qtys[i]
+            else:
+                self.qtys[i] = qty
+            return anterior
+        if qty != 0:
+            keys.insert(i, key)
+            self.qtys.insert(i, qty)
+        return 0.0
+
+    def apply(self, price, qty):
+        """Aplica un nivel de un evento de profundidad (precio y cantidad como str o float)"""
+        return self.set_tick(self.to_tick(price), float(qty))
+
+    # ----- Lectura -----
+
+    def get_tick(self, tick):
+        key = self._signo * tick
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.qtys[i]
+        return 0.0
+
+    def best_tick(self):
+        if not self.keys:
+            return None
+        return self._signo * self.keys[-1]
+
+    def best(self):
+        """Mejor nivel (precio, cantidad) o None si el lado está vacío"""
+        if not self.keys:
+            return None
+        return self.tick_to_price(self._signo * self.keys[-1]), self.qtys[-1]
+
+    def iter_ticks(self):
+        """Itera (tick, cantidad) desde el mejor precio hacia afuera"""
+        signo = self._signo
+        keys = self.keys
+        qtys = self.qtys
+        for i in range(len(keys) - 1, -1, -1):
+            yield signo * keys[i], qtys[i]
+
+    def items(self):
+        """Itera (precio, cantidad) como floats desde el mejor precio hacia afuera"""
+        tick_to_price = self.tick_to_price
+        for tick, qty in self.iter_ticks():
+            yield tick_to_price(tick), qty
+
+    def _con_arrays(self, keys, qtys):
+        nuevo = Ladder.__new__(Ladder)
+        nuevo.tick_size = self.tick_size
+        nuevo.decimales = self.decimales
+        nuevo.side = self.side
+        nuevo._signo = self._signo
+        nuevo.keys = keys
+        nuevo.qtys = qtys
+        return nuevo
+
+    def copy(self):
+        return self._con_arrays(array('q', self.keys), array('d', self.qtys))
+
+    def recorte(self, n=None, tick_limite=None):
+        """Copia de los mejores niveles: como mucho n y sin pasar de tick_limite
+        (inclusive, hacia afuera del libro). Un bisect y un slice: solo se copia
+        el tramo pedido."""
+        inicio = 0
+        if tick_limite is not None:
+            inicio = bisect_left(self.keys, self._signo * tick_limite)
+        if n is not None:
+            inicio = max(inicio, len(self.keys) - n)
+        return self._con_arrays(self.keys[inicio:], self.qtys[inicio:])
+
+    def limite_buckets(self, ticks_por_bucket, n):
+        """Tick más alejado del n-ésimo bucket no vacío desde el mejor precio (None
+        si hay menos de n). Salta de bucket en bucket con bisect: O(n log niveles)."""
+        keys = self.keys
+        signo = self._signo
+        fin = len(keys)  # keys[:fin]: niveles todavía sin bucket
+        limite = None
+        for _ in range(n):
+            if fin == 0:
+                return None
+            bucket = (signo * keys[fin - 1]) // ticks_por_bucket
+            limite = bucket * ticks_por_bucket if signo == 1 else (bucket + 1) * ticks_por_bucket - 1
+            fin = bisect_left(keys, signo * limite)
+        return limite
+
+    def agrupar(self, ticks_por_bucket, n=None):
+        """[(tick inicial del bucket, cantidad total)] desde el mejor precio hacia
+        afuera, con los mismos buckets que los shocks (tick // ticks_por_bucket).
+        Con n se detiene al completar n buckets."""
+        buckets = []
+        actual = None
+        for tick, qty in self.iter_ticks():
+            bucket = tick // ticks_por_bucket
+            if bucket != actual:
+                if n is not None and len(buckets) == n:
+                    break
+                buckets.append([bucket * ticks_por_bucket, 0.0])
+                actual = bucket
+            buckets[-1][1] += qty
+        return buckets
+
+    def arrays(self):
+        """(precios, cantidades) como array('d') desde el mejor precio hacia afuera"""
+        signo = self._signo
+        tick_to_price = self.tick_to_price
+        precios = array('d', [tick_to_price(signo * key) for key in reversed(self.keys)])
+        qtys = array('d', reversed(self.qtys))
+        return precios, qtys
+
+    def to_dict(self):
+        """Diccionario {precio_str: cantidad_str} en orden de precio (compatible con la API)"""
+        price_str = self.price_str
+        return {price_str(tick): repr(qty) for tick, qty in self.iter_ticks()}
+
+    def nbytes(self):
+        return self.keys.itemsize * len(self.keys) + self.qtys.itemsize * len(self.qtys)